@@ -0,0 +1,216 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+COLLABORATORS_PATH = re.compile(r'^/repos/([^/]+)/([^/]+)/collaborators$')
+OUTSIDE_COLLABORATORS_PATH = re.compile(r'^/orgs/([^/]+)/outside_collaborators$')
+
+def _connection(items, first, cursor, edge):
+    """One page of a GraphQL connection; cursors are plain offsets"""
+    start = int(cursor or 0)
+    page = items[start:start + first]
+    return {
+        "pageInfo": {"hasNextPage": start + first < len(items), "endCursor": str(start + first)},
+        "edges": [edge(item) for item in page]
+    }
+
+class FakeGitHubServer:
+    """Local stand-in for the GitHub REST endpoints, and the org GraphQL queries, the collectors use
+
+    Serving GitHubOrgCollector, the account owner is the org (GITHUB_ORG=org.owner): it is the one
+    admin member, every collaborator is a member, and SyntheticOrg teams (if any) are served as-is.
+    """
+
+    def __init__(self, org, latency=0.05, rate_limit=5000, max_per_page=100):
+        self.org = org
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.max_per_page = max_per_page
+        self.requests = 0
+        self.not_modified = 0
+        self.bytes_sent = 0
+        # Answer this many GraphQL queries with a RATE_LIMITED error first
+        self.graphql_rate_limited = 0
+        self._remaining = rate_limit
+        self._reset = int(time.time()) + 3600
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _page(self, items, query, path):
+        per_page = min(int(query.get('per_page', ['30'])[0]), self.max_per_page)
+        page = int(query.get('page', ['1'])[0])
+        body = items[(page - 1) * per_page:page * per_page]
+
+        links = []
+        last = max(1, -(-len(items) // per_page))
+        if page < last:
+            links.append(f'<{self.url}{path}?per_page={per_page}&page={page + 1}>; rel="next"')
+            links.append(f'<{self.url}{path}?per_page={per_page}&page={last}>; rel="last"')
+        return body, ', '.join(links)
+
+    def route(self, path, query):
+        """Return (status, body, link header) for a request"""
+        if path == '/user':
+            return 200, {"login": self.org.owner, "email": f"{self.org.owner}@example.com"}, ''
+        if path == '/user/repos':
+            return (200,) + self._page(self.org.repos, query, path)
+
+        match = COLLABORATORS_PATH.match(path)
+        if match and match.group(1) == self.org.owner and match.group(2) in self.org.collaborators:
+            return (200,) + self._page(self._collaborators(match.group(2)), query, path)
+
+        match = OUTSIDE_COLLABORATORS_PATH.match(path)
+        if match and match.group(1) == self.org.owner:
+            return (200,) + self._page([], query, path)
+
+        return 404, {"message": "Not Found"}, ''
+
+    def _collaborators(self, repo):
+        return [{"login": self.org.owner, "role_name": "admin"}] + self.org.collaborators[repo]
+
+    def _members(self):
+        logins = sorted({item['login'] for items in self.org.collaborators.values() for item in items})
+        return [(self.org.owner, 'ADMIN')] + [(login, 'MEMBER') for login in logins]
+
+    def graphql(self, query, variables):
+        """Answer the org collector's GraphQL queries; returns (status, body)"""
+        if self.graphql_rate_limited:
+            self.graphql_rate_limited -= 1
+            return 200, {"data": None, "errors": [{"type": "RATE_LIMITED", "message": "API rate limit exceeded"}]}
+
+        def user(login):
+            return {"login": login, "email": f"{login}@example.com"}
+
+        def collaborator(item):
+            return {"permission": item['role_name'].upper(), "node": user(item['login'])}
+
+        def member(item):
+            return {"role": item[1], "node": user(item[0])}
+
+        def not_found(field):
+            return 200, {"data": {field: None}, "errors": [{"type": "NOT_FOUND", "path": [field],
+                                                           "message": f"Could not resolve to a {field}"}]}
+
+        if 'repository(owner' in query:
+            if variables['org'] != self.org.owner or variables['repo'] not in self.org.collaborators:
+                return not_found('repository')
+            collaborators = _connection(self._collaborators(variables['repo']), 100, variables.get('cursor'),
+                                        collaborator)
+            return 200, {"data": {"repository": {"collaborators": collaborators}}}
+
+        if variables.get('org') != self.org.owner:
+            return not_found('organization')
+        teams = getattr(self.org, 'teams', {})
+        if 'membersWithRole {' in query:
+            organization = {"membersWithRole": {"totalCount": len(self._members())}}
+        elif 'membersWithRole(' in query:
+            organization = {"membersWithRole": _connection(self._members(), 100, variables.get('cursor'), member)}
+        elif 'team(slug' in query:
+            members = [(login, 'MEMBER') for login in teams.get(variables['team'], [])]
+            organization = {"team": {"members": _connection(members, 100, variables.get('cursor'), member)}
+                            if variables['team'] in teams else None}
+        elif 'teams(' in query:
+            page = _connection(sorted(teams), 50, variables.get('cursor'), lambda slug: slug)
+            organization = {"teams": {"pageInfo": page['pageInfo'], "nodes": [
+                {"slug": slug, "members": _connection([(login, 'MEMBER') for login in teams[slug]], 100, None, member)}
+                for slug in page['edges']
+            ]}}
+        elif 'repositories(' in query:
+            names = [repo['name'] for repo in self.org.repos if repo['name'] in self.org.collaborators]
+            page = _connection(names, variables['pageSize'], variables.get('cursor'), lambda name: name)
+            organization = {"repositories": {"pageInfo": page['pageInfo'], "nodes": [
+                {"name": name, "collaborators": _connection(self._collaborators(name), 100, None, collaborator)}
+                for name in page['edges']
+            ]}}
+        else:
+            return 400, {"message": "Unsupported query"}
+        return 200, {"data": {"organization": organization}}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                if server.latency:
+                    time.sleep(server.latency)
+
+                request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                status, body = server.graphql(request['query'], request.get('variables') or {})
+                data = json.dumps(body).encode()
+                with server._lock:
+                    server.requests += 1
+                    server.bytes_sent += len(data)
+
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if server.latency:
+                    time.sleep(server.latency)
+
+                parsed = urlparse(self.path)
+                status, body, links = server.route(parsed.path, parse_qs(parsed.query))
+                data = json.dumps(body).encode()
+                etag = '"%s"' % hashlib.md5(data).hexdigest()
+
+                with server._lock:
+                    server.requests += 1
+                    not_modified = self.headers.get('If-None-Match') == etag
+                    if not_modified:
+                        server.not_modified += 1
+                    else:
+                        server._remaining = max(0, server._remaining - 1)
+                        server.bytes_sent += len(data)
+                    remaining = server._remaining
+
+                self.send_response(304 if not_modified else status)
+                self.send_header('ETag', etag)
+                self.send_header('X-RateLimit-Limit', str(server.rate_limit))
+                self.send_header('X-RateLimit-Remaining', str(remaining))
+                self.send_header('X-RateLimit-Reset', str(server._reset))
+                if links:
+                    self.send_header('Link', links)
+                if not_modified:
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
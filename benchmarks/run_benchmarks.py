@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Offline benchmarks for collection, diffing and report building
+
+Run from the repository root:
+    python -m benchmarks.run_benchmarks --preset small
+    python -m benchmarks.run_benchmarks --compare out/benchmarks/previous.json
+"""
+
+import argparse
+import json
+import logging
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from benchmarks.fake_github import FakeGitHubServer
+from benchmarks.synthetic import SyntheticOrg, generate_sot
+from config.settings import settings
+
+PRESETS = {
+    "smoke": {"repos": 50, "collaborators": 200, "sot_rows": 1000, "latency_ms": 0},
+    "small": {"repos": 1000, "collaborators": 5000, "sot_rows": 20000, "latency_ms": 20},
+    "large": {"repos": 10000, "collaborators": 50000, "sot_rows": 200000, "latency_ms": 50},
+}
+
+# A benchmark slower than the baseline by more than this fraction counts as a regression
+REGRESSION_THRESHOLD = 0.20
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, round(time.perf_counter() - start, 4)
+
+@contextmanager
+def _override_settings(**values):
+    """Temporarily point settings at the benchmark sandbox"""
+    previous = {key: getattr(settings, key) for key in values}
+    for key, value in values.items():
+        setattr(settings, key, value)
+    try:
+        yield
+    finally:
+        for key, value in previous.items():
+            setattr(settings, key, value)
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'describe', '--always', '--dirty'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(repos, collaborators, sot_rows, latency_ms, workers=None, work_dir=None):
+    """Run every benchmark against a fresh synthetic org; returns the results document"""
+    from scripts.diff_engine import DiffEngine
+    from scripts.github_collector import GitHubCollector
+    from scripts.slack_notifier import SlackNotifier
+
+    if work_dir is None:
+        work_dir = tempfile.mkdtemp(prefix='access_guard_bench_')
+        try:
+            return run(repos, collaborators, sot_rows, latency_ms, workers, work_dir)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    work_dir = Path(work_dir)
+    work_dir.mkdir(parents=True, exist_ok=True)
+    results = {}
+
+    org, seconds = _timed(SyntheticOrg, repos=repos, collaborators=collaborators)
+    sot_path = work_dir / 'access_matrix.csv'
+    _, sot_seconds = _timed(generate_sot, org, rows=sot_rows, path=sot_path)
+    results['generate_data'] = {"seconds": round(seconds + sot_seconds, 4), "grants": org.grant_count}
+
+    # Point the collectors and caches at the sandbox; nothing touches the real account or out/
+    with FakeGitHubServer(org, latency=latency_ms / 1000, rate_limit=10 ** 9) as server, _override_settings(
+        GITHUB_API_URL=server.url,
+        ACCOUNT_TOKEN='benchmark',
+        GITHUB_REQUESTS_PER_SECOND=0,
+        GITHUB_INCREMENTAL=False,
+        HTTP_CACHE_DIR=str(work_dir / 'http_cache'),
+        SOT_CACHE_DIR=str(work_dir / 'sot_cache'),
+        PAYLOAD_STORE_DB=str(work_dir / 'payloads.db')
+    ):
+        # Second run is answered with 304s from the conditional-request cache
+        for label in ('collect_actuals_cold', 'collect_actuals_warm'):
+            collector = GitHubCollector(max_workers=workers, use_cache=True)
+            requests_before, bytes_before = server.requests, server.bytes_sent
+            actuals, seconds = _timed(collector.collect_actuals)
+            collector.close()
+            results[label] = {
+                "seconds": seconds,
+                "records": len(actuals),
+                "requests": server.requests - requests_before,
+                "bytes": server.bytes_sent - bytes_before,
+                "records_per_second": round(len(actuals) / seconds, 1) if seconds else None
+            }
+
+        actuals_path = collector.save_actuals(actuals, str(work_dir / 'github_actuals.ndjson.gz'))
+
+        # Second diff loads the compiled SoT index instead of parsing the CSV
+        for label in ('generate_diff_cold', 'generate_diff_warm'):
+            report, seconds = _timed(DiffEngine().generate_diff, str(sot_path), actuals_path)
+            summary = report['summary']
+            results[label] = {
+                "seconds": seconds,
+                "sot_rows": sot_rows,
+                **{key: summary.get(key) for key in ('extra_count', 'missing_count', 'wrong_role_count', 'expired_count')}
+            }
+
+    notifier = SlackNotifier()
+    _, seconds = _timed(notifier.create_slack_message, report)
+    results['create_slack_message'] = {"seconds": seconds}
+
+    return {
+        "created_at": datetime.now().isoformat(),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {
+            "repos": repos, "collaborators": collaborators, "sot_rows": sot_rows,
+            "latency_ms": latency_ms, "workers": workers or settings.GITHUB_MAX_WORKERS
+        },
+        "results": results
+    }
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """Print per-benchmark timing changes; returns names that regressed past the threshold"""
+    regressions = []
+    if baseline.get('params') != current.get('params'):
+        print("warning: baseline was run with different parameters")
+
+    for name, result in current['results'].items():
+        before = baseline.get('results', {}).get(name, {}).get('seconds')
+        if not before:
+            continue
+        change = (result['seconds'] - before) / before
+        flag = ''
+        if change > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"  {name:<24} {before:>9.3f}s -> {result['seconds']:>9.3f}s  {change:+.0%}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Access Guard offline benchmarks')
+    parser.add_argument('--preset', choices=PRESETS, default='small', help='Workload size')
+    parser.add_argument('--repos', type=int)
+    parser.add_argument('--collaborators', type=int)
+    parser.add_argument('--sot-rows', type=int)
+    parser.add_argument('--latency-ms', type=float, help='Simulated API latency per request')
+    parser.add_argument('--workers', type=int, help='Collector worker threads')
+    parser.add_argument('--output', help='Results file (default: out/benchmarks/bench_<timestamp>.json)')
+    parser.add_argument('--compare', metavar='BASELINE', help='Compare against an earlier results file')
+    args = parser.parse_args()
+
+    # Per-record collector logging would dominate the timings
+    logging.basicConfig(level=logging.WARNING)
+
+    params = dict(PRESETS[args.preset])
+    for key in params:
+        value = getattr(args, key)
+        if value is not None:
+            params[key] = value
+
+    document = run(workers=args.workers, **params)
+
+    output = Path(args.output or f"out/benchmarks/bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(document, f, indent=2)
+
+    for name, result in document['results'].items():
+        print(f"  {name:<24} {result['seconds']:>9.3f}s")
+    print(f"Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), document)
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
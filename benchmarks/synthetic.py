@@ -0,0 +1,82 @@
+import csv
+import random
+from datetime import date, timedelta
+
+SOT_COLUMNS = ['system', 'username', 'email', 'role', 'scope', 'expires_on', 'manager', 'notes']
+ROLES = ['read', 'triage', 'write', 'maintain', 'admin']
+
+class SyntheticOrg:
+    """Deterministic fake GitHub account: repos and their collaborators"""
+
+    def __init__(self, repos=10000, collaborators=50000, users=None, owner='bench-owner', seed=42):
+        rng = random.Random(seed)
+        self.owner = owner
+        self.users = [f"user{i:06d}" for i in range(users or max(1, collaborators // 5))]
+        self.repos = [
+            {"name": f"repo{i:05d}", "updated_at": f"2026-01-{1 + i % 28:02d}T00:00:00Z"}
+            for i in range(repos)
+        ]
+
+        # Spread collaborator grants over repos; a few large repos get many
+        self.collaborators = {repo['name']: [] for repo in self.repos}
+        names = [repo['name'] for repo in self.repos]
+        weights = [1.0 / (1 + i % 100) for i in range(len(names))]
+        seen = set()
+        while len(seen) < collaborators and names:
+            repo = rng.choices(names, weights)[0]
+            user = rng.choice(self.users)
+            if (repo, user) in seen:
+                continue
+            seen.add((repo, user))
+            self.collaborators[repo].append({
+                "login": user,
+                "id": len(seen),
+                "role_name": rng.choice(ROLES),
+                "permissions": {"pull": True}
+            })
+
+    @property
+    def grant_count(self):
+        return sum(len(users) for users in self.collaborators.values())
+
+def generate_sot(org, rows=200000, path=None, drift=0.05, seed=42):
+    """Build an SoT matrix that mostly matches the org, with a share of drifted rows"""
+    rng = random.Random(seed)
+    today = date.today()
+    out = []
+
+    owner_scope = 'repos:' + '|'.join(repo['name'] for repo in org.repos)
+    out.append(['github', org.owner, f"{org.owner}@example.com", 'owner', owner_scope, '', 'cto', ''])
+    for repo, collaborators in org.collaborators.items():
+        for collaborator in collaborators:
+            if len(out) >= rows:
+                break
+            role = collaborator['role_name']
+            expires_on = (today + timedelta(days=rng.randint(1, 365))).isoformat()
+            roll = rng.random()
+            if roll < drift / 3:
+                continue                      # grant missing from SoT -> extra access
+            elif roll < 2 * drift / 3:
+                role = rng.choice([r for r in ROLES if r != role])   # wrong role
+            elif roll < drift:
+                expires_on = (today - timedelta(days=rng.randint(1, 90))).isoformat()  # expired
+            login = collaborator['login']
+            out.append(['github', login, f"{login}@example.com", role, f"repos:{repo}", expires_on, 'mgr', ''])
+
+    # Pad with grants for other systems and repos nobody has access to (missing access)
+    while len(out) < rows:
+        i = len(out)
+        if i % 3:
+            out.append(['cloudflare', f"user{i:06d}@example.com", f"user{i:06d}@example.com",
+                        'administrator', 'account:bench', '', 'mgr', ''])
+        else:
+            user = rng.choice(org.users)
+            out.append(['github', user, f"{user}@example.com", 'read', f"repos:archived{i}",
+                        (today + timedelta(days=30)).isoformat(), 'mgr', ''])
+
+    if path:
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(SOT_COLUMNS)
+            writer.writerows(out)
+    return out
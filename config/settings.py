@@ -7,17 +7,85 @@ class Settings:
     # GitHub Configuration
     ACCOUNT_TOKEN = os.getenv('ACCOUNT_TOKEN')
     GITHUB_ORG = os.getenv('GITHUB_ORG', '')  # Leave empty for personal account
+    GITHUB_API_URL = os.getenv('GITHUB_API_URL', 'https://api.github.com')
+    GITHUB_MAX_WORKERS = int(os.getenv('GITHUB_MAX_WORKERS', '8'))
+    GITHUB_REQUESTS_PER_SECOND = float(os.getenv('GITHUB_REQUESTS_PER_SECOND', '10'))
+    GITHUB_MAX_RETRIES = int(os.getenv('GITHUB_MAX_RETRIES', '5'))
+    GITHUB_GRAPHQL_PAGE_SIZE = int(os.getenv('GITHUB_GRAPHQL_PAGE_SIZE', '50'))  # Repos per org query
+    
+    # Collector Timeouts (seconds; 0 disables)
+    COLLECTOR_TIMEOUT_SECONDS = float(os.getenv('COLLECTOR_TIMEOUT_SECONDS', '1800'))
+    GITHUB_COLLECTOR_TIMEOUT = float(os.getenv('GITHUB_COLLECTOR_TIMEOUT', COLLECTOR_TIMEOUT_SECONDS))
+    
+    # Incremental Collection (per-repo state + checkpoints)
+    GITHUB_INCREMENTAL = os.getenv('GITHUB_INCREMENTAL', 'false').lower() == 'true'
+    GITHUB_STATE_FILE = os.getenv('GITHUB_STATE_FILE', 'out/github_state.json')
+    GITHUB_STATE_MAX_AGE_HOURS = float(os.getenv('GITHUB_STATE_MAX_AGE_HOURS', '168'))
+    GITHUB_CHECKPOINT_EVERY = int(os.getenv('GITHUB_CHECKPOINT_EVERY', '50'))
+    
+    # HTTP Response Cache (ETag / If-None-Match)
+    HTTP_CACHE_ENABLED = os.getenv('HTTP_CACHE_ENABLED', 'true').lower() == 'true'
+    HTTP_CACHE_DIR = os.getenv('HTTP_CACHE_DIR', 'out/http_cache')
+    HTTP_CACHE_MAX_MB = int(os.getenv('HTTP_CACHE_MAX_MB', '256'))
+    
+    # Source of Truth Index Cache
+    SOT_CACHE_DIR = os.getenv('SOT_CACHE_DIR', 'out/.cache')
+    
+    # Snapshot History
+    SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', 'out/snapshots')
+    SNAPSHOT_RETENTION_DAYS = int(os.getenv('SNAPSHOT_RETENTION_DAYS', '90'))
+    SNAPSHOT_KEEP_MIN = int(os.getenv('SNAPSHOT_KEEP_MIN', '7'))  # Never prune below this many per system
+    
+    # Raw Payload Store
+    PAYLOAD_STORE_ENABLED = os.getenv('PAYLOAD_STORE_ENABLED', 'true').lower() == 'true'
+    PAYLOAD_STORE_DB = os.getenv('PAYLOAD_STORE_DB', 'out/payloads.db')
     
     # Cloudflare Configuration
     CLOUDFLARE_TOKEN = os.getenv('CLOUDFLARE_TOKEN')
     CLOUDFLARE_ACCOUNT_ID = os.getenv('CLOUDFLARE_ACCOUNT_ID')
+    CLOUDFLARE_API_URL = os.getenv('CLOUDFLARE_API_URL', 'https://api.cloudflare.com/client/v4')
+    CLOUDFLARE_MAX_WORKERS = int(os.getenv('CLOUDFLARE_MAX_WORKERS', '4'))
+    CLOUDFLARE_REQUESTS_PER_SECOND = float(os.getenv('CLOUDFLARE_REQUESTS_PER_SECOND', '4'))  # 1200 per 5 minutes
+    CLOUDFLARE_MAX_RETRIES = int(os.getenv('CLOUDFLARE_MAX_RETRIES', '5'))
+    CLOUDFLARE_COLLECTOR_TIMEOUT = float(os.getenv('CLOUDFLARE_COLLECTOR_TIMEOUT', COLLECTOR_TIMEOUT_SECONDS))
     
     # MongoDB Configuration
     MONGO_URI = os.getenv('MONGO_URI')
     MONGO_DB = os.getenv('MONGO_DB', 'admin')
+    MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', '4'))
+    MONGO_TIMEOUT_MS = int(os.getenv('MONGO_TIMEOUT_MS', '10000'))
+    MONGO_COLLECTOR_TIMEOUT = float(os.getenv('MONGO_COLLECTOR_TIMEOUT', COLLECTOR_TIMEOUT_SECONDS))
     
     # Slack Configuration
     SLACK_WEBHOOK_URL = os.getenv('SLACK_WEBHOOK_URL')
+    SLACK_MESSAGES_PER_SECOND = float(os.getenv('SLACK_MESSAGES_PER_SECOND', '1'))
+    SLACK_MAX_RETRIES = int(os.getenv('SLACK_MAX_RETRIES', '5'))
+    SLACK_SPOOL_DIR = os.getenv('SLACK_SPOOL_DIR', 'out/slack_spool')
+    
+    # Finding Deduplication
+    FINDINGS_DEDUP = os.getenv('FINDINGS_DEDUP', 'true').lower() == 'true'
+    FINDINGS_DB = os.getenv('FINDINGS_DB', 'out/findings.db')
+    HISTORY_ENABLED = os.getenv('HISTORY_ENABLED', 'true').lower() == 'true'  # Grant history in FINDINGS_DB
+    
+    # Run Metrics
+    METRICS_EXPORT = os.getenv('METRICS_EXPORT', '')  # Comma-separated: prometheus, json
+    METRICS_PROMETHEUS_FILE = os.getenv('METRICS_PROMETHEUS_FILE', 'out/metrics/access_guard.prom')
+    METRICS_JSON_FILE = os.getenv('METRICS_JSON_FILE', 'out/metrics/access_guard_metrics.json')
+    # tracemalloc slows the diff stage considerably; turn on for diagnostics, not nightly runs
+    METRICS_TRACE_MEMORY = os.getenv('METRICS_TRACE_MEMORY', 'false').lower() == 'true'
+    
+    # Offboarding
+    OFFBOARDING_DIR = os.getenv('OFFBOARDING_DIR', 'out/offboarding')  # Plans and idempotency journals
+    OFFBOARDING_MAX_WORKERS = int(os.getenv('OFFBOARDING_MAX_WORKERS', '4'))
+    
+    # MFA Coverage
+    MFA_CACHE_HOURS = float(os.getenv('MFA_CACHE_HOURS', '12'))  # Reuse a sweep this recent instead of calling the API
+    
+    # Daemon Mode
+    DAEMON_HOST = os.getenv('DAEMON_HOST', '127.0.0.1')
+    DAEMON_PORT = int(os.getenv('DAEMON_PORT', '8787'))
+    DAEMON_SWEEP_INTERVAL_MINUTES = float(os.getenv('DAEMON_SWEEP_INTERVAL_MINUTES', '360'))
+    GITHUB_WEBHOOK_SECRET = os.getenv('GITHUB_WEBHOOK_SECRET')
     
     # App Configuration
     DRY_RUN = os.getenv('DRY_RUN', 'true').lower() == 'true'
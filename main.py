@@ -8,47 +8,114 @@ import argparse
 import json
 import logging
 import sys
-from datetime import datetime
+from functools import cached_property
 from pathlib import Path
 
-from scripts.github_collector import GitHubCollector
-from scripts.diff_engine import DiffEngine
-from scripts.slack_notifier import SlackNotifier
 from config.settings import settings
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('logs/access_guard.log'),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# Subsystems (pandas, requests, ...) are imported on first use so that
+# commands like --help and --report don't pay for what they never touch
 
-logger = logging.getLogger(_name_)
+logger = logging.getLogger(__name__)
+
+def setup_logging():
+    """Configure logging before any subsystem module is imported"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('logs/access_guard.log'),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
 
 class AccessGuard:
-    def _init_(self):
-        self.github_collector = GitHubCollector()
-        self.diff_engine = DiffEngine()
-        self.slack_notifier = SlackNotifier()
+    @cached_property
+    def diff_engine(self):
+        from scripts.diff_engine import DiffEngine
+        return DiffEngine()
+    
+    @cached_property
+    def slack_notifier(self):
+        from scripts.slack_notifier import SlackNotifier
+        return SlackNotifier()
+    
+    @cached_property
+    def snapshot_store(self):
+        from scripts.snapshot_store import SnapshotStore
+        return SnapshotStore()
     
-    def collect_data(self):
-        """Collect data from all systems"""
+    def collect_data(self, collectors=None):
+        """Collect data from all configured systems concurrently"""
+        from scripts.collectors import CollectorRunner
         logger.info("Starting data collection...")
         
-        # Collect from GitHub
-        github_actuals = self.github_collector.collect_actuals()
-        self.github_collector.save_actuals(github_actuals, "out/github_actuals_latest.json")
+        # Each system streams to its own actuals file and snapshot; one failure doesn't stop the rest
+        results = CollectorRunner(snapshot_store=self.snapshot_store, collectors=collectors).run()
         
-        logger.info("Data collection completed")
+        if settings.HISTORY_ENABLED:
+            self.record_history(results)
+        
+        failed = [system for system, result in results.items() if result['status'] != 'ok']
+        if failed:
+            logger.warning(f"Data collection incomplete - failed: {', '.join(failed)}")
+        else:
+            logger.info("Data collection completed")
+        return results
     
-    def check_drift(self):
+    def record_history(self, collection):
+        """Add this run's grants to the indexed history"""
+        from scripts.history_store import HistoryStore
+        store = HistoryStore()
+        try:
+            for system, result in collection.items():
+                if result['status'] == 'ok':
+                    store.record_actuals(result['path'], system)
+        except Exception as e:
+            logger.error(f"Could not record grant history: {e}")
+        finally:
+            store.close()
+    
+    def show_history(self, timeline=None, repo=None, mttr=False, since=None):
+        """Print a user timeline, a repository's access history or remediation times"""
+        from scripts.history_store import HistoryStore
+        store = HistoryStore()
+        try:
+            if timeline:
+                for event in store.user_timeline(timeline):
+                    print(f"{event['at']}  {event['event']:<9} {event['system']:<10} {event['scope']}  {event['detail']}")
+            if repo:
+                for span in store.repo_history(repo):
+                    print(f"{span['first_seen']} -> {span['ended_at'] or 'now':<26}  {span['username']}  {span['role']}")
+            if mttr:
+                for bucket, stats in store.remediation_stats(since).items():
+                    print(f"{bucket:<11} resolved {stats['resolved']:>6}  open {stats['open']:>6}  "
+                          f"mean {stats['mean_hours']}h  median {stats['median_hours']}h")
+        finally:
+            store.close()
+    
+    def check_drift(self, collection=None):
         """Check for access drift"""
         logger.info("Checking for access drift...")
         
-        report = self.diff_engine.generate_diff()
+        if collection is None:
+            report = self.diff_engine.generate_diff()
+        else:
+            # Only diff systems collected in this run so a failed one isn't reported as all-missing
+            paths = [result['path'] for result in collection.values() if result['status'] == 'ok']
+            report = self.diff_engine.generate_diff(actuals_path=paths)
+            report['summary']['failed_systems'] = sorted(
+                system for system, result in collection.items() if result['status'] != 'ok'
+            )
+        
+        # Compare with earlier runs so notifications carry only what changed
+        if settings.FINDINGS_DEDUP and 'drift_found' in report['summary']:
+            from scripts.finding_store import FindingStore
+            store = FindingStore()
+            try:
+                store.reconcile(report, skip_systems=report['summary'].get('failed_systems', []))
+            finally:
+                store.close()
         self.diff_engine.save_diff_report(report, "out/diff_report_latest.json")
         
         if report['summary'].get('drift_found', False):
@@ -58,6 +125,24 @@ class AccessGuard:
         
         return report
     
+    def snapshot_delta(self, old_path=None, new_path=None):
+        """Compare two actuals snapshots (default: the two most recent)"""
+        if not (old_path and new_path):
+            snapshots = self.snapshot_store.list_snapshots("github")
+            if len(snapshots) < 2:
+                logger.error("Need at least two snapshots to compute a delta")
+                return None
+            old_path, new_path = snapshots[-2], snapshots[-1]
+        
+        delta = self.snapshot_store.delta(old_path, new_path)
+        with open("out/actuals_delta_latest.json", 'w') as f:
+            json.dump(delta, f, indent=2)
+        
+        summary = delta['summary']
+        print(f"{old_path} -> {new_path}")
+        print(f"  added: {summary['added_count']}  removed: {summary['removed_count']}  changed: {summary['changed_count']}")
+        return delta
+    
     def send_report(self, report):
         """Send report to Slack"""
         logger.info("Sending report to Slack...")
@@ -70,41 +155,99 @@ class AccessGuard:
         
         return success
     
+    def offboard(self, username=None, resume=None):
+        """Build a revocation plan for a user (or from the latest diff report) and run it, or resume a saved one"""
+        from scripts.offboarding import OffboardingExecutor, OffboardingPlanner
+        executor = OffboardingExecutor()
+        if resume:
+            return executor.execute(executor.load_plan(resume))
+        
+        planner = OffboardingPlanner()
+        if username:
+            plan = planner.plan_for_user(username)
+        else:
+            with open("out/diff_report_latest.json") as f:
+                plan = planner.plan_from_report(json.load(f))
+        
+        if not plan['actions']:
+            logger.info("Nothing to revoke")
+            return None
+        return executor.execute(plan)
+    
     def run_nightly(self):
         """Run nightly collection and reporting"""
+        from scripts.run_metrics import RunMetrics
         logger.info("Starting nightly access guard run...")
+        metrics = RunMetrics()
         
         try:
             # Step 1: Collect data
-            self.collect_data()
+            with metrics.stage('collect'):
+                collection = self.collect_data()
+            metrics.add_collection(collection)
+            if not any(result['status'] == 'ok' for result in collection.values()):
+                raise RuntimeError("No system could be collected")
             
             # Step 2: Check drift
-            report = self.check_drift()
+            with metrics.stage('diff', trace_memory=settings.METRICS_TRACE_MEMORY):
+                report = self.check_drift(collection)
             
             # Step 3: Send report
-            if settings.SLACK_WEBHOOK_URL:
-                self.send_report(report)
-            else:
-                logger.info("Slack webhook not configured - skipping notification")
+            with metrics.stage('notify'):
+                if settings.SLACK_WEBHOOK_URL:
+                    self.send_report(report)
+                else:
+                    logger.info("Slack webhook not configured - skipping notification")
             
+            report['summary']['performance'] = metrics.to_dict()
+            self.diff_engine.save_diff_report(report, "out/diff_report_latest.json")
+            
+            metrics.success = True
             logger.info("Nightly run completed successfully")
             
         except Exception as e:
+            metrics.success = False
             logger.error(f"Nightly run failed: {e}")
             raise
+        finally:
+            metrics.export()
 
 def main():
     parser = argparse.ArgumentParser(description='ArSa Nexus Access Guard')
     parser.add_argument('--collect', action='store_true', help='Collect access data')
     parser.add_argument('--diff', action='store_true', help='Check for access drift')
-    parser.add_argument('--report', action='store_true', help='Send report to Slack')
+    parser.add_argument('--report', action='store_true',
+                        help='Send report to Slack (or resend messages spooled by a failed delivery)')
     parser.add_argument('--nightly', action='store_true', help='Run full nightly process')
+    parser.add_argument('--delta', nargs='*', metavar='SNAPSHOT',
+                        help='Show grants added/removed/changed between two snapshots (default: latest two)')
+    parser.add_argument('--prune-snapshots', action='store_true',
+                        help='Delete snapshots past the retention window and raw payloads no actuals file refers to')
+    parser.add_argument('--offboard', nargs='?', const='', metavar='USERNAME',
+                        help='Revoke all GitHub access of a user, or extra/expired access from the latest '
+                             'diff report; prints the plan only while DRY_RUN is on')
+    parser.add_argument('--resume', metavar='PLAN_ID',
+                        help='Rerun a saved offboarding plan, skipping the calls its journal records as done')
+    parser.add_argument('--mfa', action='store_true',
+                        help='Sweep the org for members without 2FA and send batched nudges')
+    parser.add_argument('--timeline', metavar='USERNAME', help="Show a user's grant and finding history")
+    parser.add_argument('--repo-history', metavar='REPO', help='Show who had access to a repository and when')
+    parser.add_argument('--mttr', action='store_true', help='Show mean/median time to remediate per finding type')
+    parser.add_argument('--since', metavar='DATE', help='Only count findings resolved on or after DATE (with --mttr)')
+    parser.add_argument('--what-if', metavar='CANDIDATE_SOT',
+                        help='Offline: findings a candidate SoT would add or resolve against the latest snapshots; '
+                             'exits 1 if it adds any (for CI)')
+    parser.add_argument('--base', default='sot/access_matrix.csv', help='SoT to compare against (with --what-if)')
+    parser.add_argument('--payload', metavar='REF', help='Print the raw API payload behind an actuals record')
+    parser.add_argument('--daemon', action='store_true',
+                        help='Run continuously: scheduled sweeps plus incremental diffs on GitHub webhooks')
     
     args = parser.parse_args()
     
     # Create necessary directories
     Path("out").mkdir(exist_ok=True)
     Path("logs").mkdir(exist_ok=True)
+    setup_logging()
     
     guard = AccessGuard()
     
@@ -113,12 +256,53 @@ def main():
     elif args.diff:
         guard.check_drift()
     elif args.report:
-        report = json.load(open('out/diff_report_latest.json'))
-        guard.send_report(report)
+        # Messages left over from a failed delivery are resent as they were built
+        if guard.slack_notifier.spooled():
+            guard.slack_notifier.resend_spooled()
+        else:
+            report = json.load(open('out/diff_report_latest.json'))
+            guard.send_report(report)
     elif args.nightly:
         guard.run_nightly()
+    elif args.delta is not None:
+        if len(args.delta) not in (0, 2):
+            parser.error("--delta takes either no snapshots or exactly two")
+        guard.snapshot_delta(*args.delta)
+    elif args.prune_snapshots:
+        guard.snapshot_store.prune()
+        if Path(settings.PAYLOAD_STORE_DB).exists():
+            from scripts.payload_store import PayloadStore
+            store = PayloadStore()
+            store.prune(sorted(Path("out").glob("*_actuals_latest.ndjson.gz")))
+            store.close()
+    elif args.offboard is not None or args.resume:
+        guard.offboard(args.offboard or None, resume=args.resume)
+    elif args.mfa:
+        from scripts.mfa_sweep import MFASweep
+        MFASweep().run()
+    elif args.timeline or args.repo_history or args.mttr:
+        guard.show_history(args.timeline, args.repo_history, args.mttr, args.since)
+    elif args.what_if:
+        from scripts.what_if import WhatIfDiff
+        result = WhatIfDiff().run(args.what_if, args.base)
+        WhatIfDiff.save(result)
+        WhatIfDiff.print_result(result)
+        if result['summary']['added_count'] or result['summary']['rejected_rows']:
+            sys.exit(1)
+    elif args.payload:
+        from scripts.payload_store import PayloadStore
+        store = PayloadStore()
+        payload = store.get(args.payload)
+        store.close()
+        if payload is None:
+            logger.error(f"No stored payload with ref {args.payload}")
+            sys.exit(1)
+        print(json.dumps(payload, indent=2))
+    elif args.daemon:
+        from scripts.daemon import AccessGuardDaemon
+        AccessGuardDaemon(guard).run()
     else:
         parser.print_help()
 
-if _name_ == "_main_":
+if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,172 @@
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import logging
+from requests.adapters import HTTPAdapter
+from config.settings import settings
+from scripts.collectors import BaseCollector, CollectionError
+from scripts.rate_limiter import RequestScheduler
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Largest page the account members endpoint accepts
+MEMBERS_PER_PAGE = 50
+
+class CloudflareCollector(BaseCollector):
+    """Collect Cloudflare account members with their roles and policies"""
+
+    system = 'cloudflare'
+
+    def __init__(self, token=None, account_id=None, base_url=None, max_workers=None):
+        self.token = token or settings.CLOUDFLARE_TOKEN
+        self.account_id = account_id or settings.CLOUDFLARE_ACCOUNT_ID
+        self.base_url = (base_url or settings.CLOUDFLARE_API_URL).rstrip('/')
+        self.timeout = 30
+        self.max_workers = max(1, max_workers or settings.CLOUDFLARE_MAX_WORKERS)
+        self.session = self._create_session()
+
+        # Cloudflare allows 1200 requests per 5 minutes per user and answers 429 with Retry-After
+        self.scheduler = RequestScheduler(
+            rate=settings.CLOUDFLARE_REQUESTS_PER_SECOND,
+            max_retries=settings.CLOUDFLARE_MAX_RETRIES
+        )
+
+    def _create_session(self):
+        session = requests.Session()
+        session.headers.update({
+            'Authorization': f'Bearer {self.token}',
+            'Content-Type': 'application/json'
+        })
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers + 1)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def close(self):
+        """Close pooled HTTP connections"""
+        self.session.close()
+
+    def _get_page(self, page):
+        """Fetch one page of account members; returns (members, total_pages)"""
+        url = f'{self.base_url}/accounts/{self.account_id}/members'
+        response = self.scheduler.request(
+            self.session, 'GET', url,
+            params={"page": page, "per_page": MEMBERS_PER_PAGE, "direction": "asc"},
+            timeout=self.timeout
+        )
+
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = {}
+        if response.status_code != 200 or not payload.get('success', False):
+            errors = payload.get('errors') or [{"message": response.reason}]
+            message = '; '.join(str(error.get('message')) for error in errors)
+            raise CollectionError(f"Cloudflare members page {page} failed (HTTP {response.status_code}): {message}")
+
+        info = payload.get('result_info') or {}
+        total_pages = info.get('total_pages')
+        if total_pages is None and info.get('total_count') is not None:
+            total_pages = -(-info['total_count'] // MEMBERS_PER_PAGE)
+        return payload.get('result') or [], total_pages or 1
+
+    def iter_members(self):
+        """Yield account members, fetching pages after the first concurrently"""
+        members, total_pages = self._get_page(1)
+        yield from members
+
+        if total_pages <= 1:
+            return
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pages = [executor.submit(self._get_page, page) for page in range(2, total_pages + 1)]
+            try:
+                for future in pages:
+                    yield from future.result()[0]
+            except BaseException:
+                # Pages not started yet are dropped; leaving the block waits for the running ones
+                for future in pages:
+                    future.cancel()
+                raise
+
+    def _scope(self, key):
+        """Map a resource-group scope key to the SoT scope format"""
+        prefix = 'com.cloudflare.api.account.'
+        if key.startswith(prefix + 'zone.'):
+            return f"zones:{key[len(prefix) + len('zone.'):]}"
+        if key.startswith(prefix):
+            return f"account:{key[len(prefix):]}"
+        return key
+
+    def _record(self, member, role, scope, raw):
+        user = member.get('user') or {}
+        email = user.get('email') or ''
+        return {
+            "system": "cloudflare",
+            "username": email,
+            "email": email,
+            "role": role,
+            "scope": scope,
+            "collected_at": datetime.now().isoformat(),
+            "source": {"raw": raw}
+        }
+
+    def member_records(self, member):
+        """Expand one member into records for each role and each policy permission group"""
+        records = []
+        account_scope = [f"account:{self.account_id}"]
+        status = member.get('status')
+
+        for role in member.get('roles') or []:
+            raw = {"member_id": member.get('id'), "status": status, "role": role}
+            records.append(self._record(member, role.get('name', '').lower(), account_scope, raw))
+
+        # Policy-based members carry permission groups over resource groups instead of roles
+        for policy in member.get('policies') or []:
+            if policy.get('access', 'allow') != 'allow':
+                continue
+            scope = sorted({
+                self._scope((group.get('scope') or {}).get('key', ''))
+                for group in policy.get('resource_groups') or []
+            }) or account_scope
+            for group in policy.get('permission_groups') or []:
+                raw = {"member_id": member.get('id'), "status": status, "policy_id": policy.get('id'), "permission_group": group}
+                records.append(self._record(member, group.get('name', '').lower(), scope, raw))
+
+        return records
+
+    def iter_actuals(self):
+        """Yield actual access records for the Cloudflare account"""
+        if not (self.token and self.account_id):
+            raise CollectionError("Cloudflare token or account id not configured")
+
+        logger.info(f"Starting Cloudflare data collection for account {self.account_id}...")
+
+        member_count = 0
+        record_count = 0
+        try:
+            for member in self.iter_members():
+                member_count += 1
+                for record in self.member_records(member):
+                    yield record
+                    record_count += 1
+        except requests.exceptions.RequestException as e:
+            raise CollectionError(f"Error collecting Cloudflare account {self.account_id}: {e}") from e
+
+        budget = self.scheduler.stats()
+        logger.info(
+            f"Collection complete: {record_count} access records for {member_count} members "
+            f"({budget['requests']} requests, {budget['retries']} retries)"
+        )
+
+    def stats(self):
+        """Return request counters for this run"""
+        return self.scheduler.stats()
+
+def main():
+    collector = CloudflareCollector()
+    collector.save_actuals(collector.iter_actuals())
+
+if __name__ == "__main__":
+    main()
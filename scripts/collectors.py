@@ -0,0 +1,244 @@
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from pathlib import Path
+from config.settings import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Extra wait past a collector's timeout for it to notice the deadline between records
+TIMEOUT_GRACE_SECONDS = 30
+
+class CollectionError(Exception):
+    """Raised when a collector cannot produce a complete result"""
+
+class CollectionTimeout(CollectionError):
+    """Raised when a collector runs past its time budget"""
+
+class BaseCollector(ABC):
+    """Interface implemented by every system collector"""
+
+    system = None
+
+    @abstractmethod
+    def iter_actuals(self):
+        """Yield normalized access records for this system"""
+
+    def close(self):
+        """Release connections held by the collector"""
+
+    def stats(self):
+        """Return request counters for this run"""
+        return {}
+
+    def save_actuals(self, actuals, filename=None, cancel=None):
+        """Save collected records as NDJSON (gzip if .gz), or a legacy JSON array for .json
+
+        If the cancel event is set by the time the records are written, the file isn't published.
+        """
+        if not filename:
+            filename = actuals_path(self.system)
+
+        # Write beside the target and swap in, so readers never see a partial file
+        tmp_filename = f"{filename}.tmp"
+        opener = gzip.open if filename.endswith('.gz') else open
+
+        # Raw payloads go to the deduplicated side store; records keep only a ref
+        payloads = None
+        if settings.PAYLOAD_STORE_ENABLED:
+            from scripts.payload_store import PayloadStore
+            payloads = PayloadStore()
+            actuals = payloads.externalize(actuals)
+
+        count = 0
+        try:
+            with opener(tmp_filename, 'wt') as f:
+                if filename.endswith('.json'):
+                    actuals = list(actuals)
+                    json.dump(actuals, f, indent=2)
+                    count = len(actuals)
+                else:
+                    for record in actuals:
+                        f.write(json.dumps(record, separators=(',', ':')))
+                        f.write('\n')
+                        count += 1
+            if cancel is not None and cancel.is_set():
+                raise CollectionTimeout(f"{self.system} collection was abandoned; keeping the last good actuals")
+        except BaseException:
+            # A failed run must not leave a half-written file or replace the last good one
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
+            raise
+        finally:
+            if payloads is not None:
+                payloads.close()
+        os.replace(tmp_filename, filename)
+
+        logger.info(f"{self.system} actuals saved to {filename} ({count} records)")
+        if payloads is not None:
+            logger.info(f"{self.system} raw payloads: {len(payloads.seen)} distinct, {payloads.written} new")
+        return filename
+
+class CollectorSpec:
+    """Registry entry: how to build a collector and when it applies"""
+
+    def __init__(self, system, factory, is_configured, timeout=None):
+        self.system = system
+        self.factory = factory
+        self.is_configured = is_configured
+        self.timeout = timeout
+
+    def get_timeout(self):
+        return self.timeout() if callable(self.timeout) else self.timeout
+
+# system name -> CollectorSpec; factories import lazily so unused systems cost nothing
+COLLECTORS = {}
+
+def register_collector(system, factory, is_configured, timeout=None):
+    """Add a collector to the registry"""
+    COLLECTORS[system] = CollectorSpec(system, factory, is_configured, timeout)
+
+def configured_systems():
+    """Return registered systems whose credentials are present"""
+    return [system for system, spec in COLLECTORS.items() if spec.is_configured()]
+
+def actuals_path(system):
+    return f"out/{system}_actuals_latest.ndjson.gz"
+
+def latest_actuals_paths(systems=None):
+    """Return the latest actuals file of each configured system that has one"""
+    systems = configured_systems() if systems is None else systems
+    return [actuals_path(system) for system in systems if Path(actuals_path(system)).exists()]
+
+def _with_deadline(records, system, deadline):
+    """Pass records through, aborting once the collector's time budget is spent"""
+    for record in records:
+        if deadline and time.monotonic() > deadline:
+            raise CollectionTimeout(f"{system} collection exceeded its time budget")
+        yield record
+    # A collector stuck in its last request may only return once the budget is spent
+    if deadline and time.monotonic() > deadline:
+        raise CollectionTimeout(f"{system} collection exceeded its time budget")
+
+def _start_thread(name, fn, *args):
+    """Run fn in a daemon thread, so a collector stuck in a request never holds up interpreter exit"""
+    future = Future()
+
+    def target():
+        future.set_running_or_notify_cancel()
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=target, name=name, daemon=True).start()
+    return future
+
+def _github_collector():
+    if settings.has_github_org:
+        from scripts.github_org_collector import GitHubOrgCollector
+        return GitHubOrgCollector()
+    from scripts.github_collector import GitHubCollector
+    return GitHubCollector()
+
+register_collector(
+    'github', _github_collector,
+    is_configured=lambda: bool(settings.ACCOUNT_TOKEN),
+    timeout=lambda: settings.GITHUB_COLLECTOR_TIMEOUT
+)
+
+def _cloudflare_collector():
+    from scripts.cloudflare_collector import CloudflareCollector
+    return CloudflareCollector()
+
+register_collector(
+    'cloudflare', _cloudflare_collector,
+    is_configured=lambda: bool(settings.CLOUDFLARE_TOKEN and settings.CLOUDFLARE_ACCOUNT_ID),
+    timeout=lambda: settings.CLOUDFLARE_COLLECTOR_TIMEOUT
+)
+
+def _mongo_collector():
+    from scripts.mongo_collector import MongoCollector
+    return MongoCollector()
+
+register_collector(
+    'mongodb', _mongo_collector,
+    is_configured=lambda: bool(settings.MONGO_URI),
+    timeout=lambda: settings.MONGO_COLLECTOR_TIMEOUT
+)
+
+class CollectorRunner:
+    """Run every configured collector concurrently, each with its own timeout"""
+
+    def __init__(self, systems=None, snapshot_store=None, collectors=None):
+        self.systems = configured_systems() if systems is None else systems
+        self.snapshot_store = snapshot_store
+        # Long-lived collectors (e.g. the daemon's) are reused and left open
+        self.collectors = collectors or {}
+
+    def _run_one(self, system, deadline, cancel):
+        """Collect one system into its own actuals file and snapshot, unless the run gave up on it"""
+        started = time.monotonic()
+        collector = self.collectors.get(system)
+        owned = collector is None
+        if owned:
+            collector = COLLECTORS[system].factory()
+        try:
+            records = _with_deadline(collector.iter_actuals(), system, deadline)
+            path = collector.save_actuals(records, actuals_path(system), cancel=cancel)
+        finally:
+            if owned:
+                collector.close()
+
+        if cancel.is_set():
+            raise CollectionTimeout(f"{system} collection was abandoned; not snapshotting it")
+        if self.snapshot_store is not None:
+            try:
+                self.snapshot_store.save_from_actuals(path, system=system)
+            except Exception as e:
+                logger.error(f"Could not snapshot {system} actuals: {e}")
+        return path, collector.stats(), round(time.monotonic() - started, 2)
+
+    def run(self):
+        """Collect all systems; returns per-system status, path, timing and error"""
+        results = {}
+        if not self.systems:
+            logger.warning("No collectors are configured")
+            return results
+
+        started = time.monotonic()
+        futures = {}
+        for system in self.systems:
+            timeout = COLLECTORS[system].get_timeout()
+            deadline = started + timeout if timeout else None
+            cancel = threading.Event()
+            future = _start_thread(f"collector-{system}", self._run_one, system, deadline, cancel)
+            futures[system] = (future, cancel, timeout)
+
+        for system, (future, cancel, timeout) in futures.items():
+            remaining = None
+            if timeout:
+                remaining = max(0.0, started + timeout + TIMEOUT_GRACE_SECONDS - time.monotonic())
+            try:
+                path, stats, seconds = future.result(timeout=remaining)
+                results[system] = {"status": "ok", "path": path, "stats": stats, "seconds": seconds}
+            except (FutureTimeout, CollectionTimeout):
+                # A collector still running must not publish actuals for a run reported as timed out
+                cancel.set()
+                logger.error(f"{system} collection timed out after {timeout}s")
+                results[system] = {"status": "timeout", "error": f"timed out after {timeout}s",
+                                   "seconds": round(time.monotonic() - started, 2)}
+            except Exception as e:
+                logger.error(f"{system} collection failed: {e}")
+                results[system] = {"status": "failed", "error": str(e),
+                                   "seconds": round(time.monotonic() - started, 2)}
+
+        ok = [system for system, result in results.items() if result['status'] == 'ok']
+        logger.info(f"Collected {len(ok)}/{len(results)} systems in {time.monotonic() - started:.1f}s")
+        return results
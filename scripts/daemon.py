@@ -0,0 +1,326 @@
+import hashlib
+import hmac
+import itertools
+import json
+import logging
+import os
+import queue
+import signal
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+import pandas as pd
+from config.settings import settings
+from scripts.collectors import COLLECTORS, configured_systems
+from scripts.diff_engine import DiffEngine
+from scripts.finding_store import FindingStore, add_fingerprints
+from scripts.grant_model import Permission
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# GitHub caps webhook payloads at 25 MB
+MAX_WEBHOOK_BYTES = 25 * 1024 * 1024
+
+def verify_signature(secret, body, signature):
+    """Check a GitHub X-Hub-Signature-256 header against the shared secret"""
+    if not secret or not signature or not signature.startswith('sha256='):
+        return False
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature[len('sha256='):])
+
+def event_scopes(event, payload):
+    """GitHub scopes ('repos:x', 'teams:y') whose access may have changed with a webhook event"""
+    repo = payload.get('repository') or {}
+    scopes = set()
+    if event in ('member', 'team', 'repository') and repo.get('name'):
+        scopes.add(f"repos:{repo['name']}")
+    if event == 'repository':
+        # A rename moves every grant from the old scope to the new one
+        old_name = ((payload.get('changes') or {}).get('repository') or {}).get('name', {}).get('from')
+        if old_name:
+            scopes.add(f"repos:{old_name}")
+    if event == 'membership' and payload.get('scope', 'team') == 'team':
+        slug = (payload.get('team') or {}).get('slug')
+        if slug:
+            scopes.add(f"teams:{slug}")
+    return scopes
+
+def _scope_keys(item):
+    scopes = item.get('scope')
+    return [str(scope).strip().lower() for scope in (scopes if isinstance(scopes, list) else [scopes])]
+
+class AccessGuardDaemon:
+    """Long-running Access Guard: scheduled full sweeps plus webhook-driven incremental diffs"""
+
+    def __init__(self, guard, sot_path="sot/access_matrix.csv", host=None, port=None,
+                 secret=None, sweep_interval_minutes=None):
+        self.guard = guard
+        self.sot_path = sot_path
+        self.host = host or settings.DAEMON_HOST
+        self.port = settings.DAEMON_PORT if port is None else port
+        self.secret = secret or settings.GITHUB_WEBHOOK_SECRET
+        minutes = settings.DAEMON_SWEEP_INTERVAL_MINUTES if sweep_interval_minutes is None else sweep_interval_minutes
+        self.sweep_interval = minutes * 60
+
+        self.engine = DiffEngine()
+        self.queue = queue.Queue()
+        self.stopping = threading.Event()
+        self.server = None
+
+        # Warm state kept between jobs; only the worker thread touches it
+        self.collector = COLLECTORS['github'].factory() if 'github' in configured_systems() else None
+        self.owner = None
+        self.sot_index = None
+        self.sot_mtime = None
+        self.known_users = set()
+        self.actual_grants = None
+        self.report = None
+        self.failed_systems = []
+        self.last_sweep = None
+
+    def _refresh_sot(self):
+        """Reload the SoT index when the CSV changed; returns True if it did"""
+        mtime = os.stat(self.sot_path).st_mtime
+        if mtime == self.sot_mtime:
+            return False
+        previous = self.sot_index
+        self.sot_index = self.engine.load_sot_index(self.sot_path)
+        self.known_users = set(zip(self.sot_index.grants['system_id'], self.sot_index.grants['principal_id']))
+        self.sot_mtime = mtime
+        if previous is not None and self.actual_grants is not None:
+            # Warm actual grants carry the old index's IDs
+            self.actual_grants = self.sot_index.vocabulary.translate(self.actual_grants, previous.vocabulary)
+        logger.info(f"Loaded SoT index with {len(self.sot_index.grants)} grants")
+        return True
+
+    def sweep(self):
+        """Full collection and diff, as in the nightly run"""
+        logger.info("Starting scheduled sweep...")
+        collectors = {'github': self.collector} if self.collector else None
+        collection = self.guard.collect_data(collectors=collectors)
+        paths = [result['path'] for result in collection.values() if result['status'] == 'ok']
+        if not paths:
+            logger.error("Sweep failed: no system could be collected")
+            return None
+
+        # A fresh engine per sweep so reports from earlier sweeps are never mutated
+        self.guard.diff_engine = DiffEngine()
+        report = self.guard.check_drift(collection)
+        if 'drift_found' not in report['summary']:
+            logger.error("Sweep produced no report")
+            return None
+
+        self._refresh_sot()
+        records = itertools.chain.from_iterable(self.engine.iter_actuals(path) for path in paths)
+        self.actual_grants = self.engine.actual_grants(records, self.sot_index.vocabulary)
+        self.failed_systems = report['summary'].get('failed_systems', [])
+        self.report = report
+        self.last_sweep = datetime.now().isoformat()
+        self._notify(report)
+        return report
+
+    def refresh_scopes(self, scopes):
+        """Refetch the given GitHub scopes and re-diff only those against the warm SoT index"""
+        if self.collector is None:
+            logger.warning("GitHub collector is not configured - ignoring webhook events")
+            return None
+        if self.report is None:
+            # Nothing to patch yet; a full sweep covers the events as well
+            return self.sweep()
+
+        if self.owner is None:
+            self.owner = getattr(self.collector, 'org', None) or self._account_owner()
+
+        records = []
+        refreshed = set()
+        for scope in sorted(scopes):
+            kind, _, name = scope.partition(':')
+            if kind == 'repos':
+                records.extend(self.collector.repo_records(self.owner, name))
+            elif kind == 'teams' and hasattr(self.collector, 'team_records'):
+                records.extend(self.collector.team_records(name))
+            else:
+                continue
+            refreshed.add(scope.strip().lower())
+        if not refreshed:
+            return None
+        logger.info(f"Refreshed {len(refreshed)} scopes with {len(records)} records")
+
+        fresh = self.engine.actual_grants(records, self.sot_index.vocabulary)
+        stale = self._scope_mask(self.actual_grants, refreshed)
+        self.actual_grants = pd.concat([self.actual_grants[~stale], fresh], ignore_index=True)
+        return self._rediff(refreshed)
+
+    def _account_owner(self):
+        """Personal account login, taken from the swept owner grant when there is one"""
+        grants = self.actual_grants
+        github = self.sot_index.vocabulary.system_id('github')
+        owners = grants.loc[(grants['system_id'] == github) & (grants['permission'] == Permission.OWNER), 'username']
+        if len(owners):
+            return str(owners.iloc[0])
+        return (self.collector.get_user_info() or {}).get('login')
+
+    def _scope_mask(self, grants, scope_keys):
+        vocabulary = self.sot_index.vocabulary
+        return (grants['system_id'] == vocabulary.system_id('github')) & \
+            grants['resource_id'].isin(vocabulary.resource_ids(scope_keys))
+
+    def _rediff(self, scope_keys=None):
+        """Recompute findings from warm state, for everything or only the given GitHub scopes"""
+        report = self.report
+        details = report['details']
+
+        if scope_keys is None:
+            joined = self.engine.join_grants(self.sot_index.grants, self.actual_grants)
+            details['expired'] = self.engine.check_expired(self.sot_index.sot)
+            details['extra'] = self.engine.find_extra_access(None, None, joined)
+            details['missing'] = self.engine.find_missing_access(joined)
+            details['wrong_role'] = self.engine.find_wrong_role(joined)
+            report['summary']['total_sot_records'] = len(self.sot_index.sot)
+            report['summary']['rejected_sot_rows'] = len(self.sot_index.rejected)
+        else:
+            sot_grants, actual_grants = self.sot_index.grants, self.actual_grants
+            joined = self.engine.join_grants(sot_grants[self._scope_mask(sot_grants, scope_keys)],
+                                             actual_grants[self._scope_mask(actual_grants, scope_keys)])
+            fresh = {
+                'extra': self.engine.find_extra_access(None, None, joined, known_users=self.known_users),
+                'missing': self.engine.find_missing_access(
+                    joined, collected={self.sot_index.vocabulary.system_id('github')}),
+                'wrong_role': self.engine.find_wrong_role(joined)
+            }
+            for bucket, items in fresh.items():
+                kept = [item for item in details[bucket]
+                        if str(item.get('system', '')).strip().lower() != 'github'
+                        or not any(key in scope_keys for key in _scope_keys(item))]
+                details[bucket] = kept + items
+
+        add_fingerprints(details)
+        counts = {f"{bucket}_count": len(details[bucket]) for bucket in ('expired', 'extra', 'missing', 'wrong_role')}
+        report['summary'].update(counts, drift_found=any(counts.values()))
+        report['timestamp'] = datetime.now().isoformat()
+
+        if settings.FINDINGS_DEDUP:
+            store = FindingStore()
+            try:
+                store.reconcile(report, skip_systems=self.failed_systems)
+            finally:
+                store.close()
+        self.engine.save_diff_report(report, "out/diff_report_latest.json")
+        self._notify(report)
+        return report
+
+    def _notify(self, report):
+        """Send to Slack only when there is something new to say"""
+        summary = report['summary']
+        if not settings.SLACK_WEBHOOK_URL:
+            return
+        if summary.get('new_count') if settings.FINDINGS_DEDUP else summary.get('drift_found'):
+            self.guard.send_report(report)
+
+    def _run_job(self, job, *args):
+        try:
+            if self._refresh_sot() and self.report is not None and job != self.sweep:
+                self._rediff()
+            job(*args)
+        except Exception as e:
+            # One bad job must not take the daemon down
+            logger.error(f"Daemon job {job.__name__} failed: {e}")
+
+    def _handler(self):
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+            def _reply(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if urlparse(self.path).path != '/healthz':
+                    return self._reply(404, {"error": "not found"})
+                self._reply(200, {"status": "ok", "last_sweep": daemon.last_sweep, "queued": daemon.queue.qsize()})
+
+            def do_POST(self):
+                if urlparse(self.path).path != '/webhook':
+                    return self._reply(404, {"error": "not found"})
+                length = int(self.headers.get('Content-Length') or 0)
+                if length > MAX_WEBHOOK_BYTES:
+                    return self._reply(413, {"error": "payload too large"})
+                body = self.rfile.read(length)
+                if not verify_signature(daemon.secret, body, self.headers.get('X-Hub-Signature-256')):
+                    logger.warning("Rejected webhook with a bad signature")
+                    return self._reply(401, {"error": "bad signature"})
+                try:
+                    payload = json.loads(body)
+                except ValueError:
+                    return self._reply(400, {"error": "invalid JSON"})
+
+                event = self.headers.get('X-GitHub-Event', '')
+                scopes = event_scopes(event, payload)
+                if not scopes:
+                    return self._reply(200, {"event": event, "ignored": True})
+                # The diff runs on the worker thread; GitHub only waits 10s for an answer
+                daemon.queue.put(scopes)
+                self._reply(202, {"event": event, "queued": sorted(scopes)})
+
+        return Handler
+
+    def start_listener(self):
+        """Start the webhook listener; it is never exposed without a secret to verify against"""
+        if not self.secret:
+            logger.warning("GITHUB_WEBHOOK_SECRET is not set - webhook listener disabled, sweeps only")
+            return None
+        self.server = ThreadingHTTPServer((self.host, self.port), self._handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name='webhook-listener', daemon=True).start()
+        logger.info(f"Listening for GitHub webhooks on http://{self.host}:{self.server.server_port}/webhook")
+        return self.server
+
+    def stop(self):
+        self.stopping.set()
+        self.queue.put(None)
+
+    def run(self):
+        """Serve webhooks and run sweeps until stopped"""
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(signum, lambda *_: self.stop())
+        self.start_listener()
+
+        next_sweep = time.monotonic()
+        try:
+            while not self.stopping.is_set():
+                try:
+                    scopes = self.queue.get(timeout=max(0.0, next_sweep - time.monotonic()))
+                except queue.Empty:
+                    self._run_job(self.sweep)
+                    next_sweep = time.monotonic() + self.sweep_interval
+                    continue
+
+                # Coalesce a burst of events into one refetch and diff
+                batch = [scopes]
+                while True:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if None not in batch:
+                    self._run_job(self.refresh_scopes, set().union(*batch))
+                for _ in batch:
+                    self.queue.task_done()
+        finally:
+            if self.server is not None:
+                self.server.shutdown()
+                self.server.server_close()
+            if self.collector is not None:
+                self.collector.close()
+            logger.info("Daemon stopped")
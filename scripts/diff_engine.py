@@ -1,14 +1,21 @@
+import numpy as np
 import pandas as pd
+import gzip
+import itertools
 import json
 from datetime import datetime
 import logging
-from typing import Dict, List, Any
+from typing import Any, Dict, Iterable, Iterator, List, Set, Union
+from scripts.collectors import latest_actuals_paths
+from scripts.finding_store import add_fingerprints
+from scripts.grant_model import GrantVocabulary, Permission
+from scripts.sot_index import SoTIndex, SoTIndexCache
 
 logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(_name_)
+logger = logging.getLogger(__name__)
 
 class DiffEngine:
-    def _init_(self):
+    def __init__(self):
         self.drift_found = False
         self.drift_report = {
             "timestamp": datetime.now().isoformat(),
@@ -21,98 +28,264 @@ class DiffEngine:
             }
         }
     
+    def load_sot_index(self, sot_path: str = "sot/access_matrix.csv", strict: bool = False) -> SoTIndex:
+        """Load the compiled SoT index, recompiling only when the CSV content changed"""
+        return SoTIndexCache().load_or_compile(sot_path, self.sot_grants, strict=strict)
+    
     def load_sot(self, sot_path: str = "sot/access_matrix.csv") -> pd.DataFrame:
         """Load Source of Truth CSV"""
         try:
-            sot = pd.read_csv(sot_path)
-            sot['expires_on'] = pd.to_datetime(sot['expires_on'])
+            sot = self.load_sot_index(sot_path).sot
             logger.info(f"Loaded SoT with {len(sot)} records")
             return sot
         except Exception as e:
             logger.error(f"Error loading SoT: {e}")
             return pd.DataFrame()
     
+    def iter_actuals(self, actuals_path: str) -> Iterator[Dict]:
+        """Stream actuals from NDJSON (optionally gzipped) or a legacy JSON array"""
+        opener = gzip.open if actuals_path.endswith('.gz') else open
+        
+        with opener(actuals_path, 'rt') as f:
+            first = f.read(1)
+            while first.isspace():
+                first = f.read(1)
+            
+            # Legacy format: one big JSON array that has to be read whole
+            if first == '[':
+                yield from json.loads(first + f.read())
+                return
+            
+            if first:
+                yield json.loads(first + f.readline())
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    
     def load_actuals(self, actuals_path: str) -> List[Dict]:
-        """Load actuals from JSON file"""
+        """Load actuals from NDJSON or legacy JSON file"""
         try:
-            with open(actuals_path, 'r') as f:
-                actuals = json.load(f)
+            actuals = list(self.iter_actuals(actuals_path))
             logger.info(f"Loaded actuals with {len(actuals)} records")
             return actuals
         except Exception as e:
             logger.error(f"Error loading actuals: {e}")
             return []
     
+    @staticmethod
+    def _scope_items(scope: str) -> List[str]:
+        """Split a 'repos:a|b' scope string into ['repos:a', 'repos:b']"""
+        kind, sep, items = scope.partition(':')
+        if not sep:
+            return [scope]
+        return [f"{kind}:{item}" for item in items.split('|')]
+    
+    @classmethod
+    def _explode_scopes(cls, frame: pd.DataFrame) -> pd.DataFrame:
+        """One row per scope item; each distinct scope string is split only once"""
+        codes, uniques = pd.factorize(frame['scope'].fillna('').astype(str))
+        items = pd.Series([cls._scope_items(scope) for scope in uniques], dtype=object)
+        return frame.assign(scope=items.take(codes).to_numpy()).explode('scope')
+    
+    def sot_grants(self, sot: pd.DataFrame, vocabulary: GrantVocabulary = None) -> pd.DataFrame:
+        """One row per SoT grant with interned (system, principal, resource) IDs"""
+        grants = sot[['system', 'username', 'email', 'role', 'scope', 'expires_on']].copy()
+        vocabulary = vocabulary or GrantVocabulary()
+        return vocabulary.encode(self._explode_scopes(grants).reset_index(drop=True))
+    
+    def actual_grants(self, actuals: Iterable[Dict], vocabulary: GrantVocabulary = None) -> pd.DataFrame:
+        """One row per collected grant with interned IDs; accepts a record stream
+        
+        Pass the SoT index vocabulary so both sides of a diff share IDs.
+        """
+        record_count = 0
+        rows = []
+        for a in actuals:
+            record_count += 1
+            # Only the diff columns are kept - source payloads are dropped as we go
+            for scope in (a.get('scope') or ['']):
+                rows.append((a.get('system', ''), a.get('username', ''), a.get('email') or '', a.get('role', 'unknown'), scope))
+        
+        grants = pd.DataFrame(rows, columns=['system', 'username', 'email', 'role', 'scope'])
+        del rows
+        vocabulary = vocabulary or GrantVocabulary()
+        grants = vocabulary.encode(self._explode_scopes(grants).reset_index(drop=True))
+        grants.attrs['record_count'] = record_count
+        return grants
+    
+    @staticmethod
+    def _text(column: pd.Series) -> pd.Series:
+        """Plain strings from a (possibly categorical) column, blanks for missing values"""
+        return column.astype(object).fillna('')
+    
+    def join_grants(self, sot_grants: pd.DataFrame, actual_grants: pd.DataFrame) -> pd.DataFrame:
+        """Outer join SoT and actual grants on their (system, principal, resource) IDs"""
+        keys = ['system_id', 'principal_id', 'resource_id']
+        return pd.merge(
+            sot_grants.drop_duplicates(keys),
+            actual_grants.drop_duplicates(keys),
+            on=keys,
+            how='outer',
+            suffixes=('_sot', '_actual'),
+            indicator=True
+        )
+    
     def check_expired(self, sot: pd.DataFrame) -> List[Dict]:
         """Check for expired access"""
-        expired = []
         today = pd.Timestamp.now()
+        expired = sot[sot['expires_on'].notna() & (sot['expires_on'] < today)]
         
-        for _, row in sot.iterrows():
-            if pd.notna(row['expires_on']) and row['expires_on'] < today:
-                expired.append({
-                    "system": row['system'],
-                    "username": row['username'],
-                    "email": row['email'],
-                    "role": row['role'],
-                    "scope": row['scope'],
-                    "expires_on": row['expires_on'].strftime('%Y-%m-%d'),
-                    "reason": "Access expired"
-                })
-        
-        return expired
-    
-    def find_extra_access(self, sot: pd.DataFrame, actuals: List[Dict]) -> List[Dict]:
+        return pd.DataFrame({
+            "system": expired['system'],
+            "username": expired['username'],
+            "email": expired['email'].fillna(''),
+            "role": expired['role'],
+            "scope": expired['scope'],
+            "expires_on": expired['expires_on'].dt.strftime('%Y-%m-%d'),
+            "reason": "Access expired"
+        }).to_dict('records')
+    
+    def find_extra_access(self, sot: pd.DataFrame, actuals: Iterable[Dict], joined: pd.DataFrame = None,
+                          known_users: Set = None) -> List[Dict]:
         """Find access in actuals but not in SoT"""
-        extra = []
-        sot_usernames = set(sot['username'].str.lower())
-        
-        for actual in actuals:
-            if actual['username'].lower() not in sot_usernames:
-                extra.append({
-                    "system": actual['system'],
-                    "username": actual['username'],
-                    "email": actual.get('email', ''),
-                    "role": actual.get('role', 'unknown'),
-                    "scope": actual.get('scope', []),
-                    "reason": "User not found in SoT"
-                })
-        
-        return extra
+        if joined is None:
+            vocabulary = GrantVocabulary()
+            joined = self.join_grants(self.sot_grants(sot, vocabulary), self.actual_grants(actuals, vocabulary))
+        
+        extra = joined[joined['_merge'] == 'right_only']
+        # A join over a subset of scopes must be given every SoT (system_id, principal_id) to tell the two reasons apart
+        if known_users is None:
+            known_users = set(zip(joined.loc[joined['_merge'] != 'right_only', 'system_id'],
+                                  joined.loc[joined['_merge'] != 'right_only', 'principal_id']))
+        user_known = [key in known_users for key in zip(extra['system_id'], extra['principal_id'])]
+        
+        return pd.DataFrame({
+            "system": extra['system_actual'],
+            "username": extra['username_actual'],
+            "email": self._text(extra['email_actual']),
+            "role": extra['role_actual'],
+            "scope": extra['scope_actual'].astype(object).map(lambda scope: [scope]),
+            "reason": pd.Series(user_known, index=extra.index, dtype=bool).map(
+                {True: "Grant not in SoT", False: "User not found in SoT"})
+        }).to_dict('records')
+    
+    def find_missing_access(self, joined: pd.DataFrame, collected: Set = None) -> List[Dict]:
+        """Find unexpired SoT grants that were not found in actuals"""
+        # Only systems we actually collected from can have missing grants
+        if collected is None:
+            collected = set(joined.loc[joined['_merge'] != 'left_only', 'system_id'])
+        today = pd.Timestamp.now()
+        
+        missing = joined[
+            (joined['_merge'] == 'left_only')
+            & joined['system_id'].isin(collected)
+            & ~(joined['expires_on'].notna() & (joined['expires_on'] < today))
+        ]
+        
+        return pd.DataFrame({
+            "system": missing['system_sot'],
+            "username": missing['username_sot'],
+            "email": self._text(missing['email_sot']),
+            "role": missing['role_sot'],
+            "scope": missing['scope_sot'],
+            "reason": "Granted in SoT but not found"
+        }).to_dict('records')
+    
+    def find_wrong_role(self, joined: pd.DataFrame) -> List[Dict]:
+        """Find grants present in both where the permission differs from SoT"""
+        both = joined[joined['_merge'] == 'both']
+        expected = both['permission_sot'].to_numpy()
+        actual = both['permission_actual'].to_numpy()
+        
+        # Roles on the permission ladder compare by level (so 'push' == 'write'); others by name
+        ranked = (expected != Permission.NONE) & (actual != Permission.NONE)
+        differs = np.where(ranked, expected != actual, both['role_id_sot'].to_numpy() != both['role_id_actual'].to_numpy())
+        wrong = both[differs]
+        ranked, expected, actual = ranked[differs], expected[differs], actual[differs]
+        
+        return pd.DataFrame({
+            "system": wrong['system_actual'],
+            "username": wrong['username_actual'],
+            "email": self._text(wrong['email_actual']),
+            "scope": wrong['scope_actual'],
+            "expected_role": wrong['role_sot'],
+            "actual_role": wrong['role_actual'],
+            "change": np.where(ranked, np.where(actual > expected, 'escalated', 'reduced'), ''),
+            "reason": "Role differs from SoT"
+        }).to_dict('records')
     
     def generate_diff(self, sot_path: str = "sot/access_matrix.csv", 
-                     actuals_path: str = "out/github_actuals_latest.json"):
-        """Generate diff report between SoT and actuals"""
+                     actuals_path: Union[str, List[str]] = None):
+        """Generate diff report between SoT and one or more actuals files"""
         logger.info("Generating diff report...")
         
-        sot = self.load_sot(sot_path)
-        actuals = self.load_actuals(actuals_path)
+        # Default to the latest file of every configured system
+        if actuals_path is None:
+            actuals_path = latest_actuals_paths() or ["out/github_actuals_latest.ndjson.gz"]
+        actuals_paths = [actuals_path] if isinstance(actuals_path, str) else list(actuals_path)
         
-        if sot.empty or not actuals:
+        try:
+            sot_index = self.load_sot_index(sot_path)
+            sot = sot_index.sot
+            logger.info(f"Loaded SoT with {len(sot)} records")
+        except Exception as e:
+            logger.error(f"Error loading SoT: {e}")
+            return self.drift_report
+        
+        # Stream actuals straight into the grant table instead of loading every record
+        try:
+            records = itertools.chain.from_iterable(self.iter_actuals(path) for path in actuals_paths)
+            actual_grants = self.actual_grants(records, sot_index.vocabulary)
+        except Exception as e:
+            logger.error(f"Error loading actuals: {e}")
+            actual_grants = pd.DataFrame()
+        
+        if sot.empty or actual_grants.empty:
             logger.error("SoT or actuals data is empty")
             return self.drift_report
         
+        logger.info(f"Loaded actuals with {actual_grants.attrs['record_count']} records")
+        return self.diff_grants(sot_index, actual_grants)
+    
+    def diff_grants(self, sot_index: SoTIndex, actual_grants: pd.DataFrame) -> Dict:
+        """Diff a compiled SoT against actual grants encoded with the index's vocabulary"""
+        sot = sot_index.sot
+        
+        # One keyed join drives extra, missing and wrong_role
+        joined = self.join_grants(sot_index.grants, actual_grants)
+        
         # Check for different types of drift
         expired = self.check_expired(sot)
-        extra = self.find_extra_access(sot, actuals)
+        extra = self.find_extra_access(sot, None, joined)
+        missing = self.find_missing_access(joined)
+        wrong_role = self.find_wrong_role(joined)
         
         # Update drift report
         self.drift_report['details']['expired'] = expired
         self.drift_report['details']['extra'] = extra
+        self.drift_report['details']['missing'] = missing
+        self.drift_report['details']['wrong_role'] = wrong_role
+        add_fingerprints(self.drift_report['details'])
         
         # Summary statistics
         self.drift_report['summary'] = {
             "total_sot_records": len(sot),
-            "total_actuals_records": len(actuals),
+            "rejected_sot_rows": len(sot_index.rejected),
+            "total_actuals_records": actual_grants.attrs.get('record_count', len(actual_grants)),
             "expired_count": len(expired),
             "extra_count": len(extra),
-            "drift_found": len(expired) > 0 or len(extra) > 0
+            "missing_count": len(missing),
+            "wrong_role_count": len(wrong_role),
+            "drift_found": any([expired, extra, missing, wrong_role])
         }
         
         self.drift_found = self.drift_report['summary']['drift_found']
         
         if self.drift_found:
-            logger.warning(f"Drift detected: {len(expired)} expired, {len(extra)} extra access")
+            logger.warning(
+                f"Drift detected: {len(expired)} expired, {len(extra)} extra, "
+                f"{len(missing)} missing, {len(wrong_role)} wrong role"
+            )
         else:
             logger.info("No drift detected - access is clean!")
         
@@ -135,5 +308,5 @@ def main():
     report = engine.generate_diff()
     engine.save_diff_report(report)
 
-if _name_ == "_main_":
+if __name__ == "__main__":
     main()
\ No newline at end of file
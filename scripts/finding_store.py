@@ -0,0 +1,164 @@
+import hashlib
+import json
+import logging
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from config.settings import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+FINDING_BUCKETS = ['expired', 'extra', 'missing', 'wrong_role']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS findings (
+    fingerprint TEXT PRIMARY KEY,
+    bucket TEXT NOT NULL,
+    system TEXT NOT NULL,
+    username TEXT NOT NULL,
+    detail TEXT NOT NULL,
+    first_seen TEXT NOT NULL,
+    resolved_at TEXT
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS findings_open ON findings (system, fingerprint) WHERE resolved_at IS NULL;
+
+-- One row per time a finding was open, so reopened findings keep their earlier episodes
+CREATE TABLE IF NOT EXISTS finding_spans (
+    id INTEGER PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    system TEXT NOT NULL,
+    username TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    opened_at TEXT NOT NULL,
+    resolved_at TEXT
+);
+CREATE INDEX IF NOT EXISTS finding_spans_open ON finding_spans (fingerprint) WHERE resolved_at IS NULL;
+CREATE INDEX IF NOT EXISTS finding_spans_user ON finding_spans (username, opened_at);
+CREATE INDEX IF NOT EXISTS finding_spans_scope ON finding_spans (scope, opened_at);
+CREATE INDEX IF NOT EXISTS finding_spans_resolved ON finding_spans (bucket, resolved_at) WHERE resolved_at IS NOT NULL;
+"""
+
+def _norm(value):
+    if isinstance(value, list):
+        return '|'.join(sorted(str(item).strip() for item in value))
+    return str(value).strip() if value is not None else ''
+
+def fingerprint(bucket, item):
+    """Stable identity of a finding: what kind of drift, for whom, where and with which role"""
+    get = item.get
+    if bucket == 'wrong_role':
+        role = f"{_norm(get('expected_role'))}>{_norm(get('actual_role'))}"
+    else:
+        role = _norm(get('role'))
+    key = f"{bucket}\x1f{_norm(get('system'))}\x1f{_norm(get('username'))}\x1f{_norm(get('scope'))}\x1f{role}"
+    return hashlib.sha1(key.lower().encode()).hexdigest()
+
+def add_fingerprints(details):
+    """Tag every finding in a report's details with its fingerprint"""
+    for bucket in FINDING_BUCKETS:
+        for item in details.get(bucket, []):
+            item['fingerprint'] = fingerprint(bucket, item)
+
+class FindingStore:
+    """SQLite record of findings across runs, keyed by fingerprint"""
+
+    def __init__(self, db_path=None):
+        self.db_path = Path(db_path or settings.FINDINGS_DB)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._backfill_spans()
+
+    def _backfill_spans(self):
+        """Open a span for every open finding without one, e.g. findings from before spans were kept"""
+        rows = self.conn.execute(
+            "SELECT fingerprint, bucket, system, username, detail, first_seen FROM findings "
+            "WHERE resolved_at IS NULL AND fingerprint NOT IN "
+            "(SELECT fingerprint FROM finding_spans WHERE resolved_at IS NULL)"
+        ).fetchall()
+        if not rows:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO finding_spans (fingerprint, bucket, system, username, scope, opened_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (fp, bucket, system, username, _norm(json.loads(detail).get('scope')).lower(), first_seen)
+                    for fp, bucket, system, username, detail, first_seen in rows
+                )
+            )
+        logger.info(f"Opened history spans for {len(rows)} findings already open")
+
+    def close(self):
+        self.conn.close()
+
+    def reconcile(self, report, skip_systems=(), at=None):
+        """Mark each finding new or open, resolve findings that are gone; returns counts"""
+        details = report.get('details', {})
+        now = (at or datetime.now()).isoformat()
+
+        current = {}
+        for bucket in FINDING_BUCKETS:
+            for item in details.get(bucket, []):
+                if 'fingerprint' not in item:
+                    item['fingerprint'] = fingerprint(bucket, item)
+                current[item['fingerprint']] = (bucket, item)
+
+        # Open fingerprints come straight from the partial index, without touching table rows
+        open_rows = self.conn.execute(
+            "SELECT fingerprint, system FROM findings INDEXED BY findings_open WHERE resolved_at IS NULL"
+        ).fetchall()
+        already_open = {fp for fp, _ in open_rows if fp in current}
+
+        # Systems that failed to collect this run can't prove their findings are gone
+        skip = {_norm(system).lower() for system in skip_systems}
+        gone = [(now, fp) for fp, system in open_rows if fp not in current and system not in skip]
+
+        opened = [(fp, bucket, item) for fp, (bucket, item) in current.items() if fp not in already_open]
+        with self.conn:
+            # Still-open findings need no write at all; only new, reopened and resolved ones change
+            self.conn.executemany(
+                "INSERT INTO findings (fingerprint, bucket, system, username, detail, first_seen) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (fingerprint) DO UPDATE SET detail = excluded.detail, "
+                "first_seen = excluded.first_seen, resolved_at = NULL",
+                (
+                    (fp, bucket, _norm(item.get('system')).lower(), _norm(item.get('username')).lower(),
+                     json.dumps(item, default=str), now)
+                    for fp, bucket, item in opened
+                )
+            )
+            self.conn.executemany("UPDATE findings SET resolved_at = ? WHERE fingerprint = ?", gone)
+            self.conn.executemany(
+                "INSERT INTO finding_spans (fingerprint, bucket, system, username, scope, opened_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (fp, bucket, _norm(item.get('system')).lower(), _norm(item.get('username')).lower(),
+                     _norm(item.get('scope')).lower(), now)
+                    for fp, bucket, item in opened
+                )
+            )
+            self.conn.executemany(
+                "UPDATE finding_spans SET resolved_at = ? WHERE fingerprint = ? AND resolved_at IS NULL", gone
+            )
+
+        resolved = len(gone)
+        new_count = len(opened)
+        open_count = len(open_rows) - resolved + new_count
+        for bucket in FINDING_BUCKETS:
+            for item in details.get(bucket, []):
+                item['status'] = 'open' if item['fingerprint'] in already_open else 'new'
+
+        counts = {
+            "new_count": new_count,
+            "resolved_count": resolved,
+            "still_open_count": open_count - new_count,
+            "open_count": open_count
+        }
+        report.setdefault('summary', {}).update(counts)
+        logger.info(f"Findings: {new_count} new, {resolved} resolved, {open_count - new_count} still open")
+        return counts
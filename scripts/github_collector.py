@@ -1,43 +1,115 @@
 import requests
-import pandas as pd
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 import json
 import logging
+import os
+from requests.adapters import HTTPAdapter
+from requests.models import PreparedRequest
 from config.settings import settings
+from scripts.collectors import BaseCollector, CollectionError
+from scripts.rate_limiter import RateLimitExceeded, RequestScheduler
+from scripts.response_cache import ResponseCache
 
 logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(_name_)
+logger = logging.getLogger(__name__)
 
-class GitHubCollector:
-    def _init_(self):
+class GitHubCollector(BaseCollector):
+    system = 'github'
+    
+    def __init__(self, max_workers=None, use_cache=None, incremental=None):
         self.headers = {
             'Authorization': f'token {settings.ACCOUNT_TOKEN}',
             'Accept': 'application/vnd.github.v3+json'
         }
-        self.base_url = 'https://api.github.com'
+        self.base_url = settings.GITHUB_API_URL.rstrip('/')
+        self.timeout = 30
+        self.max_workers = max(1, max_workers or settings.GITHUB_MAX_WORKERS)
+        self.session = self._create_session()
+        
+        if use_cache is None:
+            use_cache = settings.HTTP_CACHE_ENABLED
+        self.cache = ResponseCache() if use_cache else None
+        self.cache_identity = ResponseCache.identity(settings.ACCOUNT_TOKEN)
+        self.scheduler = RequestScheduler(
+            rate=settings.GITHUB_REQUESTS_PER_SECOND,
+            max_retries=settings.GITHUB_MAX_RETRIES
+        )
+        
+        if incremental is None:
+            incremental = settings.GITHUB_INCREMENTAL
+        self.incremental = incremental
+        self.state_file = settings.GITHUB_STATE_FILE
+    
+    def _create_session(self):
+        """Create a keep-alive session whose pool is shared by all workers"""
+        session = requests.Session()
+        session.headers.update(self.headers)
+        
+        # One connection per worker plus one for the paginating caller thread
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers + 1)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+    
+    def close(self):
+        """Close pooled HTTP connections"""
+        self.session.close()
+    
+    def _get(self, url):
+        """GET a URL, revalidating any cached copy; returns (data, links)"""
+        cached = self.cache.get(url, self.cache_identity) if self.cache else None
+        headers = self.cache.conditional_headers(cached) if cached else {}
+        
+        response = self.scheduler.request(self.session, 'GET', url, headers=headers, timeout=self.timeout)
+        
+        # 304 Not Modified is free against the rate limit - serve the cached body
+        if response.status_code == 304 and cached:
+            self.cache.record_hit(url, self.cache_identity)
+            return cached['body'], cached.get('links', {})
+        
+        response.raise_for_status()
+        if self.cache:
+            self.cache.put(url, self.cache_identity, response)
+        return response.json(), response.links
     
     def get_user_info(self):
         """Get authenticated user information"""
         try:
-            response = requests.get(f'{self.base_url}/user', headers=self.headers)
-            response.raise_for_status()
-            return response.json()
+            data, _ = self._get(f'{self.base_url}/user')
+            return data
         except requests.exceptions.RequestException as e:
             logger.error(f"Error getting user info: {e}")
             return None
     
+    def _paginate(self, url, params=None):
+        """Yield items from every page of a list endpoint, following Link rel=next"""
+        request = PreparedRequest()
+        request.prepare_url(url, dict(params or {}, per_page=100))
+        url = request.url
+        
+        while url:
+            items, links = self._get(url)
+            
+            for item in items:
+                yield item
+            
+            # The next URL already carries per_page and the page cursor
+            url = links.get('next', {}).get('url')
+    
+    def iter_user_repos(self, username=None):
+        """Yield user repositories page by page - for personal account"""
+        if username:
+            url = f'{self.base_url}/users/{username}/repos'
+        else:
+            url = f'{self.base_url}/user/repos'
+        
+        return self._paginate(url)
+    
     def get_user_repos(self, username=None):
         """Get user repositories - for personal account"""
         try:
-            if username:
-                url = f'{self.base_url}/users/{username}/repos'
-            else:
-                url = f'{self.base_url}/user/repos'
-            
-            response = requests.get(url, headers=self.headers)
-            response.raise_for_status()
-            repos = response.json()
-            
+            repos = list(self.iter_user_repos(username))
             logger.info(f"Found {len(repos)} repositories for user")
             return repos
             
@@ -45,87 +117,204 @@ class GitHubCollector:
             logger.error(f"Error getting repos: {e}")
             return []
     
+    def iter_collaborators(self, owner, repo):
+        """Yield collaborators for a specific repository page by page"""
+        return self._paginate(f'{self.base_url}/repos/{owner}/{repo}/collaborators')
+    
     def get_collaborators(self, owner, repo):
         """Get collaborators for a specific repository"""
         try:
-            url = f'{self.base_url}/repos/{owner}/{repo}/collaborators'
-            response = requests.get(url, headers=self.headers)
-            if response.status_code == 200:
-                return response.json()
-            else:
-                logger.warning(f"Can't access collaborators for {repo}: {response.status_code}")
+            return list(self.iter_collaborators(owner, repo))
+        except RateLimitExceeded as e:
+            # Still rate limited after every retry - the collaborators are unknown, not absent
+            raise CollectionError(f"Rate limited getting collaborators for {repo}: {e}") from e
+        except requests.exceptions.HTTPError as e:
+            # No push access or repo gone - a permanent answer, not a gap in the data
+            if e.response.status_code in (403, 404):
+                logger.warning(f"Can't access collaborators for {repo}: {e.response.status_code}")
                 return []
+            raise CollectionError(f"Error getting collaborators for {repo}: {e}") from e
         except requests.exceptions.RequestException as e:
-            logger.warning(f"Error getting collaborators for {repo}: {e}")
-            return []
+            # An empty list here would later be reported as missing access
+            raise CollectionError(f"Error getting collaborators for {repo}: {e}") from e
+    
+    def _load_state(self, owner):
+        """Load per-repo collection state left by the previous (or interrupted) run"""
+        try:
+            with open(self.state_file, 'r') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable state file {self.state_file}: {e}")
+            return {}
+        
+        # State from another account must never be merged into this one
+        if state.get('owner') != owner:
+            return {}
+        return state.get('repos', {})
+    
+    def _save_state(self, owner, repos):
+        """Atomically write per-repo state so an interrupted run can resume"""
+        tmp_file = f"{self.state_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump({"owner": owner, "saved_at": datetime.now().isoformat(), "repos": repos}, f)
+        os.replace(tmp_file, self.state_file)
+    
+    def _is_fresh(self, entry, repo):
+        """Check whether a stored repo entry can be reused without refetching"""
+        if not entry or entry.get('updated_at') != repo.get('updated_at'):
+            return False
+        
+        # Collaborator changes don't touch updated_at, so entries also expire by age
+        age = datetime.now() - datetime.fromisoformat(entry['fetched_at'])
+        return age < timedelta(hours=settings.GITHUB_STATE_MAX_AGE_HOURS)
+    
+    def _fetch_repo_entry(self, owner, repo):
+        """Fetch collaborators for a repo and wrap them as a state entry"""
+        return {
+            "updated_at": repo.get('updated_at'),
+            "fetched_at": datetime.now().isoformat(),
+            "collaborators": self.get_collaborators(owner, repo['name'])
+        }
+    
+    def _collaborator_record(self, collaborator, repo_name):
+        return {
+            "system": "github",
+            "username": collaborator['login'],
+            "email": collaborator.get('email', ''),
+            "role": collaborator.get('role_name') or collaborator.get('role', 'collaborator'),
+            "scope": [f"repos:{repo_name}"],
+            "collected_at": datetime.now().isoformat(),
+            "source": {"raw": collaborator}
+        }
+    
+    def repo_records(self, owner, repo_name):
+        """Collect current access records for a single repository, owner grant included"""
+        records = []
+        for collaborator in self.get_collaborators(owner, repo_name):
+            record = self._collaborator_record(collaborator, repo_name)
+            # The owner is listed as a collaborator of every repo it still owns
+            if collaborator['login'] == owner:
+                record['role'] = 'owner'
+            records.append(record)
+        return records
     
     def collect_actuals(self):
         """Collect actual access data from GitHub"""
+        return list(self.iter_actuals())
+    
+    def iter_actuals(self):
+        """Yield actual access records from GitHub as they are collected"""
         logger.info("Starting GitHub data collection...")
         
-        actuals = []
+        record_count = 0
         user_info = self.get_user_info()
         
         if not user_info:
-            logger.error("Failed to get user info - check GITHUB_TOKEN")
-            return actuals
-        
-        # Get current user's repositories
-        repos = self.get_user_repos()
+            # Ending quietly would save an empty actuals file and make every grant look revoked
+            raise CollectionError("Failed to get user info - check GITHUB_TOKEN")
         
-        # Add current user data
-        user_data = {
-            "system": "github",
-            "username": user_info['login'],
-            "email": user_info.get('email', ''),
-            "role": "owner",
-            "scope": [f"repos:{'|'.join([repo['name'] for repo in repos])}"],
-            "collected_at": datetime.now().isoformat(),
-            "source": {"raw": user_info}
-        }
-        actuals.append(user_data)
-        logger.info(f"Collected data for user: {user_info['login']}")
+        owner = user_info['login']
+        state = self._load_state(owner) if self.incremental else {}
+        repo_names = []
+        pending = []
+        reused = 0
         
-        # Collect collaborators from each repository
-        for repo in repos:
-            collaborators = self.get_collaborators(user_info['login'], repo['name'])
-            
-            for collaborator in collaborators:
-                # Skip the owner (already added)
-                if collaborator['login'] == user_info['login']:
-                    continue
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            try:
+                # Start collaborator lookups while later repo pages are still downloading
+                try:
+                    for repo in self.iter_user_repos():
+                        repo_names.append(repo['name'])
+                        entry = state.get(repo['name'])
+                        if self.incremental and self._is_fresh(entry, repo):
+                            pending.append(entry)
+                            reused += 1
+                        else:
+                            pending.append(executor.submit(self._fetch_repo_entry, owner, repo))
+                except requests.exceptions.RequestException as e:
+                    # A partial repo list would make every later repo look revoked
+                    raise CollectionError(f"Error getting repos: {e}") from e
                 
-                collaborator_data = {
+                logger.info(f"Found {len(repo_names)} repositories for user")
+                if self.incremental:
+                    logger.info(f"Incremental run: reusing {reused} unchanged repos, fetching {len(repo_names) - reused}")
+                
+                # Add current user data
+                user_data = {
                     "system": "github",
-                    "username": collaborator['login'],
-                    "email": collaborator.get('email', ''),
-                    "role": collaborator.get('role', 'collaborator'),
-                    "scope": [f"repos:{repo['name']}"],
+                    "username": owner,
+                    "email": user_info.get('email', ''),
+                    "role": "owner",
+                    "scope": [f"repos:{'|'.join(repo_names)}"],
                     "collected_at": datetime.now().isoformat(),
-                    "source": {"raw": collaborator}
+                    "source": {"raw": user_info}
                 }
-                actuals.append(collaborator_data)
-                logger.info(f"Found collaborator: {collaborator['login']} on {repo['name']}")
+                yield user_data
+                record_count += 1
+                logger.info(f"Collected data for user: {owner}")
+                
+                # Consume results in submission order so actuals stay deterministic
+                for index, (repo_name, item) in enumerate(zip(repo_names, pending), 1):
+                    entry = item if isinstance(item, dict) else item.result()
+                    
+                    if self.incremental:
+                        state[repo_name] = entry
+                        if index % settings.GITHUB_CHECKPOINT_EVERY == 0:
+                            self._save_state(owner, state)
+                    
+                    for collaborator in entry['collaborators']:
+                        # Skip the owner (already added)
+                        if collaborator['login'] == owner:
+                            continue
+                        
+                        yield self._collaborator_record(collaborator, repo_name)
+                        record_count += 1
+                        logger.info(f"Found collaborator: {collaborator['login']} on {repo_name}")
+            except CollectionError as e:
+                logger.error(f"GitHub collection aborted: {e}")
+                for item in pending:
+                    if not isinstance(item, dict):
+                        item.cancel()
+                if self.incremental:
+                    # Keep every repo that did finish so the next run resumes from here
+                    for repo_name, item in zip(repo_names, pending):
+                        if not isinstance(item, dict) and item.done() and not item.cancelled() and not item.exception():
+                            state[repo_name] = item.result()
+                    self._save_state(owner, state)
+                raise
         
-        logger.info(f"Collection complete: {len(actuals)} total access records")
-        return actuals
-    
-    def save_actuals(self, actuals, filename=None):
-        """Save collected data to JSON file"""
-        if not filename:
-            filename = "out/github_actuals_latest.json"
+        if self.incremental:
+            # Drop repos that no longer exist so the state mirrors this run
+            self._save_state(owner, {name: state[name] for name in repo_names})
         
-        with open(filename, 'w') as f:
-            json.dump(actuals, f, indent=2)
+        self._log_run_stats()
+        logger.info(f"Collection complete: {record_count} total access records")
+    
+    def _log_run_stats(self):
+        """Log cache effectiveness and API budget used by this run"""
+        if self.cache:
+            stats = self.cache.stats()
+            logger.info(f"HTTP cache: {stats['hits']} not-modified hits, {stats['misses']} full responses")
         
-        logger.info(f"GitHub actuals saved to {filename}")
-        return filename
+        budget = self.scheduler.stats()
+        logger.info(
+            f"API budget: {budget['budget_used']} of {budget['requests']} requests counted, "
+            f"{budget['retries']} retries, {budget['rate_limit_remaining']} remaining"
+        )
+    
+    def stats(self):
+        """Return API budget and cache counters for this run"""
+        stats = self.scheduler.stats()
+        if self.cache:
+            stats.update(cache_hits=self.cache.hits, cache_misses=self.cache.misses)
+        return stats
 
 def main():
     collector = GitHubCollector()
-    actuals = collector.collect_actuals()
-    collector.save_actuals(actuals)
+    collector.save_actuals(collector.iter_actuals())
 
-if _name_ == "_main_":
+if __name__ == "__main__":
 
     main()
@@ -0,0 +1,293 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import requests
+from config.settings import settings
+from scripts.github_collector import CollectionError, GitHubCollector
+from scripts.rate_limiter import RateLimitExceeded
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PAGE_INFO = "pageInfo { hasNextPage endCursor }"
+
+MEMBERS_QUERY = """
+query($org: String!, $cursor: String) {
+  organization(login: $org) {
+    membersWithRole(first: 100, after: $cursor) {
+      %s
+      edges { role node { login email } }
+    }
+  }
+}
+""" % PAGE_INFO
+
+MEMBER_COUNT_QUERY = """
+query($org: String!) {
+  organization(login: $org) {
+    membersWithRole { totalCount }
+  }
+}
+"""
+
+TEAMS_QUERY = """
+query($org: String!, $cursor: String) {
+  organization(login: $org) {
+    teams(first: 50, after: $cursor) {
+      %s
+      nodes {
+        slug
+        members(first: 100, membership: IMMEDIATE) {
+          %s
+          edges { role node { login email } }
+        }
+      }
+    }
+  }
+}
+""" % (PAGE_INFO, PAGE_INFO)
+
+TEAM_MEMBERS_QUERY = """
+query($org: String!, $team: String!, $cursor: String) {
+  organization(login: $org) {
+    team(slug: $team) {
+      members(first: 100, after: $cursor, membership: IMMEDIATE) {
+        %s
+        edges { role node { login email } }
+      }
+    }
+  }
+}
+""" % PAGE_INFO
+
+REPOS_QUERY = """
+query($org: String!, $pageSize: Int!, $cursor: String) {
+  organization(login: $org) {
+    repositories(first: $pageSize, after: $cursor, orderBy: {field: NAME, direction: ASC}) {
+      %s
+      nodes {
+        name
+        collaborators(first: 100, affiliation: ALL) {
+          %s
+          edges { permission node { login email } }
+        }
+      }
+    }
+  }
+}
+""" % (PAGE_INFO, PAGE_INFO)
+
+REPO_COLLABORATORS_QUERY = """
+query($org: String!, $repo: String!, $cursor: String) {
+  repository(owner: $org, name: $repo) {
+    collaborators(first: 100, after: $cursor, affiliation: ALL) {
+      %s
+      edges { permission node { login email } }
+    }
+  }
+}
+""" % PAGE_INFO
+
+def _graphql_rate_limited(response):
+    """GraphQL reports its rate limit as a RATE_LIMITED error on an HTTP 200"""
+    try:
+        errors = response.json().get('errors') or []
+    except ValueError:
+        return False
+    return any(error.get('type') == 'RATE_LIMITED' for error in errors)
+
+class GitHubOrgCollector(GitHubCollector):
+    """Collect organization access through batched GraphQL queries"""
+
+    def __init__(self, org=None, max_workers=None, use_cache=None):
+        super().__init__(max_workers=max_workers, use_cache=use_cache)
+        self.org = org or settings.GITHUB_ORG.strip()
+        self.page_size = settings.GITHUB_GRAPHQL_PAGE_SIZE
+
+    def _graphql(self, query, variables):
+        """Run a GraphQL query and return its data, tolerating partial errors"""
+        try:
+            response = self.scheduler.request(
+                self.session, 'POST', f'{self.base_url}/graphql',
+                json={"query": query, "variables": variables},
+                timeout=self.timeout, rate_limited=_graphql_rate_limited
+            )
+        except RateLimitExceeded as e:
+            raise CollectionError(f"GraphQL query failed: {e}") from e
+        response.raise_for_status()
+        payload = response.json()
+
+        errors = payload.get('errors') or []
+        if payload.get('data') is None:
+            message = errors[0].get('message') if errors else 'empty response'
+            raise CollectionError(f"GraphQL query failed: {message}")
+
+        # Fields we may not read (e.g. collaborators without admin) come back null
+        for error in errors:
+            path = '.'.join(str(part) for part in error.get('path', []))
+            logger.warning(f"GraphQL partial error at {path}: {error.get('message')}")
+
+        return payload['data']
+
+    def _connection_pages(self, query, variables, path, cursor=None, allow_missing=False):
+        """Yield each page of a GraphQL connection, following endCursor"""
+        while True:
+            connection = self._graphql(query, dict(variables, cursor=cursor))
+            # A null organization or repository (wrong name, token without access) must not read as empty
+            if connection.get(path[0]) is None and not allow_missing:
+                raise CollectionError(f"GraphQL {path[0]} not found or not accessible: {variables}")
+            for key in path:
+                connection = connection.get(key) if connection else None
+            if connection is None:
+                return
+
+            yield connection
+
+            page_info = connection['pageInfo']
+            if not page_info['hasNextPage']:
+                return
+            cursor = page_info['endCursor']
+
+    def _record(self, user, role, scope, raw):
+        return {
+            "system": "github",
+            "username": user['login'],
+            "email": user.get('email') or '',
+            "role": role,
+            "scope": [scope],
+            "collected_at": datetime.now().isoformat(),
+            "source": {"raw": raw}
+        }
+
+    def collect_members(self):
+        """Collect org members with their org role"""
+        records = []
+        pages = self._connection_pages(MEMBERS_QUERY, {"org": self.org}, ('organization', 'membersWithRole'))
+        for page in pages:
+            for edge in page['edges']:
+                records.append(self._record(edge['node'], edge['role'].lower(), f"org:{self.org}", edge))
+
+        logger.info(f"Found {len(records)} members in {self.org}")
+        return records
+
+    def collect_outside_collaborators(self):
+        """Collect outside collaborators (REST only; not exposed on the GraphQL org)"""
+        records = []
+        for user in self._paginate(f'{self.base_url}/orgs/{self.org}/outside_collaborators'):
+            records.append(self._record(user, 'outside_collaborator', f"org:{self.org}", user))
+
+        logger.info(f"Found {len(records)} outside collaborators in {self.org}")
+        return records
+
+    def collect_team_members(self):
+        """Collect direct team memberships"""
+        records = []
+        pages = self._connection_pages(TEAMS_QUERY, {"org": self.org}, ('organization', 'teams'))
+        for page in pages:
+            for team in page['nodes']:
+                members = team['members']
+                edges = list(members['edges'])
+
+                # Teams larger than one page need their own follow-up query
+                if members['pageInfo']['hasNextPage']:
+                    variables = {"org": self.org, "team": team['slug']}
+                    path = ('organization', 'team', 'members')
+                    cursor = members['pageInfo']['endCursor']
+                    for extra in self._connection_pages(TEAM_MEMBERS_QUERY, variables, path, cursor):
+                        edges.extend(extra['edges'])
+
+                for edge in edges:
+                    raw = dict(edge, team=team['slug'])
+                    records.append(self._record(edge['node'], edge['role'].lower(), f"teams:{team['slug']}", raw))
+
+        logger.info(f"Found {len(records)} team memberships in {self.org}")
+        return records
+
+    def _remaining_collaborators(self, repo, cursor, allow_missing=False):
+        """Fetch collaborator pages after the first one for a single repository"""
+        edges = []
+        variables = {"org": self.org, "repo": repo}
+        path = ('repository', 'collaborators')
+        for page in self._connection_pages(REPO_COLLABORATORS_QUERY, variables, path, cursor, allow_missing):
+            edges.extend(page['edges'])
+        return edges
+
+    def collect_repo_permissions(self):
+        """Collect effective per-repo permissions for many repos per query"""
+        repo_edges = []
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            variables = {"org": self.org, "pageSize": self.page_size}
+            for page in self._connection_pages(REPOS_QUERY, variables, ('organization', 'repositories')):
+                for repo in page['nodes']:
+                    collaborators = repo.get('collaborators')
+                    if collaborators is None:
+                        logger.warning(f"Can't access collaborators for {repo['name']}")
+                        continue
+
+                    overflow = None
+                    if collaborators['pageInfo']['hasNextPage']:
+                        cursor = collaborators['pageInfo']['endCursor']
+                        overflow = executor.submit(self._remaining_collaborators, repo['name'], cursor)
+                    repo_edges.append((repo['name'], collaborators['edges'], overflow))
+
+            logger.info(f"Found {len(repo_edges)} repositories in {self.org}")
+
+            records = []
+            for repo_name, edges, overflow in repo_edges:
+                if overflow is not None:
+                    edges = edges + overflow.result()
+                for edge in edges:
+                    records.append(self._record(edge['node'], edge['permission'].lower(), f"repos:{repo_name}", edge))
+
+        return records
+
+    def member_count(self):
+        """Total organization members, from one GraphQL query"""
+        data = self._graphql(MEMBER_COUNT_QUERY, {"org": self.org})
+        if data.get('organization') is None:
+            raise CollectionError(f"GraphQL organization not found or not accessible: {self.org}")
+        return (data['organization'].get('membersWithRole') or {}).get('totalCount', 0)
+    
+    def iter_members_without_2fa(self):
+        """Yield members without two-factor authentication (requires an org owner token)"""
+        return self._paginate(f'{self.base_url}/orgs/{self.org}/members', {"filter": "2fa_disabled"})
+    
+    def iter_outside_collaborators_without_2fa(self):
+        """Yield outside collaborators without two-factor authentication"""
+        return self._paginate(f'{self.base_url}/orgs/{self.org}/outside_collaborators', {"filter": "2fa_disabled"})
+    
+    def repo_records(self, owner, repo_name):
+        """Collect current collaborator permissions for a single repository"""
+        # A webhook can name a repository that was just deleted; it now grants nothing
+        return [
+            self._record(edge['node'], edge['permission'].lower(), f"repos:{repo_name}", edge)
+            for edge in self._remaining_collaborators(repo_name, None, allow_missing=True)
+        ]
+    
+    def team_records(self, team_slug):
+        """Collect current direct members of a single team"""
+        records = []
+        variables = {"org": self.org, "team": team_slug}
+        for page in self._connection_pages(TEAM_MEMBERS_QUERY, variables, ('organization', 'team', 'members')):
+            for edge in page['edges']:
+                raw = dict(edge, team=team_slug)
+                records.append(self._record(edge['node'], edge['role'].lower(), f"teams:{team_slug}", raw))
+        return records
+    
+    def iter_actuals(self):
+        """Yield actual access records for a GitHub organization"""
+        logger.info(f"Starting GitHub org data collection for {self.org}...")
+
+        record_count = 0
+        try:
+            for collect in (self.collect_members, self.collect_outside_collaborators,
+                            self.collect_team_members, self.collect_repo_permissions):
+                for record in collect():
+                    yield record
+                    record_count += 1
+        except requests.exceptions.RequestException as e:
+            raise CollectionError(f"Error collecting org {self.org}: {e}") from e
+
+        self._log_run_stats()
+        logger.info(f"Collection complete: {record_count} total access records")
@@ -0,0 +1,130 @@
+import logging
+from enum import IntEnum
+import numpy as np
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class Permission(IntEnum):
+    """Ordered repository permission levels; NONE for roles outside the ladder"""
+    NONE = 0
+    READ = 1
+    TRIAGE = 2
+    WRITE = 3
+    MAINTAIN = 4
+    ADMIN = 5
+    OWNER = 6
+
+# REST, GraphQL and legacy permission names for the same level
+PERMISSION_ALIASES = {
+    'pull': Permission.READ,
+    'read': Permission.READ,
+    'triage': Permission.TRIAGE,
+    'push': Permission.WRITE,
+    'write': Permission.WRITE,
+    'maintain': Permission.MAINTAIN,
+    'admin': Permission.ADMIN,
+    'owner': Permission.OWNER,
+}
+
+def permission_of(role):
+    """Permission level of a normalized role name"""
+    return PERMISSION_ALIASES.get(role, Permission.NONE)
+
+def _normalize(values):
+    return pd.Index(values).astype(str).str.strip().str.lower()
+
+class Interner:
+    """Maps distinct strings to dense integer IDs, in first-seen order"""
+
+    def __init__(self, values=()):
+        self.values = []
+        self.index = {}
+        self.intern(values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getstate__(self):
+        # The reverse index is rebuilt on load rather than pickled twice
+        return {'values': self.values}
+
+    def __setstate__(self, state):
+        self.__init__(state['values'])
+
+    def get(self, value, default=-1):
+        return self.index.get(value, default)
+
+    def intern(self, values):
+        """IDs for the given values, assigning new IDs to unseen ones"""
+        ids = np.empty(len(values), dtype=np.int32)
+        for position, value in enumerate(values):
+            value_id = self.index.get(value)
+            if value_id is None:
+                value_id = self.index[value] = len(self.values)
+                self.values.append(value)
+            ids[position] = value_id
+        return ids
+
+    def lookup(self, values):
+        """IDs of the values already interned; unseen values are skipped"""
+        return [self.index[value] for value in values if value in self.index]
+
+    def decode(self, ids):
+        return np.asarray(self.values, dtype=object)[np.asarray(ids)]
+
+# Display column -> (ID column, vocabulary attribute)
+KEY_FIELDS = {
+    'system': ('system_id', 'systems'),
+    'username': ('principal_id', 'principals'),
+    'scope': ('resource_id', 'resources'),
+    'role': ('role_id', 'roles'),
+}
+
+class GrantVocabulary:
+    """Shared interned IDs for systems, principals, resources and roles of one diff"""
+
+    def __init__(self):
+        self.systems = Interner()
+        self.principals = Interner()
+        self.resources = Interner()
+        self.roles = Interner()
+
+    def encode(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """Compact a grant table: categorical display columns, int32 IDs and a permission level"""
+        frame = frame.copy()
+        for column, (id_column, attribute) in KEY_FIELDS.items():
+            # Normalize and intern each distinct value once, then broadcast through the codes
+            codes, uniques = pd.factorize(frame[column].fillna('').astype(str))
+            normalized = _normalize(uniques)
+            frame[column] = pd.Categorical.from_codes(codes, categories=uniques)
+            frame[id_column] = getattr(self, attribute).intern(normalized).take(codes)
+            if column == 'role':
+                levels = np.array([permission_of(role) for role in normalized], dtype=np.int8)
+                frame['permission'] = levels.take(codes)
+        if 'email' in frame:
+            frame['email'] = frame['email'].fillna('').astype(str).astype('category')
+        return frame
+
+    def translate(self, frame: pd.DataFrame, source: 'GrantVocabulary') -> pd.DataFrame:
+        """Re-express a table encoded with another vocabulary in this one's IDs"""
+        frame = frame.copy()
+        for id_column, attribute in KEY_FIELDS.values():
+            codes, uniques = pd.factorize(frame[id_column])
+            ids = getattr(self, attribute).intern(getattr(source, attribute).decode(uniques))
+            frame[id_column] = ids.take(codes)
+        return frame
+
+    def decode_keys(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """Add the normalized string keys (system_key, username_key, scope_key, role_key)"""
+        frame = frame.copy()
+        for column, (id_column, attribute) in KEY_FIELDS.items():
+            frame[f'{column}_key'] = getattr(self, attribute).decode(frame[id_column].to_numpy())
+        return frame
+
+    def system_id(self, system):
+        return self.systems.get(str(system).strip().lower())
+
+    def resource_ids(self, scopes):
+        return self.resources.lookup(str(scope).strip().lower() for scope in scopes)
@@ -0,0 +1,162 @@
+import logging
+import sqlite3
+import statistics
+from datetime import datetime
+from pathlib import Path
+from config.settings import settings
+from scripts.diff_engine import DiffEngine
+from scripts.finding_store import FindingStore
+from scripts.grant_model import GrantVocabulary
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Grants are stored as spans: a row opens when a grant first appears and closes when it goes,
+# so a year of nightly runs costs one row per change rather than one per grant per night
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    system TEXT NOT NULL,
+    taken_at TEXT NOT NULL,
+    grant_count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_system ON runs (system, taken_at);
+
+CREATE TABLE IF NOT EXISTS grant_spans (
+    id INTEGER PRIMARY KEY,
+    system TEXT NOT NULL,
+    username TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    role TEXT NOT NULL,
+    first_seen TEXT NOT NULL,
+    ended_at TEXT
+);
+CREATE INDEX IF NOT EXISTS grant_spans_open ON grant_spans (system, username, scope, role) WHERE ended_at IS NULL;
+CREATE INDEX IF NOT EXISTS grant_spans_user ON grant_spans (username, first_seen);
+CREATE INDEX IF NOT EXISTS grant_spans_scope ON grant_spans (scope, first_seen);
+"""
+
+def _hours(start, end):
+    return (datetime.fromisoformat(end) - datetime.fromisoformat(start)).total_seconds() / 3600
+
+class HistoryStore:
+    """Indexed history of collected grants and findings, in the findings database"""
+
+    def __init__(self, db_path=None):
+        self.db_path = Path(db_path or settings.FINDINGS_DB)
+        # The finding tables belong to FindingStore; creating one makes sure they exist
+        FindingStore(self.db_path).close()
+        self.conn = sqlite3.connect(str(self.db_path), timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def record_grants(self, system, grants, taken_at=None):
+        """Open spans for new (username, scope, role) grants and close those no longer present"""
+        taken_at = (taken_at or datetime.now()).isoformat()
+        current = set(grants)
+
+        open_rows = self.conn.execute(
+            "SELECT id, username, scope, role FROM grant_spans INDEXED BY grant_spans_open "
+            "WHERE system = ? AND ended_at IS NULL", (system,)
+        ).fetchall()
+        still_open = set()
+        ended = []
+        for span_id, *grant in open_rows:
+            grant = tuple(grant)
+            if grant in current:
+                still_open.add(grant)
+            else:
+                ended.append((taken_at, span_id))
+        started = current - still_open
+
+        with self.conn:
+            self.conn.execute("INSERT INTO runs (system, taken_at, grant_count) VALUES (?, ?, ?)",
+                              (system, taken_at, len(current)))
+            self.conn.executemany("UPDATE grant_spans SET ended_at = ? WHERE id = ?", ended)
+            self.conn.executemany(
+                "INSERT INTO grant_spans (system, username, scope, role, first_seen) VALUES (?, ?, ?, ?, ?)",
+                ((system, username, scope, role, taken_at) for username, scope, role in started)
+            )
+        logger.info(f"History for {system}: {len(started)} grants started, {len(ended)} ended")
+        return {"started": len(started), "ended": len(ended)}
+
+    def record_actuals(self, actuals_path, system, taken_at=None):
+        """Record the grants of an actuals file, keyed by normalized username, scope and role"""
+        engine = DiffEngine()
+        vocabulary = GrantVocabulary()
+        grants = vocabulary.decode_keys(engine.actual_grants(engine.iter_actuals(str(actuals_path)), vocabulary))
+        return self.record_grants(
+            system, zip(grants['username_key'], grants['scope_key'], grants['role_key']), taken_at
+        )
+
+    def user_timeline(self, username):
+        """Every grant and finding change for a user, oldest first"""
+        username = username.strip().lower()
+        events = []
+        for system, scope, role, first_seen, ended_at in self.conn.execute(
+            "SELECT system, scope, role, first_seen, ended_at FROM grant_spans WHERE username = ?", (username,)
+        ):
+            events.append({"at": first_seen, "event": "granted", "system": system, "scope": scope, "detail": role})
+            if ended_at:
+                events.append({"at": ended_at, "event": "removed", "system": system, "scope": scope, "detail": role})
+        for bucket, system, scope, opened_at, resolved_at in self.conn.execute(
+            "SELECT bucket, system, scope, opened_at, resolved_at FROM finding_spans WHERE username = ?", (username,)
+        ):
+            events.append({"at": opened_at, "event": "finding", "system": system, "scope": scope, "detail": bucket})
+            if resolved_at:
+                events.append({"at": resolved_at, "event": "resolved", "system": system, "scope": scope,
+                               "detail": bucket})
+        return sorted(events, key=lambda event: event['at'])
+
+    def repo_history(self, repo):
+        """Who held access to a repository and when, oldest grant first"""
+        scope = repo.strip().lower()
+        if ':' not in scope:
+            scope = f"repos:{scope}"
+        rows = self.conn.execute(
+            "SELECT system, username, role, first_seen, ended_at FROM grant_spans WHERE scope = ? ORDER BY first_seen",
+            (scope,)
+        ).fetchall()
+        return [
+            {"system": system, "username": username, "role": role, "first_seen": first_seen, "ended_at": ended_at}
+            for system, username, role, first_seen, ended_at in rows
+        ]
+
+    def first_access(self, username, repo):
+        """When a user first had any access to a repository, or None"""
+        scope = repo.strip().lower()
+        if ':' not in scope:
+            scope = f"repos:{scope}"
+        row = self.conn.execute(
+            "SELECT MIN(first_seen) FROM grant_spans WHERE username = ? AND scope = ?", (username.strip().lower(), scope)
+        ).fetchone()
+        return row[0]
+
+    def remediation_stats(self, since=None):
+        """Mean and median time to remediate per finding bucket, plus what is still open"""
+        stats = {}
+        query = "SELECT bucket, opened_at, resolved_at FROM finding_spans WHERE resolved_at IS NOT NULL"
+        params = ()
+        if since:
+            query += " AND resolved_at >= ?"
+            params = (since,)
+        durations = {}
+        for bucket, opened_at, resolved_at in self.conn.execute(query, params):
+            durations.setdefault(bucket, []).append(_hours(opened_at, resolved_at))
+
+        open_counts = dict(self.conn.execute(
+            "SELECT bucket, COUNT(*) FROM finding_spans WHERE resolved_at IS NULL GROUP BY bucket"
+        ).fetchall())
+        for bucket in sorted(set(durations) | set(open_counts)):
+            hours = durations.get(bucket, [])
+            stats[bucket] = {
+                "resolved": len(hours),
+                "open": open_counts.get(bucket, 0),
+                "mean_hours": round(statistics.fmean(hours), 1) if hours else None,
+                "median_hours": round(statistics.median(hours), 1) if hours else None
+            }
+        return stats
@@ -0,0 +1,139 @@
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+import requests
+from config.settings import settings
+from scripts.collectors import CollectionError
+from scripts.diff_engine import DiffEngine
+from scripts.rate_limiter import RateLimitExceeded
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class MFASweep:
+    """Org-wide two-factor coverage from two filtered list sweeps, joined to the SoT in memory"""
+
+    def __init__(self, collector=None, sot_path="sot/access_matrix.csv",
+                 cache_file="out/mfa_sweep_cache.json", report_file="out/mfa_report_latest.json"):
+        self.collector = collector
+        self.sot_path = sot_path
+        self.cache_file = Path(cache_file)
+        self.report_file = Path(report_file)
+
+    def _get_collector(self):
+        if self.collector is None:
+            from scripts.github_org_collector import GitHubOrgCollector
+            self.collector = GitHubOrgCollector()
+        return self.collector
+
+    def _load_cache(self, org):
+        """Return the last sweep if it is for this org and recent enough"""
+        try:
+            with open(self.cache_file) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        max_age = timedelta(hours=settings.MFA_CACHE_HOURS)
+        if cached.get('org') != org or datetime.now() - datetime.fromisoformat(cached['swept_at']) > max_age:
+            return None
+        return cached
+
+    def _save_cache(self, sweep):
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cache_file.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(sweep, f)
+        os.replace(tmp_path, self.cache_file)
+
+    def sweep(self, use_cache=True):
+        """Fetch members and outside collaborators without 2FA in two paginated sweeps"""
+        collector = self._get_collector()
+        if use_cache:
+            cached = self._load_cache(collector.org)
+            if cached is not None:
+                logger.info(f"Using MFA sweep from {cached['swept_at']}")
+                return cached
+
+        logger.info(f"Sweeping {collector.org} for accounts without two-factor authentication...")
+        member_count = collector.member_count()
+        try:
+            members = [user['login'] for user in collector.iter_members_without_2fa()]
+            outside = [user['login'] for user in collector.iter_outside_collaborators_without_2fa()]
+        except RateLimitExceeded as e:
+            raise CollectionError(f"MFA sweep of {collector.org} still rate limited after retries: {e}") from e
+        except requests.exceptions.HTTPError as e:
+            # GitHub only honours filter=2fa_disabled for organization owners
+            raise CollectionError(
+                f"MFA sweep of {collector.org} failed ({e}) - the 2fa_disabled filter needs an org owner token "
+                f"(admin:org scope)"
+            ) from e
+
+        sweep = {
+            "org": collector.org,
+            "swept_at": datetime.now().isoformat(),
+            "member_count": member_count,
+            "members": members,
+            "outside_collaborators": outside
+        }
+        self._save_cache(sweep)
+        return sweep
+
+    def build_report(self, sweep, sot_index):
+        """Join non-compliant accounts to their SoT owners and managers"""
+        users = []
+        for kind, logins in (('member', sweep['members']), ('outside_collaborator', sweep['outside_collaborators'])):
+            for login in logins:
+                rows = sot_index.lookup_username(login)
+                rows = rows[rows['system_key'] == 'github']
+                first = rows.iloc[0] if len(rows) else {}
+                users.append({
+                    "username": login,
+                    "kind": kind,
+                    "in_sot": bool(len(rows)),
+                    "email": first.get('email', '') or '',
+                    "manager": first.get('manager', '') or ''
+                })
+
+        member_count = sweep.get('member_count') or 0
+        members_without = len(sweep['members'])
+        coverage = round(100 * (member_count - members_without) / member_count, 1) if member_count else None
+        return {
+            "org": sweep['org'],
+            "swept_at": sweep['swept_at'],
+            "summary": {
+                "member_count": member_count,
+                "members_without_mfa": members_without,
+                "outside_collaborators_without_mfa": len(sweep['outside_collaborators']),
+                "not_in_sot_count": sum(not user['in_sot'] for user in users),
+                "coverage_percent": coverage
+            },
+            "users": users
+        }
+
+    def run(self, notify=True, use_cache=True):
+        """Sweep, join, save the MFA report and send batched nudges"""
+        if not settings.has_github_org:
+            logger.error("MFA coverage needs GITHUB_ORG - the 2FA filters only exist for organizations")
+            return None
+
+        sweep = self.sweep(use_cache=use_cache)
+        sot_index = DiffEngine().load_sot_index(self.sot_path)
+        report = self.build_report(sweep, sot_index)
+
+        with open(self.report_file, 'w') as f:
+            json.dump(report, f, indent=2)
+        summary = report['summary']
+        logger.info(
+            f"MFA coverage {summary['coverage_percent']}%: {summary['members_without_mfa']} members and "
+            f"{summary['outside_collaborators_without_mfa']} outside collaborators without 2FA"
+        )
+
+        if notify and report['users']:
+            if settings.SLACK_WEBHOOK_URL:
+                from scripts.slack_notifier import SlackNotifier
+                SlackNotifier().send_mfa_report(report)
+            else:
+                logger.info("Slack webhook not configured - skipping MFA nudges")
+        return report
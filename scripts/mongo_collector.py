@@ -0,0 +1,146 @@
+from datetime import datetime
+import logging
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+from config.settings import settings
+from scripts.collectors import BaseCollector, CollectionError
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class MongoCollector(BaseCollector):
+    """Collect MongoDB users and their effective roles across all databases"""
+
+    system = 'mongodb'
+
+    def __init__(self, client=None, uri=None):
+        self.uri = uri or settings.MONGO_URI
+        self._client = client
+        self._owns_client = client is None
+        # (role, db) -> directly inherited (role, db) pairs, filled by bulk rolesInfo
+        self.role_graph = {}
+        self._effective = {}
+        self.commands = 0
+
+    @property
+    def client(self):
+        # One pooled client serves every command of the run
+        if self._client is None:
+            self._client = MongoClient(
+                self.uri,
+                maxPoolSize=settings.MONGO_MAX_POOL_SIZE,
+                serverSelectionTimeoutMS=settings.MONGO_TIMEOUT_MS,
+                appname='access-guard'
+            )
+        return self._client
+
+    def close(self):
+        """Close the client if this collector created it"""
+        if self._client is not None and self._owns_client:
+            self._client.close()
+
+    def _command(self, command):
+        # forAllDBs and cross-database role documents are only accepted on admin
+        self.commands += 1
+        return self.client.admin.command(command)
+
+    def get_users(self):
+        """Return every user of every database with one usersInfo command"""
+        return self._command({"usersInfo": {"forAllDBs": True}}).get('users', [])
+
+    def load_roles(self, roles):
+        """Resolve the inheritance graph for roles, one bulk rolesInfo per level"""
+        pending = {role for role in roles if role not in self.role_graph}
+        while pending:
+            result = self._command({
+                "rolesInfo": [{"role": role, "db": db} for role, db in sorted(pending)],
+                "showBuiltinRoles": True
+            })
+
+            found = set()
+            for info in result.get('roles', []):
+                key = (info['role'], info['db'])
+                found.add(key)
+                self.role_graph[key] = [(parent['role'], parent['db']) for parent in info.get('roles', [])]
+
+            # Roles that no longer exist are kept as leaves so they're still reported
+            for key in pending - found:
+                logger.warning(f"Role {key[0]}@{key[1]} not found; treating it as having no inherited roles")
+                self.role_graph[key] = []
+
+            pending = {
+                parent for key in found for parent in self.role_graph[key]
+                if parent not in self.role_graph
+            }
+
+    def effective_roles(self, role):
+        """Return a role plus every role it inherits, memoized across users"""
+        if role in self._effective:
+            return self._effective[role]
+
+        # Seed the memo first so a cyclic definition can't recurse forever
+        effective = {role}
+        self._effective[role] = effective
+        for parent in self.role_graph.get(role, []):
+            effective |= self.effective_roles(parent)
+        return effective
+
+    def _record(self, user, role, db, raw):
+        return {
+            "system": "mongodb",
+            "username": user['user'],
+            "email": (user.get('customData') or {}).get('email', ''),
+            "role": role,
+            "scope": [f"db:{db}"],
+            "collected_at": datetime.now().isoformat(),
+            "source": {"raw": raw}
+        }
+
+    def user_records(self, user):
+        """Expand a user's direct roles into one record per effective grant"""
+        direct_roles = [(assigned['role'], assigned['db']) for assigned in user.get('roles', [])]
+        grants = dict.fromkeys(direct_roles)
+        for direct in direct_roles:
+            for role in self.effective_roles(direct):
+                # A direct assignment wins over the same role reached by inheritance
+                grants.setdefault(role, direct)
+
+        records = []
+        for (role, db), via in grants.items():
+            raw = {"user": user['user'], "auth_db": user.get('db'), "inherited_from": via and f"{via[0]}@{via[1]}"}
+            records.append(self._record(user, role, db, raw))
+        return records
+
+    def iter_actuals(self):
+        """Yield effective role grants for every MongoDB user"""
+        if not self.uri and self._client is None:
+            raise CollectionError("MongoDB URI not configured")
+
+        logger.info("Starting MongoDB data collection...")
+        try:
+            users = self.get_users()
+            self.load_roles({(role['role'], role['db']) for user in users for role in user.get('roles', [])})
+        except PyMongoError as e:
+            raise CollectionError(f"Error collecting MongoDB users: {e}") from e
+
+        record_count = 0
+        for user in users:
+            for record in self.user_records(user):
+                yield record
+                record_count += 1
+
+        logger.info(
+            f"Collection complete: {record_count} effective grants for {len(users)} users "
+            f"({len(self.role_graph)} roles, {self.commands} commands)"
+        )
+
+    def stats(self):
+        """Return command counters for this run"""
+        return {"commands": self.commands, "roles": len(self.role_graph)}
+
+def main():
+    collector = MongoCollector()
+    collector.save_actuals(collector.iter_actuals())
+
+if __name__ == "__main__":
+    main()
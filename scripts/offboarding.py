@@ -0,0 +1,231 @@
+import hashlib
+import json
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import quote
+import requests
+from config.settings import settings
+from scripts.collectors import actuals_path
+from scripts.diff_engine import DiffEngine
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# A DELETE that finds nothing to remove has already achieved what it was for
+DONE_STATUSES = (200, 202, 204, 404)
+
+def _action_id(method, path):
+    return hashlib.sha1(f"{method} {path}".encode()).hexdigest()[:16]
+
+class OffboardingPlanner:
+    """Turn collected grants or diff findings into GitHub revocation calls"""
+
+    def __init__(self, org=None, owner=None):
+        self.org = org if org is not None else (settings.GITHUB_ORG or '').strip()
+        self.owner = owner
+
+    def _account_owner(self, records):
+        if self.org:
+            return self.org
+        if self.owner is None:
+            owners = [record['username'] for record in records if record.get('role') == 'owner']
+            self.owner = owners[0] if owners else None
+        return self.owner
+
+    def action(self, username, scope, role='', reason=''):
+        """The revocation call for one grant, or None if it can't be revoked through the API"""
+        kind, _, name = str(scope).partition(':')
+        user = quote(username)
+        if kind == 'repos' and role != 'owner' and (self.org or self.owner):
+            path = f"/repos/{quote(self.org or self.owner)}/{quote(name)}/collaborators/{user}"
+        elif kind == 'teams' and self.org:
+            path = f"/orgs/{quote(self.org)}/teams/{quote(name)}/memberships/{user}"
+        elif kind == 'org' and self.org and role == 'outside_collaborator':
+            path = f"/orgs/{quote(self.org)}/outside_collaborators/{user}"
+        elif kind == 'org' and self.org:
+            path = f"/orgs/{quote(self.org)}/memberships/{user}"
+        else:
+            return None
+        return {
+            "id": _action_id('DELETE', path),
+            "system": "github",
+            "username": username,
+            "scope": scope,
+            "role": role,
+            "method": "DELETE",
+            "path": path,
+            "reason": reason
+        }
+
+    def _plan(self, grants, source):
+        actions, skipped, seen = [], [], set()
+        for username, scope, role, reason in grants:
+            action = self.action(username, scope, role, reason)
+            if action is None:
+                skipped.append({"username": username, "scope": scope, "role": role, "reason": "not revocable via API"})
+            elif action['id'] not in seen:
+                seen.add(action['id'])
+                actions.append(action)
+
+        # Removing org membership takes team and repo access with it, so it goes last
+        actions.sort(key=lambda action: (action['scope'].startswith('org:'), action['path']))
+        # Each plan journals on its own: the same grants offboarded again (e.g. after a re-grant) run again
+        return {
+            "plan_id": uuid.uuid4().hex[:12],
+            "created_at": datetime.now().isoformat(),
+            "source": source,
+            "actions": actions,
+            "skipped": skipped
+        }
+
+    def plan_for_user(self, username, actuals_paths=None):
+        """Revoke every GitHub grant a user holds, per the latest collected actuals"""
+        engine = DiffEngine()
+        records = []
+        for path in actuals_paths or [actuals_path('github')]:
+            records.extend(engine.iter_actuals(path))
+        self._account_owner(records)
+
+        wanted = username.strip().lower()
+        grants = [
+            (record['username'], scope, record.get('role', ''), "offboarding")
+            for record in records
+            if record.get('system') == 'github' and str(record.get('username', '')).lower() == wanted
+            for scope_string in record.get('scope') or []
+            for scope in DiffEngine._scope_items(scope_string)
+        ]
+        if not grants:
+            logger.warning(f"No collected GitHub grants found for {username}")
+        return self._plan(grants, f"user:{username}")
+
+    def plan_from_report(self, report, actuals_paths=None):
+        """Revoke extra and expired GitHub access listed in a diff report"""
+        if not self.org and self.owner is None:
+            engine = DiffEngine()
+            records = [record for path in actuals_paths or [actuals_path('github')]
+                       if Path(path).exists() for record in engine.iter_actuals(path)]
+            self._account_owner(records)
+
+        grants = []
+        for bucket in ('extra', 'expired'):
+            for item in report.get('details', {}).get(bucket, []):
+                if str(item.get('system', '')).lower() != 'github':
+                    continue
+                scopes = item['scope'] if isinstance(item.get('scope'), list) else [item.get('scope', '')]
+                for scope in scopes:
+                    for scope_item in DiffEngine._scope_items(scope):
+                        grants.append((item['username'], scope_item, item.get('role', ''), item.get('reason', bucket)))
+        return self._plan(grants, f"report:{report.get('timestamp', '')}")
+
+class OffboardingExecutor:
+    """Run a revocation plan concurrently, journaling each completed call so reruns resume"""
+
+    def __init__(self, collector=None, journal_dir=None, max_workers=None):
+        if collector is None:
+            from scripts.github_collector import GitHubCollector
+            collector = GitHubCollector(use_cache=False)
+        self.collector = collector
+        self.journal_dir = Path(journal_dir or settings.OFFBOARDING_DIR)
+        self.max_workers = max(1, max_workers or settings.OFFBOARDING_MAX_WORKERS)
+
+    def journal_path(self, plan):
+        return self.journal_dir / f"journal_{plan['plan_id']}.ndjson"
+
+    def completed(self, plan):
+        """IDs of actions the journal records as done"""
+        done = set()
+        try:
+            with open(self.journal_path(plan)) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # a line cut short by a crash
+                    if entry.get('status') == 'done':
+                        done.add(entry['id'])
+        except FileNotFoundError:
+            pass
+        return done
+
+    def _journal(self, journal, entry):
+        # Durable before the next call, so a crash never forgets a completed revocation
+        journal.write(json.dumps(entry) + '\n')
+        journal.flush()
+        os.fsync(journal.fileno())
+
+    def _revoke(self, action):
+        url = f"{self.collector.base_url}{action['path']}"
+        try:
+            response = self.collector.scheduler.request(
+                self.collector.session, action['method'], url, timeout=self.collector.timeout
+            )
+        except requests.exceptions.RequestException as e:
+            return None, str(e)
+        return response.status_code, None if response.status_code in DONE_STATUSES else response.text[:200]
+
+    def print_plan(self, plan):
+        print(f"Offboarding plan {plan['plan_id']} ({plan['source']}): {len(plan['actions'])} calls")
+        for action in plan['actions']:
+            print(f"  {action['method']} {action['path']}  [{action['username']} {action['scope']}]")
+        for item in plan['skipped']:
+            print(f"  skip {item['username']} {item['scope']} ({item['reason']})")
+
+    def plan_path(self, plan_id):
+        return self.journal_dir / f"plan_{plan_id}.json"
+
+    def load_plan(self, plan_id):
+        """Load a saved plan, to resume it past the calls its journal records as done"""
+        path = self.plan_path(plan_id)
+        if not path.exists():
+            raise FileNotFoundError(f"No saved offboarding plan {plan_id} in {self.journal_dir}")
+        with open(path) as f:
+            return json.load(f)
+
+    def save_plan(self, plan):
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        path = self.plan_path(plan['plan_id'])
+        with open(path, 'w') as f:
+            json.dump(plan, f, indent=2)
+        return path
+
+    def execute(self, plan, dry_run=None):
+        """Apply a plan; with DRY_RUN only print it. Returns done/failed/skipped counts"""
+        dry_run = settings.DRY_RUN if dry_run is None else dry_run
+        path = self.save_plan(plan)
+        # Logged before any call goes out so an interrupted run can always be resumed by plan id
+        logger.info(f"Offboarding plan {plan['plan_id']} saved to {path}")
+        if dry_run:
+            self.print_plan(plan)
+            logger.info("DRY_RUN is on - no access was removed")
+            return {"dry_run": True, "planned": len(plan['actions'])}
+
+        done = self.completed(plan)
+        pending = [action for action in plan['actions'] if action['id'] not in done]
+        if done:
+            logger.info(f"Resuming plan {plan['plan_id']}: {len(done)} calls already done, {len(pending)} to go")
+
+        # Org membership removals wait for the repo and team calls they would otherwise race
+        batches = [[action for action in pending if not action['scope'].startswith('org:')],
+                   [action for action in pending if action['scope'].startswith('org:')]]
+        counts = {"done": 0, "failed": 0, "resumed": len(done)}
+        with open(self.journal_path(plan), 'a') as journal, \
+                ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='offboard') as executor:
+            for batch in batches:
+                futures = {executor.submit(self._revoke, action): action for action in batch}
+                for future in as_completed(futures):
+                    action = futures[future]
+                    status, error = future.result()
+                    outcome = 'done' if error is None else 'failed'
+                    counts[outcome] += 1
+                    self._journal(journal, {"id": action['id'], "status": outcome, "http_status": status,
+                                            "path": action['path'], "error": error, "at": datetime.now().isoformat()})
+                    if error:
+                        logger.error(f"Could not revoke {action['path']}: {status} {error}")
+
+        logger.info(f"Offboarding plan {plan['plan_id']}: {counts['done']} revoked, {counts['failed']} failed, "
+                    f"{counts['resumed']} already done")
+        return counts
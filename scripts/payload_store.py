@@ -0,0 +1,123 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+import zlib
+from pathlib import Path
+from config.settings import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS payloads (
+    ref TEXT PRIMARY KEY,
+    body BLOB NOT NULL,
+    stored_at REAL NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+"""
+
+# Payloads are written in batches while the actuals file streams out
+FLUSH_EVERY = 1000
+
+# Unreferenced payloads this recent may belong to a collection that hasn't published its actuals yet
+PRUNE_GRACE_SECONDS = 24 * 3600
+
+def payload_ref(payload):
+    """Content address of a payload: sha256 of its canonical JSON"""
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest(), canonical
+
+class PayloadStore:
+    """Deduplicated, content-addressed store for the raw API payloads behind actuals records"""
+
+    def __init__(self, db_path=None):
+        self.db_path = Path(db_path or settings.PAYLOAD_STORE_DB)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # Collectors save concurrently; wait on each other's write transactions
+        self.conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(payloads)")]
+        if 'stored_at' not in columns:
+            self.conn.execute("ALTER TABLE payloads ADD COLUMN stored_at REAL NOT NULL DEFAULT 0")
+        self.seen = set()
+        self.pending = []
+        self.written = 0
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def put(self, payload):
+        """Queue a payload for storage; returns its ref"""
+        ref, canonical = payload_ref(payload)
+        if ref not in self.seen:
+            self.seen.add(ref)
+            self.pending.append((ref, zlib.compress(canonical.encode())))
+            if len(self.pending) >= FLUSH_EVERY:
+                self.flush()
+        return ref
+
+    def flush(self):
+        if not self.pending:
+            return
+        now = time.time()
+        with self.conn:
+            cursor = self.conn.executemany(
+                "INSERT OR IGNORE INTO payloads (ref, body, stored_at) VALUES (?, ?, ?)",
+                ((ref, body, now) for ref, body in self.pending)
+            )
+            self.written += cursor.rowcount
+            # Payloads seen again this run are fresh too, so a prune mid-collection keeps them
+            self.conn.executemany("UPDATE payloads SET stored_at = ? WHERE ref = ? AND stored_at < ?",
+                                  ((now, ref, now) for ref, _ in self.pending))
+        self.pending = []
+
+    def get(self, ref):
+        """Load one payload by ref, or None if it isn't stored"""
+        row = self.conn.execute("SELECT body FROM payloads WHERE ref = ?", (ref,)).fetchone()
+        return json.loads(zlib.decompress(row[0])) if row else None
+
+    def externalize(self, records):
+        """Yield records with source.raw replaced by a source.raw_ref into this store"""
+        for record in records:
+            source = record.get('source')
+            if source and 'raw' in source:
+                source = dict(source)
+                source['raw_ref'] = self.put(source.pop('raw'))
+                record = dict(record, source=source)
+            yield record
+
+    def prune(self, actuals_paths, grace_seconds=PRUNE_GRACE_SECONDS):
+        """Delete payloads no actuals file refers to any more; returns how many were removed"""
+        from scripts.diff_engine import DiffEngine
+        engine = DiffEngine()
+        referenced = {
+            (record.get('source') or {}).get('raw_ref')
+            for path in actuals_paths
+            for record in engine.iter_actuals(str(path))
+        }
+        referenced.discard(None)
+
+        with self.conn:
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS referenced (ref TEXT PRIMARY KEY) WITHOUT ROWID")
+            self.conn.execute("DELETE FROM referenced")
+            self.conn.executemany("INSERT INTO referenced (ref) VALUES (?)", ((ref,) for ref in referenced))
+            cursor = self.conn.execute(
+                "DELETE FROM payloads WHERE stored_at < ? AND ref NOT IN (SELECT ref FROM referenced)",
+                (time.time() - grace_seconds,)
+            )
+        logger.info(f"Pruned {cursor.rowcount} unreferenced payloads, {len(referenced)} still referenced")
+        return cursor.rowcount
+
+    def resolve(self, record):
+        """Return a copy of a record with its raw payload loaded back in"""
+        source = record.get('source') or {}
+        if 'raw_ref' not in source:
+            return record
+        source = dict(source)
+        source['raw'] = self.get(source.pop('raw_ref'))
+        return dict(record, source=source)
@@ -0,0 +1,215 @@
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import requests
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Server-side failures worth retrying; everything else is returned to the caller
+RETRYABLE_STATUS = {500, 502, 503, 504}
+
+# GitHub asks clients to wait at least a minute after a secondary rate limit without Retry-After
+SECONDARY_RATE_LIMIT_WAIT = 60.0
+
+class RateLimitExceeded(requests.exceptions.HTTPError):
+    """Raised when a request is still rate limited after every retry"""
+
+def retry_after_seconds(value):
+    """Seconds to wait from a Retry-After header (delay-seconds or HTTP-date), or None if unparseable"""
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+class RequestScheduler:
+    """Token-bucket pacing, rate-limit handling and retries for API calls"""
+
+    def __init__(self, rate=10.0, burst=None, max_retries=5, backoff_base=1.0, backoff_max=60.0):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+        # Budget accounting for the current run
+        self.requests = 0
+        self.retries = 0
+        self.budget_used = 0
+        self.bytes_received = 0
+        self.waited_seconds = 0.0
+        self.rate_limit = None
+        self.rate_remaining = None
+        self.rate_reset = None
+
+    def _sleep(self, seconds):
+        if seconds <= 0:
+            return
+        with self._lock:
+            self.waited_seconds += seconds
+        time.sleep(seconds)
+
+    def _acquire(self):
+        """Block until a request token is available and no rate-limit pause is active"""
+        while True:
+            with self._lock:
+                pause = self._paused_until - time.time()
+                if pause <= 0:
+                    if self.rate <= 0:
+                        return
+                    now = time.monotonic()
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+                else:
+                    wait = pause
+            self._sleep(wait)
+
+    def _pause(self, seconds, reason):
+        """Hold every worker until the given delay has passed"""
+        with self._lock:
+            until = time.time() + seconds
+            if until <= self._paused_until:
+                return
+            self._paused_until = until
+        resume = datetime.fromtimestamp(until).strftime('%H:%M:%S')
+        logger.warning(f"{reason} - pausing requests until {resume}")
+
+    def _observe(self, response):
+        """Track rate-limit headers and pause before the budget runs out"""
+        with self._lock:
+            self.requests += 1
+            # Conditional requests answered with 304 are free
+            if response.status_code != 304:
+                self.budget_used += 1
+            self.bytes_received += len(response.content)
+
+        headers = response.headers
+        remaining = headers.get('X-RateLimit-Remaining')
+        if remaining is None:
+            return
+
+        with self._lock:
+            self.rate_remaining = int(remaining)
+            self.rate_limit = int(headers.get('X-RateLimit-Limit', 0)) or self.rate_limit
+            self.rate_reset = int(headers.get('X-RateLimit-Reset', 0)) or self.rate_reset
+
+        if self.rate_remaining == 0 and self.rate_reset:
+            self._pause(self.rate_reset - time.time() + 1, "Rate limit budget exhausted")
+
+    def _backoff(self, attempt):
+        """Full-jitter exponential backoff"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _retry_delay(self, response, attempt, limited=False):
+        """Return seconds to wait before retrying a response, or None if it is final"""
+        status = response.status_code
+
+        if status in (403, 429):
+            return self._rate_limit_delay(response, attempt)
+
+        if limited:
+            # Rate limits reported in a 200 body (GraphQL) carry no status to go on
+            delay = self._rate_limit_delay(response, attempt)
+            return self._backoff(attempt) if delay is None else delay
+
+        if status in RETRYABLE_STATUS:
+            return self._backoff(attempt)
+
+        return None
+
+    def _rate_limit_delay(self, response, attempt):
+        """Return seconds to wait out a rate-limited response, or None if it isn't one"""
+        status = response.status_code
+        retry_after = response.headers.get('Retry-After')
+        delay = retry_after_seconds(retry_after) if retry_after else None
+        if retry_after and delay is None:
+            # An unreadable header still means the server wants us to slow down
+            delay = max(SECONDARY_RATE_LIMIT_WAIT, self._backoff(attempt))
+        if delay is not None:
+            self._pause(delay, f"Secondary rate limit hit (HTTP {status})")
+            return delay
+
+        if response.headers.get('X-RateLimit-Remaining') == '0':
+            # _observe() has already paused until the reset time
+            return max(0.0, self._paused_until - time.time())
+
+        if 'secondary rate limit' in response.text.lower():
+            delay = max(SECONDARY_RATE_LIMIT_WAIT, self._backoff(attempt))
+            self._pause(delay, f"Secondary rate limit hit (HTTP {status})")
+            return delay
+
+        if status == 429:
+            return self._backoff(attempt)
+
+        # A plain 403 is a permission answer, not a rate limit
+        return None
+
+    def request(self, session, method, url, rate_limited=None, **kwargs):
+        """Send a request through the scheduler, retrying transient failures
+
+        rate_limited, if given, flags responses that are rate limited despite their status.
+        """
+        attempt = 0
+
+        while True:
+            self._acquire()
+            try:
+                response = session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"{e.__class__.__name__} for {url} - retrying in {delay:.1f}s")
+            else:
+                self._observe(response)
+                limited = response.status_code in (403, 429) or bool(rate_limited and rate_limited(response))
+                delay = self._retry_delay(response, attempt, limited)
+                if delay is None:
+                    return response
+                if attempt >= self.max_retries:
+                    logger.error(f"Giving up on {url} after {attempt} retries (HTTP {response.status_code})")
+                    if limited:
+                        # Handing back the 403 would read as "no access" rather than "don't know"
+                        raise RateLimitExceeded(
+                            f"Still rate limited after {attempt} retries: {url}", response=response
+                        )
+                    return response
+                logger.warning(f"HTTP {response.status_code} for {url} - retrying in {delay:.1f}s")
+
+            attempt += 1
+            with self._lock:
+                self.retries += 1
+            self._sleep(delay)
+
+    def stats(self):
+        """Return request and rate-limit budget counters for this run"""
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "budget_used": self.budget_used,
+            "bytes_received": self.bytes_received,
+            "rate_limit": self.rate_limit,
+            "rate_limit_remaining": self.rate_remaining,
+            "waited_seconds": round(self.waited_seconds, 2)
+        }
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from config.settings import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class ResponseCache:
+    """Persistent ETag / Last-Modified cache for conditional API requests"""
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = Path(cache_dir or settings.HTTP_CACHE_DIR)
+        if max_bytes is None:
+            max_bytes = settings.HTTP_CACHE_MAX_MB * 1024 * 1024
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._total_bytes = None
+
+    @staticmethod
+    def identity(token):
+        """Derive a non-reversible cache namespace from an API token"""
+        return hashlib.sha256((token or '').encode()).hexdigest()[:16]
+
+    def _path(self, url, identity):
+        key = hashlib.sha256(f"{identity}\n{url}".encode()).hexdigest()
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, url, identity):
+        """Return the cached entry for a URL, or None"""
+        path = self._path(url, identity)
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        # Entries keyed by hash could in theory collide; confirm the URL
+        if entry.get('url') != url:
+            return None
+        return entry
+
+    def conditional_headers(self, entry):
+        """Build If-None-Match / If-Modified-Since headers for a cached entry"""
+        headers = {}
+        if not entry:
+            return headers
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def record_hit(self, url, identity):
+        """Count a 304 and mark the entry as recently used"""
+        with self._lock:
+            self.hits += 1
+        try:
+            os.utime(self._path(url, identity))
+        except OSError:
+            pass
+
+    def put(self, url, identity, response):
+        """Store a successful response if it carries a validator"""
+        with self._lock:
+            self.misses += 1
+
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+
+        entry = {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "links": response.links,
+            "body": response.json()
+        }
+
+        path = self._path(url, identity)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            old_size = path.stat().st_size if path.exists() else 0
+
+            # Write atomically so concurrent readers never see partial JSON
+            tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+            with open(tmp_path, 'w') as f:
+                json.dump(entry, f, separators=(',', ':'))
+            os.replace(tmp_path, path)
+
+            self._account(path.stat().st_size - old_size)
+        except OSError as e:
+            logger.warning(f"Could not write cache entry for {url}: {e}")
+
+    def _account(self, delta):
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(p.stat().st_size for p in self.cache_dir.glob('*/*.json'))
+            else:
+                self._total_bytes += delta
+
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until the cache is at 90% of its limit"""
+        target = int(self.max_bytes * 0.9)
+        entries = []
+        for path in self.cache_dir.glob('*/*.json'):
+            try:
+                stat = path.stat()
+                entries.append((stat.st_mtime, stat.st_size, path))
+            except OSError:
+                continue
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                path.unlink()
+                total -= size
+                removed += 1
+            except OSError:
+                continue
+
+        self._total_bytes = total
+        logger.info(f"HTTP cache evicted {removed} entries ({total} bytes remaining)")
+
+    def stats(self):
+        """Return hit/miss counters for this process"""
+        return {"hits": self.hits, "misses": self.misses}
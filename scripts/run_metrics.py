@@ -0,0 +1,129 @@
+import json
+import logging
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from config.settings import settings
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Per-collector counters copied from collector stats into the report and exports
+COLLECTOR_FIELDS = ['requests', 'bytes_received', 'cache_hits', 'cache_misses', 'retries',
+                    'budget_used', 'rate_limit_remaining', 'waited_seconds', 'commands']
+
+class RunMetrics:
+    """Stage timings, collector counters and peak memory for one nightly run"""
+
+    def __init__(self):
+        self.started_at = datetime.now()
+        self.stages = {}
+        self.collectors = {}
+        self.success = None
+
+    @contextmanager
+    def stage(self, name, trace_memory=False):
+        """Time a stage; optionally record the peak Python heap allocated inside it"""
+        tracing = trace_memory and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        start = time.perf_counter()
+        entry = self.stages.setdefault(name, {})
+        try:
+            yield entry
+        finally:
+            entry['seconds'] = round(time.perf_counter() - start, 3)
+            if tracing:
+                entry['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            logger.info(f"Stage {name} took {entry['seconds']}s")
+
+    def add_collection(self, collection):
+        """Record per-system status, duration and request counters from a collector run"""
+        for system, result in collection.items():
+            stats = result.get('stats') or {}
+            entry = {"status": result['status'], "seconds": result.get('seconds')}
+            entry.update({field: stats[field] for field in COLLECTOR_FIELDS if stats.get(field) is not None})
+            self.collectors[system] = entry
+
+    def to_dict(self):
+        metrics = {
+            "started_at": self.started_at.isoformat(),
+            "stages": self.stages,
+            "collectors": self.collectors
+        }
+        if resource is not None:
+            # ru_maxrss is KiB on Linux
+            metrics["max_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        return metrics
+
+    def to_prometheus(self):
+        """Render the metrics in Prometheus text exposition format"""
+        lines = []
+
+        def gauge(name, help_text, samples):
+            if not samples:
+                return
+            lines.append(f"# HELP access_guard_{name} {help_text}")
+            lines.append(f"# TYPE access_guard_{name} gauge")
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{val}"' for key, val in labels.items())
+                lines.append(f"access_guard_{name}{{{label_text}}} {value}" if label_text else f"access_guard_{name} {value}")
+
+        gauge('last_run_timestamp_seconds', 'Start time of the last nightly run',
+              [({}, int(self.started_at.timestamp()))])
+        if self.success is not None:
+            gauge('last_run_success', 'Whether the last nightly run completed', [({}, int(self.success))])
+        gauge('stage_duration_seconds', 'Wall time of each nightly stage',
+              [({"stage": name}, stage['seconds']) for name, stage in self.stages.items() if 'seconds' in stage])
+        gauge('stage_peak_memory_bytes', 'Peak traced heap inside a stage',
+              [({"stage": name}, stage['peak_memory_bytes']) for name, stage in self.stages.items()
+               if 'peak_memory_bytes' in stage])
+
+        gauge('collector_up', 'Whether the collector finished this run',
+              [({"system": system}, int(entry['status'] == 'ok')) for system, entry in self.collectors.items()])
+        gauge('collector_duration_seconds', 'Wall time of each collector',
+              [({"system": system}, entry['seconds']) for system, entry in self.collectors.items()
+               if entry.get('seconds') is not None])
+        for field in COLLECTOR_FIELDS:
+            samples = [({"system": system}, entry[field]) for system, entry in self.collectors.items() if field in entry]
+            gauge(f'collector_{field}', f'Collector {field.replace("_", " ")} for the last run', samples)
+
+        return '\n'.join(lines) + '\n'
+
+    def _write(self, path, content):
+        # Write then rename so scrapers never read a half-written file
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def export(self, formats=None):
+        """Export to the configured Prometheus textfile and/or JSON metrics file"""
+        if formats is None:
+            formats = [item.strip().lower() for item in settings.METRICS_EXPORT.split(',') if item.strip()]
+
+        written = []
+        try:
+            if 'prometheus' in formats:
+                self._write(settings.METRICS_PROMETHEUS_FILE, self.to_prometheus())
+                written.append(settings.METRICS_PROMETHEUS_FILE)
+            if 'json' in formats:
+                self._write(settings.METRICS_JSON_FILE, json.dumps(dict(self.to_dict(), success=self.success), indent=2))
+                written.append(settings.METRICS_JSON_FILE)
+        except OSError as e:
+            logger.error(f"Could not export run metrics: {e}")
+
+        if written:
+            logger.info(f"Run metrics exported to {', '.join(written)}")
+        return written
@@ -1,15 +1,53 @@
 import requests
 import json
 import logging
+import os
 from datetime import datetime
+from pathlib import Path
 from config.settings import settings
+from scripts.rate_limiter import RequestScheduler
 
 logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(_name_)
+logger = logging.getLogger(__name__)
+
+# Slack rejects messages above 50 blocks and section text above 3000 characters
+MAX_BLOCKS_PER_MESSAGE = 50
+MAX_SECTION_CHARS = 3000
+
+# Report buckets in the order they are sent, with a title and one line per finding
+FINDING_SECTIONS = [
+    ('expired', "🚨 Expired Access",
+     lambda item: f"• {item['username']} ({item['system']}) - Expired: {item['expires_on']}"),
+    ('extra', "⚠ Extra Access",
+     lambda item: f"• {item['username']} ({item['system']}) - Role: {item['role']}{_on(item)}"),
+    ('missing', "❔ Missing Access",
+     lambda item: f"• {item['username']} ({item['system']}) - Role: {item['role']}{_on(item)}"),
+    ('wrong_role', "🔀 Wrong Role",
+     lambda item: f"• {item['username']} ({item['system']}) - Expected: {item['expected_role']}, "
+                  f"Actual: {item['actual_role']}{_on(item)}"),
+]
+
+def _on(item):
+    scope = item.get('scope')
+    if isinstance(scope, list):
+        scope = ', '.join(scope)
+    return f" on {scope}" if scope else ''
+
+def _escape(text):
+    """Escape the characters Slack treats as markup"""
+    return str(text).replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
 
 class SlackNotifier:
-    def _init_(self):
+    def __init__(self, spool_dir=None):
         self.webhook_url = settings.SLACK_WEBHOOK_URL
+        self.spool_dir = Path(spool_dir or settings.SLACK_SPOOL_DIR)
+        self.session = requests.Session()
+        # Incoming webhooks allow about one message per second and answer 429 with Retry-After
+        self.scheduler = RequestScheduler(
+            rate=settings.SLACK_MESSAGES_PER_SECOND,
+            burst=1,
+            max_retries=settings.SLACK_MAX_RETRIES
+        )
     
     def validate_webhook(self):
         """Validate Slack webhook URL"""
@@ -25,12 +63,13 @@ class SlackNotifier:
         return True
     
     def create_slack_message(self, diff_report: dict) -> dict:
-        """Create Slack message from diff report"""
+        """Create the summary Slack message for a diff report"""
         summary = diff_report.get('summary', {})
         details = diff_report.get('details', {})
         
-        expired_count = len(details.get('expired', []))
-        extra_count = len(details.get('extra', []))
+        counts = {key: len(details.get(key, [])) for key, _, _ in FINDING_SECTIONS}
+        expired_count = counts['expired']
+        extra_count = counts['extra']
         
         # Message blocks
         blocks = [
@@ -59,60 +98,82 @@ class SlackNotifier:
                     {
                         "type": "mrkdwn",
                         "text": f"Extra Access:\n{extra_count}"
+                    },
+                    {
+                        "type": "mrkdwn",
+                        "text": f"Missing Access:\n{counts['missing']}"
+                    },
+                    {
+                        "type": "mrkdwn",
+                        "text": f"Wrong Role:\n{counts['wrong_role']}"
                     }
                 ]
             }
         ]
         
+        # With finding history, lead with what changed since the last run
+        deduplicated = 'new_count' in summary
+        if deduplicated:
+            blocks.append({
+                "type": "section",
+                "fields": [
+                    {
+                        "type": "mrkdwn",
+                        "text": f"New Findings:\n{summary['new_count']}"
+                    },
+                    {
+                        "type": "mrkdwn",
+                        "text": f"Resolved:\n{summary.get('resolved_count', 0)}"
+                    },
+                    {
+                        "type": "mrkdwn",
+                        "text": f"Still Open:\n{summary.get('still_open_count', 0)}"
+                    }
+                ]
+            })
+        
         # Add status indicator
-        if expired_count == 0 and extra_count == 0:
+        if deduplicated and summary['new_count'] == 0 and any(counts.values()):
             blocks.append({
                 "type": "section",
                 "text": {
                     "type": "mrkdwn",
-                    "text": "✅ All access is clean! No drift detected."
+                    "text": "No new drift since the last run; open findings are unchanged."
                 }
             })
-        else:
+        elif deduplicated and any(counts.values()):
             blocks.append({
-                "type": "section", 
+                "type": "section",
                 "text": {
                     "type": "mrkdwn",
-                    "text": "⚠ Access drift detected! Review the details below."
+                    "text": "⚠ New access drift detected! The new findings follow in the next messages."
                 }
             })
-        
-        # Add expired access section
-        if expired_count > 0:
-            expired_text = "\n".join([
-                f"• {item['username']} ({item['system']}) - Expired: {item['expires_on']}"
-                for item in details.get('expired', [])[:5]  # Show first 5
-            ])
-            if expired_count > 5:
-                expired_text += f"\n• ... and {expired_count - 5} more"
-                
+        elif not any(counts.values()):
             blocks.append({
                 "type": "section",
                 "text": {
                     "type": "mrkdwn",
-                    "text": f"🚨 Expired Access:\n{expired_text}"
+                    "text": "✅ All access is clean! No drift detected."
+                }
+            })
+        else:
+            blocks.append({
+                "type": "section", 
+                "text": {
+                    "type": "mrkdwn",
+                    "text": "⚠ Access drift detected! Every finding follows in the next messages."
                 }
             })
         
-        # Add extra access section
-        if extra_count > 0:
-            extra_text = "\n".join([
-                f"• {item['username']} ({item['system']}) - Role: {item['role']}"
-                for item in details.get('extra', [])[:5]  # Show first 5
-            ])
-            if extra_count > 5:
-                extra_text += f"\n• ... and {extra_count - 5} more"
-                
+        # Systems that failed to collect were left out of this report
+        failed_systems = summary.get('failed_systems') or []
+        if failed_systems:
             blocks.append({
                 "type": "section",
                 "text": {
                     "type": "mrkdwn",
-                    "text": f"⚠ Extra Access:\n{extra_text}"
+                    "text": f"⚠ Collection failed for: {', '.join(failed_systems)} (not included in this report)"
                 }
             })
         
@@ -129,37 +190,189 @@ class SlackNotifier:
         
         return {"blocks": blocks}
     
-    def send_report(self, diff_report: dict) -> bool:
-        """Send diff report to Slack"""
+    def _finding_sections(self, lines):
+        """Pack finding lines into section blocks under Slack's text limit"""
+        sections = []
+        text = ''
+        for line in lines:
+            line = line[:MAX_SECTION_CHARS - 1]
+            if text and len(text) + 1 + len(line) > MAX_SECTION_CHARS:
+                sections.append(text)
+                text = ''
+            text = f"{text}\n{line}" if text else line
+        if text:
+            sections.append(text)
+        return [{"type": "section", "text": {"type": "mrkdwn", "text": section}} for section in sections]
+    
+    def create_slack_messages(self, diff_report: dict) -> list:
+        """Create the summary message followed by every new finding, split to fit Slack's limits"""
+        details = diff_report.get('details', {})
+        messages = [self.create_slack_message(diff_report)]
+        
+        for key, title, format_item in FINDING_SECTIONS:
+            # Findings already reported by an earlier run are only counted in the summary
+            items = [item for item in details.get(key, []) if item.get('status') != 'open']
+            if not items:
+                continue
+            
+            lines = [_escape(format_item(item)) for item in items]
+            messages.extend(self._titled_messages(f"{title} ({len(items)})", lines))
+        
+        return messages
+    
+    def _titled_messages(self, title: str, lines: list) -> list:
+        """Pack lines under a title into as few messages as Slack's limits allow"""
+        sections = self._finding_sections(lines)
+        
+        # Leave room for the part header on every message
+        per_message = MAX_BLOCKS_PER_MESSAGE - 1
+        parts = [sections[i:i + per_message] for i in range(0, len(sections), per_message)]
+        messages = []
+        for number, blocks in enumerate(parts, 1):
+            heading = title
+            if len(parts) > 1:
+                heading += f" - part {number}/{len(parts)}"
+            header = {"type": "section", "text": {"type": "mrkdwn", "text": f"*{heading}*"}}
+            messages.append({"blocks": [header] + blocks})
+        return messages
+    
+    def create_mfa_messages(self, mfa_report: dict) -> list:
+        """Create an MFA coverage summary followed by batched nudges, grouped by manager"""
+        summary = mfa_report.get('summary', {})
+        users = mfa_report.get('users', [])
+        
+        coverage = summary.get('coverage_percent')
+        blocks = [
+            {
+                "type": "header",
+                "text": {"type": "plain_text", "text": "🔐 Access Guard - MFA Coverage"}
+            },
+            {
+                "type": "section",
+                "fields": [
+                    {
+                        "type": "mrkdwn",
+                        "text": f"Member Coverage:\n{coverage}%" if coverage is not None else "Member Coverage:\nn/a"
+                    },
+                    {
+                        "type": "mrkdwn",
+                        "text": f"Members without MFA:\n{summary.get('members_without_mfa', 0)}"
+                    },
+                    {
+                        "type": "mrkdwn",
+                        "text": f"Outside Collaborators without MFA:\n{summary.get('outside_collaborators_without_mfa', 0)}"
+                    },
+                    {
+                        "type": "mrkdwn",
+                        "text": f"Not in SoT:\n{summary.get('not_in_sot_count', 0)}"
+                    }
+                ]
+            },
+            {
+                "type": "context",
+                "elements": [
+                    {
+                        "type": "mrkdwn",
+                        "text": f"Swept: {mfa_report.get('swept_at', '')} | Org: {mfa_report.get('org', '')}"
+                    }
+                ]
+            }
+        ]
+        messages = [{"blocks": blocks}]
+        
+        if users:
+            ordered = sorted(users, key=lambda user: (user.get('manager') or '~', user['username'].lower()))
+            lines = [
+                _escape(f"• {user['username']} ({user['kind'].replace('_', ' ')}) - "
+                        f"Manager: {user.get('manager') or 'unknown'}{'' if user['in_sot'] else ' - not in SoT'}")
+                for user in ordered
+            ]
+            messages.extend(self._titled_messages(f"⚠ Enable two-factor authentication ({len(users)})", lines))
+        return messages
+    
+    def send_mfa_report(self, mfa_report: dict) -> bool:
+        """Send MFA coverage and nudges as a few batched messages"""
         if not self.validate_webhook():
             return False
-        
+        return self.deliver(self.create_mfa_messages(mfa_report))
+    
+    def _post(self, message: dict) -> bool:
+        """Post one message through the rate-limited queue, retrying 429s and server errors"""
         try:
-            message = self.create_slack_message(diff_report)
-            response = requests.post(
-                self.webhook_url,
+            response = self.scheduler.request(
+                self.session, 'POST', self.webhook_url,
                 json=message,
                 headers={'Content-Type': 'application/json'},
                 timeout=10
             )
-            
-            if response.status_code == 200:
-                logger.info("✅ Slack message sent successfully")
-                return True
-            else:
-                logger.error(f"❌ Failed to send Slack message: {response.status_code} - {response.text}")
-                # Print the message for manual testing
-                print("\n=== SLACK MESSAGE (for manual testing) ===")
-                print(json.dumps(message, indent=2))
-                print("========================================\n")
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error sending Slack message: {e}")
+            return False
+        
+        if response.status_code == 200:
+            return True
+        logger.error(f"❌ Failed to send Slack message: {response.status_code} - {response.text}")
+        return False
+    
+    def deliver(self, messages: list, batch: str = None) -> bool:
+        """Send messages in order; on failure spool the unsent remainder for a later resend"""
+        for index, message in enumerate(messages):
+            if not self._post(message):
+                self.spool(messages[index:], batch)
+                return False
+        logger.info(f"✅ Sent {len(messages)} Slack message(s)")
+        return True
+    
+    def spool(self, messages: list, batch: str = None) -> list:
+        """Write undelivered messages to disk, one file each, in send order"""
+        batch = batch or datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        
+        paths = []
+        for index, message in enumerate(messages):
+            path = self.spool_dir / f"{batch}_{index:04d}.json"
+            tmp_path = path.with_suffix('.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump({"spooled_at": datetime.now().isoformat(), "message": message}, f)
+            os.replace(tmp_path, path)
+            paths.append(path)
+        
+        logger.warning(f"Spooled {len(paths)} undelivered Slack message(s) to {self.spool_dir}")
+        return paths
+    
+    def spooled(self) -> list:
+        """Return spooled message files, oldest first"""
+        return sorted(self.spool_dir.glob('*.json')) if self.spool_dir.exists() else []
+    
+    def resend_spooled(self) -> bool:
+        """Resend spooled messages in order, removing each once delivered"""
+        if not self.validate_webhook():
+            return False
+        
+        paths = self.spooled()
+        for path in paths:
+            with open(path) as f:
+                message = json.load(f)['message']
+            if not self._post(message):
+                logger.error(f"Resend stopped at {path.name}; {len(self.spooled())} message(s) still spooled")
                 return False
-                
-        except requests.exceptions.Timeout:
-            logger.error("Slack request timeout")
+            path.unlink()
+        
+        logger.info(f"✅ Resent {len(paths)} spooled Slack message(s)")
+        return True
+    
+    def send_report(self, diff_report: dict) -> bool:
+        """Send the full diff report to Slack as one or more messages"""
+        if not self.validate_webhook():
             return False
+        
+        try:
+            messages = self.create_slack_messages(diff_report)
         except Exception as e:
-            logger.error(f"Error sending Slack message: {e}")
+            logger.error(f"Error building Slack messages: {e}")
             return False
+        
+        return self.deliver(messages)
 
 def main():
     notifier = SlackNotifier()
@@ -172,5 +385,5 @@ def main():
     except FileNotFoundError:
         logger.error("No diff report found. Run diff engine first.")
 
-if _name_ == "_main_":
+if __name__ == "__main__":
     main()
\ No newline at end of file
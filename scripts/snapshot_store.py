@@ -0,0 +1,204 @@
+import json
+import logging
+from datetime import datetime, timedelta
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from config.settings import settings
+from scripts.diff_engine import DiffEngine
+from scripts.grant_model import GrantVocabulary
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Grants are identified by these normalized columns; role is compared for changes
+KEY_COLUMNS = ['system_key', 'username_key', 'scope_key']
+VALUE_COLUMNS = ['role_key', 'email']
+
+class SnapshotStore:
+    """Compressed, dictionary-encoded columnar history of collected grants"""
+
+    def __init__(self, snapshot_dir=None):
+        self.snapshot_dir = Path(snapshot_dir or settings.SNAPSHOT_DIR)
+
+    def list_snapshots(self, system=None):
+        """Return snapshot paths, oldest first"""
+        pattern = f"{system}_*.npz" if system else "*.npz"
+        return sorted(self.snapshot_dir.glob(pattern), key=lambda path: path.stem.rsplit('_', 2)[-2:])
+
+    def save(self, grants: pd.DataFrame, system='github', taken_at=None):
+        """Store a grant table as one dictionary-encoded column per field"""
+        taken_at = taken_at or datetime.now()
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+        path = self.snapshot_dir / f"{system}_{taken_at.strftime('%Y%m%d_%H%M%S')}.npz"
+
+        grants = grants.drop_duplicates(KEY_COLUMNS)
+        columns = {}
+        for column in KEY_COLUMNS + VALUE_COLUMNS:
+            codes, values = pd.factorize(grants[column].fillna('').astype(str))
+            columns[f"{column}.codes"] = codes.astype(np.int32)
+            columns[f"{column}.values"] = np.asarray(values, dtype=str)
+
+        meta = {
+            "system": system,
+            "taken_at": taken_at.isoformat(),
+            "grant_count": len(grants),
+            "record_count": grants.attrs.get('record_count')
+        }
+        np.savez_compressed(path, meta=np.array(json.dumps(meta)), **columns)
+
+        logger.info(f"Snapshot saved to {path} ({len(grants)} grants)")
+        return path
+
+    def save_from_actuals(self, actuals_path, system='github'):
+        """Snapshot an actuals file, streaming it through the diff grant builder"""
+        engine = DiffEngine()
+        vocabulary = GrantVocabulary()
+        grants = engine.actual_grants(engine.iter_actuals(str(actuals_path)), vocabulary)
+        # Interned IDs are only stable within one run, so snapshots keep the normalized strings
+        return self.save(vocabulary.decode_keys(grants), system=system)
+
+    def _load_columns(self, path):
+        with np.load(path, allow_pickle=False) as data:
+            columns = {
+                column: (data[f"{column}.codes"], data[f"{column}.values"])
+                for column in KEY_COLUMNS + VALUE_COLUMNS
+            }
+            meta = json.loads(str(data['meta']))
+        return columns, meta
+
+    def load(self, path) -> pd.DataFrame:
+        """Load a snapshot back into a grant table with categorical columns"""
+        columns, meta = self._load_columns(path)
+        frame = pd.DataFrame({
+            column: pd.Categorical.from_codes(codes, categories=values)
+            for column, (codes, values) in columns.items()
+        })
+        frame.attrs.update(meta)
+        return frame
+
+    def latest_grants(self, systems=None):
+        """Latest snapshot of each system as one grant table, with when each was taken"""
+        if systems is None:
+            systems = sorted({path.name.rsplit('_', 2)[0] for path in self.list_snapshots()})
+
+        frames, taken_at = [], {}
+        for system in systems:
+            snapshots = self.list_snapshots(system)
+            if not snapshots:
+                continue
+            frame = self.load(snapshots[-1])
+            taken_at[system] = frame.attrs.get('taken_at')
+            frames.append(pd.DataFrame({
+                "system": frame['system_key'].astype(str),
+                "username": frame['username_key'].astype(str),
+                "email": frame['email'].astype(str),
+                "role": frame['role_key'].astype(str),
+                "scope": frame['scope_key'].astype(str)
+            }))
+
+        grants = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+            columns=['system', 'username', 'email', 'role', 'scope'])
+        grants.attrs['taken_at'] = taken_at
+        return grants
+
+    @staticmethod
+    def _unify(old, new):
+        """Re-express two dictionary-encoded columns over one shared dictionary"""
+        old_codes, old_values = old
+        new_codes, new_values = new
+
+        combined = pd.Index(old_values).append(pd.Index(new_values)).unique()
+        old_map = combined.get_indexer(old_values)
+        new_map = combined.get_indexer(new_values)
+        return old_map[old_codes].astype(np.int64), new_map[new_codes].astype(np.int64), combined
+
+    def _composite_keys(self, old_columns, new_columns):
+        """Pack (system, username, scope) codes into one int64 key per grant"""
+        old_key = np.zeros(len(old_columns[KEY_COLUMNS[0]][0]), dtype=np.int64)
+        new_key = np.zeros(len(new_columns[KEY_COLUMNS[0]][0]), dtype=np.int64)
+        decoded = {}
+
+        for column in KEY_COLUMNS:
+            old_codes, new_codes, values = self._unify(old_columns[column], new_columns[column])
+            old_key = old_key * len(values) + old_codes
+            new_key = new_key * len(values) + new_codes
+            decoded[column] = (values, old_codes, new_codes)
+
+        return old_key, new_key, decoded
+
+    def delta(self, old_path, new_path, include_details=True):
+        """Compare two snapshots by grant key: added, removed and role changes"""
+        old_columns, old_meta = self._load_columns(old_path)
+        new_columns, new_meta = self._load_columns(new_path)
+
+        old_key, new_key, decoded = self._composite_keys(old_columns, new_columns)
+        old_roles, new_roles, roles = self._unify(old_columns['role_key'], new_columns['role_key'])
+
+        added = np.flatnonzero(~np.isin(new_key, old_key))
+        removed = np.flatnonzero(~np.isin(old_key, new_key))
+
+        # For grants present in both, find the matching old row and compare roles
+        match = pd.Index(old_key).get_indexer(new_key)
+        common = np.flatnonzero(match >= 0)
+        changed = common[old_roles[match[common]] != new_roles[common]]
+
+        delta = {
+            "old_snapshot": str(old_path),
+            "new_snapshot": str(new_path),
+            "old_taken_at": old_meta.get('taken_at'),
+            "new_taken_at": new_meta.get('taken_at'),
+            "summary": {
+                "added_count": len(added),
+                "removed_count": len(removed),
+                "changed_count": len(changed)
+            }
+        }
+
+        if include_details:
+            def grant(rows, side):
+                index = 1 if side == 'old' else 2
+                return {
+                    column.replace('_key', ''): decoded[column][0][decoded[column][index][rows]]
+                    for column in KEY_COLUMNS
+                }
+
+            added_grants = grant(added, 'new')
+            removed_grants = grant(removed, 'old')
+            changed_grants = grant(changed, 'new')
+
+            delta["added"] = pd.DataFrame(dict(added_grants, role=roles[new_roles[added]])).to_dict('records')
+            delta["removed"] = pd.DataFrame(dict(removed_grants, role=roles[old_roles[removed]])).to_dict('records')
+            delta["changed"] = pd.DataFrame(dict(
+                changed_grants,
+                old_role=roles[old_roles[match[changed]]],
+                new_role=roles[new_roles[changed]]
+            )).to_dict('records')
+
+        logger.info(
+            f"Snapshot delta: {len(added)} added, {len(removed)} removed, {len(changed)} changed"
+        )
+        return delta
+
+    def prune(self, retention_days=None, keep_min=None):
+        """Delete snapshots older than the retention window, always keeping the newest few"""
+        if retention_days is None:
+            retention_days = settings.SNAPSHOT_RETENTION_DAYS
+        if keep_min is None:
+            keep_min = settings.SNAPSHOT_KEEP_MIN
+
+        cutoff = datetime.now() - timedelta(days=retention_days)
+        removed = []
+
+        systems = {path.name.rsplit('_', 2)[0] for path in self.list_snapshots()}
+        for system in systems:
+            snapshots = self.list_snapshots(system)
+            candidates = snapshots[:-keep_min] if keep_min else snapshots
+            for path in candidates:
+                taken_at = datetime.strptime('_'.join(path.stem.rsplit('_', 2)[-2:]), '%Y%m%d_%H%M%S')
+                if taken_at < cutoff:
+                    path.unlink()
+                    removed.append(path)
+
+        logger.info(f"Pruned {len(removed)} snapshots older than {retention_days} days")
+        return removed
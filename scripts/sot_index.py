@@ -0,0 +1,193 @@
+import csv
+import hashlib
+import io
+import logging
+import os
+import pickle
+from functools import cached_property
+from pathlib import Path
+import pandas as pd
+from config.settings import settings
+from scripts.grant_model import GrantVocabulary
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Bump when the compiled layout changes so stale caches are ignored
+INDEX_VERSION = 2
+KEEP_CACHED_INDEXES = 4
+
+REQUIRED_COLUMNS = ['system', 'username', 'role', 'scope']
+
+class SoTValidationError(ValueError):
+    """Raised when the Source of Truth cannot be compiled"""
+
+class SoTIndex:
+    """Compiled Source of Truth: parsed rows, normalized grants and user lookups"""
+
+    def __init__(self, sot, grants, rejected, content_hash, vocabulary):
+        self.sot = sot
+        self.grants = grants.reset_index(drop=True)
+        # Actual grants are interned into this vocabulary so both sides of a diff share IDs
+        self.vocabulary = vocabulary
+        self.rejected = rejected
+        self.content_hash = content_hash
+        self.version = INDEX_VERSION
+
+    @cached_property
+    def by_username(self):
+        return self.sot.groupby('username_key').indices if len(self.sot) else {}
+
+    @cached_property
+    def by_email(self):
+        with_email = self.sot[self.sot['email_key'] != '']
+        return with_email.groupby('email_key').indices if len(with_email) else {}
+
+    def __getstate__(self):
+        # Repetitive string columns pickle far smaller and faster as categories;
+        # the lookup dicts are cheaper to rebuild on demand than to unpickle.
+        # Grants are already compact (categories and interned IDs) and pickle as they are.
+        state = {key: value for key, value in self.__dict__.items() if key not in ('by_username', 'by_email')}
+        state['sot'] = _encode_strings(self.sot)
+        return state
+
+    def __setstate__(self, state):
+        state['sot'] = _decode_strings(state['sot'])
+        self.__dict__.update(state)
+
+    def lookup_username(self, username):
+        """Return SoT rows for a username (case-insensitive)"""
+        rows = self.by_username.get(str(username).strip().lower(), [])
+        return self.sot.iloc[rows]
+
+    def lookup_email(self, email):
+        """Return SoT rows for an email address (case-insensitive)"""
+        rows = self.by_email.get(str(email).strip().lower(), [])
+        return self.sot.iloc[rows]
+
+def _encode_strings(frame):
+    frame = frame.copy()
+    for column in frame.columns:
+        if frame[column].dtype == object or pd.api.types.is_string_dtype(frame[column].dtype):
+            frame[column] = frame[column].astype('category')
+    return frame
+
+def _decode_strings(frame):
+    return pd.DataFrame({
+        column: values.astype(values.dtype.categories.dtype)
+        if isinstance(values.dtype, pd.CategoricalDtype) else values
+        for column, values in frame.items()
+    })
+
+def parse_sot(text):
+    """Parse and validate SoT CSV text; returns (rows DataFrame, rejected rows)"""
+    reader = csv.reader(io.StringIO(text))
+    header = [column.strip() for column in next(reader, [])]
+
+    missing = [column for column in REQUIRED_COLUMNS + ['expires_on'] if column not in header]
+    if missing:
+        raise SoTValidationError(f"SoT header is missing columns: {', '.join(missing)}")
+
+    rows = []
+    lines = []
+    rejected = []
+    for row in reader:
+        if not any(field.strip() for field in row):
+            continue
+        # Truncated or over-long rows shift every later field, so none of it can be trusted
+        if len(row) != len(header):
+            rejected.append({
+                "line": reader.line_num,
+                "reason": f"expected {len(header)} fields, got {len(row)}",
+                "raw": ','.join(row)
+            })
+            continue
+        rows.append(row)
+        lines.append(reader.line_num)
+
+    sot = pd.DataFrame(rows, columns=header)
+    sot['line'] = lines
+
+    # Required fields must be present
+    blank = sot[REQUIRED_COLUMNS].apply(lambda column: column.str.strip() == '').any(axis=1)
+
+    # Dates must be empty or ISO formatted
+    raw_dates = sot['expires_on'].str.strip()
+    expires_on = pd.to_datetime(raw_dates, format='%Y-%m-%d', errors='coerce')
+    bad_date = (raw_dates != '') & expires_on.isna()
+
+    for _, row in sot[blank | bad_date].iterrows():
+        reason = "missing required field" if blank[row.name] else f"invalid expires_on '{row['expires_on']}'"
+        rejected.append({"line": row['line'], "reason": reason, "raw": ','.join(row[header])})
+
+    sot = sot[~(blank | bad_date)].copy()
+    sot['expires_on'] = expires_on[sot.index]
+    sot = sot.reset_index(drop=True)
+
+    for column in ('system', 'username', 'email'):
+        codes, uniques = pd.factorize(sot[column])
+        sot[f'{column}_key'] = pd.Index(uniques).str.strip().str.lower().take(codes).to_numpy()
+
+    rejected.sort(key=lambda item: item['line'])
+    return sot, rejected
+
+class SoTIndexCache:
+    """Content-hash keyed on-disk cache of compiled SoT indexes, shared across processes"""
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = Path(cache_dir or settings.SOT_CACHE_DIR)
+
+    def _path(self, content_hash):
+        return self.cache_dir / f"sot_v{INDEX_VERSION}_{content_hash[:32]}.pkl"
+
+    def load_or_compile(self, sot_path, build_grants, strict=False):
+        """Return the compiled index for a SoT file, compiling only if its content changed"""
+        data = Path(sot_path).read_bytes()
+        content_hash = hashlib.sha256(data).hexdigest()
+        path = self._path(content_hash)
+
+        index = None
+        try:
+            with open(path, 'rb') as f:
+                index = pickle.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable SoT index {path}: {e}")
+
+        if index is None or index.content_hash != content_hash:
+            index = self.compile(data.decode('utf-8-sig'), content_hash, build_grants)
+            self._save(index, path)
+        else:
+            os.utime(path)
+            logger.info(f"Using compiled SoT index {path.name}")
+
+        for item in index.rejected:
+            logger.error(f"Rejected SoT row at line {item['line']}: {item['reason']}")
+        if strict and index.rejected:
+            raise SoTValidationError(f"{len(index.rejected)} malformed SoT rows in {sot_path}")
+
+        return index
+
+    def compile(self, text, content_hash, build_grants):
+        """Parse, validate and normalize SoT text into an index"""
+        sot, rejected = parse_sot(text)
+        vocabulary = GrantVocabulary()
+        grants = build_grants(sot, vocabulary)
+        logger.info(f"Compiled SoT index: {len(sot)} rows, {len(grants)} grants, {len(rejected)} rejected")
+        return SoTIndex(sot, grants, rejected, content_hash, vocabulary)
+
+    def _save(self, index, path):
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+
+            # Keep a few recent versions (e.g. main and a candidate branch), drop the rest
+            cached = sorted(self.cache_dir.glob("sot_v*.pkl"), key=lambda p: p.stat().st_mtime, reverse=True)
+            for old in cached[KEEP_CACHED_INDEXES:]:
+                old.unlink(missing_ok=True)
+        except OSError as e:
+            logger.warning(f"Could not cache SoT index: {e}")
@@ -0,0 +1,82 @@
+import json
+import logging
+import time
+from scripts.diff_engine import DiffEngine
+from scripts.finding_store import FINDING_BUCKETS
+from scripts.snapshot_store import SnapshotStore
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class WhatIfDiff:
+    """Offline diff of a candidate SoT against the latest stored snapshots, for SoT pull requests"""
+
+    def __init__(self, snapshot_store=None):
+        self.snapshot_store = snapshot_store or SnapshotStore()
+
+    def _diff(self, sot_path, actuals):
+        """Findings of one SoT against the snapshot grants, keyed by fingerprint"""
+        engine = DiffEngine()
+        index = engine.load_sot_index(sot_path)
+        grants = index.vocabulary.encode(actuals)
+        report = engine.diff_grants(index, grants)
+
+        findings = {}
+        for bucket in FINDING_BUCKETS:
+            for item in report['details'][bucket]:
+                findings[item['fingerprint']] = dict(item, bucket=bucket)
+        return findings, index
+
+    def run(self, candidate_path, base_path="sot/access_matrix.csv"):
+        """Findings the candidate SoT would add and resolve compared with the base SoT"""
+        started = time.perf_counter()
+        actuals = self.snapshot_store.latest_grants()
+        if actuals.empty:
+            raise FileNotFoundError(f"No snapshots in {self.snapshot_store.snapshot_dir} - run a collection first")
+
+        base, _ = self._diff(base_path, actuals)
+        candidate, candidate_index = self._diff(candidate_path, actuals)
+
+        added = [candidate[fp] for fp in candidate if fp not in base]
+        resolved = [base[fp] for fp in base if fp not in candidate]
+        result = {
+            "base": str(base_path),
+            "candidate": str(candidate_path),
+            "snapshots": actuals.attrs['taken_at'],
+            "summary": {
+                "added_count": len(added),
+                "resolved_count": len(resolved),
+                "unchanged_count": len(candidate) - len(added),
+                "rejected_rows": len(candidate_index.rejected),
+                "seconds": round(time.perf_counter() - started, 3)
+            },
+            "added": added,
+            "resolved": resolved,
+            "rejected": candidate_index.rejected
+        }
+        logger.info(
+            f"What-if: {len(added)} findings added, {len(resolved)} resolved, "
+            f"{len(candidate_index.rejected)} rejected rows ({result['summary']['seconds']}s)"
+        )
+        return result
+
+    @staticmethod
+    def print_result(result):
+        summary = result['summary']
+        print(f"{result['candidate']} vs {result['base']} (snapshots: "
+              f"{', '.join(f'{system} {taken_at}' for system, taken_at in result['snapshots'].items())})")
+        for label, items in (('+', result['added']), ('-', result['resolved'])):
+            for item in items:
+                role = item.get('role') or f"{item.get('expected_role')} -> {item.get('actual_role')}"
+                scope = ', '.join(item['scope']) if isinstance(item.get('scope'), list) else item.get('scope')
+                print(f"  {label} {item['bucket']:<10} {item['system']:<10} {item['username']}  {role}  {scope}")
+        for row in result['rejected']:
+            print(f"  ! line {row['line']}: {row['reason']}")
+        print(f"{summary['added_count']} added, {summary['resolved_count']} resolved, "
+              f"{summary['unchanged_count']} unchanged, {summary['rejected_rows']} rejected rows")
+
+    @staticmethod
+    def save(result, filename="out/whatif_report_latest.json"):
+        with open(filename, 'w') as f:
+            json.dump(result, f, indent=2, default=str)
+        return filename
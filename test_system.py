@@ -5,9 +5,84 @@ Test script for Access Guard system
 
 import os
 import json
+import logging
+import subprocess
+import sys
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import pytest
+from benchmarks.fake_github import FakeGitHubServer
 from scripts.github_collector import GitHubCollector
 from scripts.diff_engine import DiffEngine
 from scripts.slack_notifier import SlackNotifier
+from scripts.sot_index import SoTIndexCache
+from scripts import collectors
+from scripts.cloudflare_collector import CloudflareCollector
+from scripts.mongo_collector import MongoCollector
+from scripts.finding_store import FindingStore
+from config.settings import settings
+
+@pytest.fixture(autouse=True)
+def isolated_payload_store(tmp_path, monkeypatch):
+    """Keep raw payloads from actuals saved by tests out of the repo's out/payloads.db"""
+    monkeypatch.setattr(settings, 'PAYLOAD_STORE_DB', str(tmp_path / "payloads.db"))
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Quiet request handler with JSON helpers, for stub APIs"""
+    
+    def log_message(self, *args):
+        pass
+    
+    def read_json(self):
+        return json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+    
+    def reply(self, status=200, body=None, headers=None):
+        data = b'' if body is None else json.dumps(body).encode()
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        if body is not None:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+# Settings that point the GitHub collectors at a stub API
+GITHUB_STUB_SETTINGS = {"GITHUB_API_URL": "{url}", "ACCOUNT_TOKEN": "test", "GITHUB_REQUESTS_PER_SECOND": 0,
+                        "HTTP_CACHE_ENABLED": False}
+
+@pytest.fixture
+def stub_api(monkeypatch):
+    """Start stub APIs (a handler class or a FakeGitHubServer) and point settings at them
+
+    Setting values may contain "{url}" for the server's base URL. Every server is shut down at teardown.
+    """
+    running = []
+    
+    def start(server, **overrides):
+        if isinstance(server, type):
+            httpd = ThreadingHTTPServer(('127.0.0.1', 0), server)
+            httpd.daemon_threads = True
+            httpd.url = f"http://127.0.0.1:{httpd.server_port}"
+            running.append(httpd)
+            threading.Thread(target=httpd.serve_forever, daemon=True).start()
+            server = httpd
+        else:
+            running.append(server.start())
+        for key, value in overrides.items():
+            monkeypatch.setattr(settings, key, value.format(url=server.url) if isinstance(value, str) else value)
+        return server
+    
+    yield start
+    for server in reversed(running):
+        if isinstance(server, ThreadingHTTPServer):
+            server.shutdown()
+            server.server_close()
+        else:
+            server.stop()
 
 def test_github_connection():
     """Test GitHub connection"""
@@ -84,6 +159,980 @@ def test_full_flow():
     
     return report
 
+def test_diff_buckets(tmp_path):
+    """Test offline diff: all four drift buckets from one keyed join"""
+    sot_path = tmp_path / "access_matrix.csv"
+    sot_path.write_text(
+        "system,username,email,role,scope,expires_on,manager,notes\n"
+        "github,Alice,a@example.com,owner,repos:r1|r2,2099-12-31,,\n"
+        "github,bob,b@example.com,write,repos:r1,2099-12-31,,\n"
+        "github,carol,c@example.com,read,repos:r2,2020-01-01,,\n"
+        "github,dave,d@example.com,write,repos:r3,,,\n"
+        "github,frank,f@example.com,write,repos:r2,,,\n"
+        "cloudflare,eve,e@example.com,admin,account:1,,,\n"
+    )
+    actuals = [
+        {"system": "github", "username": "alice", "role": "owner", "scope": ["repos:r1|r2"]},
+        {"system": "github", "username": "bob", "role": "admin", "scope": ["repos:r1"]},
+        {"system": "github", "username": "bob", "role": "write", "scope": ["repos:r9"]},
+        {"system": "github", "username": "mallory", "role": "write", "scope": ["repos:r1"]},
+        {"system": "github", "username": "frank", "role": "push", "scope": ["repos:r2"]}
+    ]
+    legacy_path = tmp_path / "actuals.json"
+    legacy_path.write_text(json.dumps(actuals))
+    ndjson_path = tmp_path / "actuals.ndjson.gz"
+    GitHubCollector().save_actuals(iter(actuals), str(ndjson_path))
+    
+    report = DiffEngine().generate_diff(str(sot_path), str(ndjson_path))
+    details = report['details']
+    
+    # Streaming NDJSON and the legacy JSON array must diff identically
+    legacy = DiffEngine().generate_diff(str(sot_path), str(legacy_path))
+    assert legacy['details'] == details
+    assert report['summary']['total_actuals_records'] == 5
+    
+    assert [item['username'] for item in details['expired']] == ['carol']
+    assert [(item['username'], item['reason']) for item in details['extra']] == [
+        ('bob', 'Grant not in SoT'), ('mallory', 'User not found in SoT')
+    ]
+    # eve's system was not collected and carol's grant has expired
+    assert [(item['username'], item['scope']) for item in details['missing']] == [('dave', 'repos:r3')]
+    # Roles compare by permission level: frank's 'push' is 'write'
+    assert [(item['expected_role'], item['actual_role'], item['change']) for item in details['wrong_role']] == [
+        ('write', 'admin', 'escalated')
+    ]
+    assert report['summary']['drift_found'] is True
+
+def test_raw_payloads_are_stored_once_and_loaded_on_demand(tmp_path, monkeypatch):
+    """Test the payload side store: actuals keep refs, identical payloads are stored once"""
+    from scripts.payload_store import PayloadStore
+    monkeypatch.setattr(settings, 'PAYLOAD_STORE_DB', str(tmp_path / "payloads.db"))
+    profile = {"login": "bob", "id": 7, "role_name": "write", "avatar_url": "https://example.com/bob.png"}
+    records = [{"system": "github", "username": "bob", "role": "write", "scope": [f"repos:r{i}"],
+                "source": {"raw": dict(profile)}} for i in range(300)]
+    records.append({"system": "github", "username": "alice", "role": "owner", "scope": ["repos:r0"],
+                    "source": {"raw": {"login": "alice", "plan": {"name": "pro"}}}})
+    
+    path = GitHubCollector().save_actuals(iter(records), str(tmp_path / "actuals.ndjson.gz"))
+    saved = list(DiffEngine().iter_actuals(path))
+    assert all('raw' not in record['source'] for record in saved)
+    assert len({record['source']['raw_ref'] for record in saved}) == 2
+    
+    store = PayloadStore()
+    assert store.conn.execute("SELECT COUNT(*) FROM payloads").fetchone()[0] == 2
+    assert store.resolve(saved[0]) == dict(records[0], source={"raw": profile})
+    assert store.get(saved[-1]['source']['raw_ref'])['plan'] == {"name": "pro"}
+    
+    # Once the actuals no longer refer to bob's profile, pruning drops it (after the grace period only)
+    path = GitHubCollector().save_actuals(iter(records[-1:]), str(tmp_path / "actuals.ndjson.gz"))
+    assert store.prune([path]) == 0
+    assert store.prune([path], grace_seconds=0) == 1
+    assert store.get(saved[0]['source']['raw_ref']) is None
+    assert store.get(saved[-1]['source']['raw_ref'])['plan'] == {"name": "pro"}
+    store.close()
+
+def test_sot_index_rejects_malformed_rows(tmp_path):
+    """Test SoT compile: truncated rows and bad dates are rejected, index is reused"""
+    sot_path = tmp_path / "access_matrix.csv"
+    sot_path.write_text(
+        "system,username,email,role,scope,expires_on,manager,notes\n"
+        "github,Alice,Alice@Example.com,owner,repos:r1,2099-12-31,,\n"
+        "github,truncated,t@example.com,owner,repos:r2,2099-12-31,you>\n"
+        "github,baddate,b@example.com,write,repos:r3,2099-02-30,,\n"
+    )
+    cache = SoTIndexCache(cache_dir=tmp_path / "cache")
+    index = cache.load_or_compile(str(sot_path), DiffEngine().sot_grants)
+    
+    assert list(index.sot['username']) == ['Alice']
+    assert [item['line'] for item in index.rejected] == [3, 4]
+    assert len(index.lookup_email('alice@example.com')) == 1
+    
+    # Second load comes from the compiled cache, keyed by content hash
+    assert len(list((tmp_path / "cache").glob("*.pkl"))) == 1
+    cached = cache.load_or_compile(str(sot_path), DiffEngine().sot_grants)
+    assert cached.content_hash == index.content_hash
+    assert len(cached.lookup_username('ALICE')) == 1
+
+def test_cli_startup_is_lazy():
+    """Test CLI startup: --help must not import pandas, numpy or requests"""
+    script = (
+        "import sys, time; start = time.perf_counter(); import main; "
+        "print(time.perf_counter() - start); "
+        "print(','.join(m for m in ('pandas', 'numpy', 'requests') if m in sys.modules))"
+    )
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    output = subprocess.run(
+        [sys.executable, "-c", script], cwd=repo_dir, capture_output=True, text=True, check=True
+    ).stdout
+    import_seconds, heavy_modules = output.splitlines()
+    print(f"main import: {float(import_seconds) * 1000:.1f} ms")
+    
+    assert heavy_modules == ''
+    assert float(import_seconds) < 0.25
+    
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "main.py", "--help"], cwd=repo_dir, capture_output=True, check=True)
+    print(f"main.py --help: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+class ScriptedGitHubServer(FakeGitHubServer):
+    """FakeGitHubServer with per-repo collaborator delays and failures, recording fetch order"""
+    
+    def __init__(self, org, delays=None, failing=(), **kwargs):
+        super().__init__(org, latency=0, **kwargs)
+        self.delays = delays or {}
+        self.failing = set(failing)
+        self.fetched = []
+        self.completed = []
+    
+    def route(self, path, query):
+        if path.endswith('/collaborators'):
+            repo = path.split('/')[3]
+            self.fetched.append(repo)
+            time.sleep(self.delays.get(repo, 0))
+            self.completed.append(repo)
+            if repo in self.failing:
+                return 500, {"message": "Server Error"}, ''
+        return super().route(path, query)
+
+def test_pagination_follows_link_header_to_the_last_page(stub_api):
+    """Test Link pagination: rel="next" is followed as given, and a page without a Link header is the last"""
+    requested = []
+    
+    class Handler(StubHandler):
+        def do_GET(self):
+            parsed = urlparse(self.path)
+            requested.append(self.path)
+            query = parse_qs(parsed.query)
+            page = int(query.get('page', ['1'])[0])
+            repos = [{"name": f"repo{page}-{i}"} for i in range(100 if page < 3 else 7)]
+            # GitHub's next links carry opaque cursors; the client must use them verbatim
+            links = {'Link': f'<{self.server.url}/user/repos?per_page=100&page={page + 1}&after=c{page}>; rel="next", '
+                             f'<{self.server.url}/user/repos?per_page=100&page=3>; rel="last"'}
+            self.reply(body=repos, headers=links if page < 3 else None)
+    
+    stub_api(Handler, **GITHUB_STUB_SETTINGS)
+    repos = list(GitHubCollector(use_cache=False).iter_user_repos())
+    assert len(repos) == 207 and repos[-1]['name'] == "repo3-6"
+    assert requested == ["/user/repos?per_page=100", "/user/repos?per_page=100&page=2&after=c1",
+                         "/user/repos?per_page=100&page=3&after=c2"]
+
+def test_response_cache_serves_304s_and_evicts_least_recently_used(tmp_path, stub_api):
+    """Test the conditional-request cache: a 304 serves the cached body and links, LRU eviction at the size cap"""
+    from scripts.response_cache import ResponseCache
+    sent = []
+    
+    class Handler(StubHandler):
+        def do_GET(self):
+            name = self.path.rsplit('/', 1)[-1]
+            etag = f'"{name}-v1"'
+            if self.headers.get('If-None-Match') == etag:
+                sent.append((name, 304))
+                return self.reply(304, headers={'ETag': etag})
+            sent.append((name, 200))
+            self.reply(body={"name": name, "pad": "x" * 1000},
+                       headers={'ETag': etag, 'Link': f'<{self.server.url}/items/{name}?page=2>; rel="next"'})
+    
+    stub_api(Handler, **dict(GITHUB_STUB_SETTINGS, HTTP_CACHE_ENABLED=True, HTTP_CACHE_DIR=str(tmp_path / "cache")))
+    collector = GitHubCollector(use_cache=True)
+    url = f"{settings.GITHUB_API_URL}/items"
+    first = collector._get(f"{url}/a")
+    again = collector._get(f"{url}/a")
+    assert again == first and again[0]['name'] == "a" and again[1]['next']['url'].endswith("/items/a?page=2")
+    assert sent == [("a", 200), ("a", 304)]
+    assert collector.cache.stats() == {"hits": 1, "misses": 1}
+    assert collector.scheduler.stats()['budget_used'] == 1
+    
+    # Room for three entries: reading "a" again makes "b" the least recently used, so "b" goes when "d" arrives
+    entry_size = next((tmp_path / "cache").glob('*/*.json')).stat().st_size
+    cache = ResponseCache(tmp_path / "lru", max_bytes=int(entry_size * 3.5))
+    collector.cache = cache
+    for name in ("a", "b", "c"):
+        collector._get(f"{url}/{name}")
+        time.sleep(0.01)
+    collector._get(f"{url}/a")
+    time.sleep(0.01)
+    collector._get(f"{url}/d")
+    assert [name for name in "abcd" if cache.get(f"{url}/{name}", collector.cache_identity)] == ["a", "c", "d"]
+
+def test_concurrent_collection_keeps_submission_order(stub_api):
+    """Test that concurrent collaborator fetches finish out of order but are yielded in repo order"""
+    from benchmarks.synthetic import SyntheticOrg
+    org = SyntheticOrg(repos=40, collaborators=200)
+    # Early repos answer last, so completion order is roughly the reverse of submission order
+    delays = {repo['name']: 0.002 * (40 - i) for i, repo in enumerate(org.repos)}
+    server = stub_api(ScriptedGitHubServer(org, delays=delays), **GITHUB_STUB_SETTINGS, GITHUB_INCREMENTAL=False)
+    
+    records = list(GitHubCollector(max_workers=8, use_cache=False).iter_actuals())
+    expected = [(org.owner, None)] + [
+        (collaborator['login'], f"repos:{repo['name']}")
+        for repo in org.repos for collaborator in org.collaborators[repo['name']]
+    ]
+    assert [(record['username'], record['scope'][0] if record['role'] != 'owner' else None)
+            for record in records] == expected
+    assert sorted(server.completed) == [repo['name'] for repo in org.repos] != server.completed
+
+def test_collaborator_failure_cancels_pending_fetches(stub_api):
+    """Test that one repo failing aborts the run with CollectionError and drops fetches not yet started"""
+    from benchmarks.synthetic import SyntheticOrg
+    org = SyntheticOrg(repos=300, collaborators=600)
+    server = stub_api(ScriptedGitHubServer(org, delays={repo['name']: 0.005 for repo in org.repos},
+                                           failing={"repo00003"}),
+                      **GITHUB_STUB_SETTINGS, GITHUB_INCREMENTAL=False, GITHUB_MAX_RETRIES=0)
+    
+    with pytest.raises(collectors.CollectionError, match="repo00003"):
+        list(GitHubCollector(max_workers=2, use_cache=False).iter_actuals())
+    assert "repo00003" in server.fetched
+    assert len(server.fetched) < 300
+
+def test_incremental_run_resumes_after_an_interruption(tmp_path, stub_api):
+    """Test that a re-run after an aborted incremental run fetches only the unfinished repos, with identical actuals"""
+    from benchmarks.synthetic import SyntheticOrg
+    org = SyntheticOrg(repos=30, collaborators=120)
+    state_file = tmp_path / "github_state.json"
+    server = stub_api(ScriptedGitHubServer(org, failing={"repo00012"}), **GITHUB_STUB_SETTINGS,
+                      GITHUB_INCREMENTAL=True, GITHUB_STATE_FILE=str(state_file), GITHUB_CHECKPOINT_EVERY=5,
+                      GITHUB_MAX_RETRIES=0)
+    
+    def actuals(records):
+        return sorted((record['username'], record['role'], record['scope'][0]) for record in records)
+    
+    with pytest.raises(collectors.CollectionError, match="repo00012"):
+        list(GitHubCollector(max_workers=1, use_cache=False).iter_actuals())
+    saved = set(json.loads(state_file.read_text())['repos'])
+    remaining = [repo['name'] for repo in org.repos if repo['name'] not in saved]
+    assert {f"repo{i:05d}" for i in range(12)} <= saved
+    assert remaining[0] == "repo00012" and len(remaining) < 30
+    
+    server.failing.clear()
+    server.fetched.clear()
+    resumed = actuals(GitHubCollector(max_workers=1, use_cache=False).iter_actuals())
+    assert server.fetched == remaining
+    assert set(json.loads(state_file.read_text())['repos']) == {repo['name'] for repo in org.repos}
+    
+    server.fetched.clear()
+    assert resumed == actuals(GitHubCollector(max_workers=4, use_cache=False, incremental=False).iter_actuals())
+    assert len(server.fetched) == 30
+
+def test_collectors_run_concurrently_with_partial_results(tmp_path, monkeypatch):
+    """Test collector runner: concurrent systems, one failure and one timeout don't block the rest"""
+    class FakeCollector(collectors.BaseCollector):
+        def __init__(self, system, delay, fail=False, stall=0):
+            self.system, self.delay, self.fail, self.stall = system, delay, fail, stall
+        
+        def iter_actuals(self):
+            for i in range(3):
+                time.sleep(self.delay / 3)
+                if self.fail:
+                    raise collectors.CollectionError("API unavailable")
+                yield {"system": self.system, "username": f"user{i}", "role": "member", "scope": ["org:x"]}
+            # Stuck in a final request that only returns after the run has given up
+            time.sleep(self.stall)
+    
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "out").mkdir()
+    monkeypatch.setattr(collectors, "COLLECTORS", {})
+    collectors.register_collector('alpha', lambda: FakeCollector('alpha', 0.6), lambda: True, timeout=10)
+    collectors.register_collector('beta', lambda: FakeCollector('beta', 0.6), lambda: True, timeout=10)
+    collectors.register_collector('broken', lambda: FakeCollector('broken', 0.3, fail=True), lambda: True)
+    collectors.register_collector('slow', lambda: FakeCollector('slow', 3), lambda: True, timeout=0.5)
+    collectors.register_collector('stuck', lambda: FakeCollector('stuck', 0, stall=1), lambda: True, timeout=0.2)
+    monkeypatch.setattr(collectors, "TIMEOUT_GRACE_SECONDS", 0.1)
+    collectors.register_collector('unconfigured', lambda: FakeCollector('unconfigured', 0), lambda: False)
+    
+    results = collectors.CollectorRunner().run()
+    
+    assert {system: result['status'] for system, result in results.items()} == {
+        'alpha': 'ok', 'beta': 'ok', 'broken': 'failed', 'slow': 'timeout', 'stuck': 'timeout'
+    }
+    assert not (tmp_path / "out" / "broken_actuals_latest.ndjson.gz").exists()
+    # Once the stuck collector returns, it doesn't publish actuals for a run reported as timed out
+    for thread in threading.enumerate():
+        if thread.name == 'collector-stuck':
+            thread.join()
+    assert not (tmp_path / "out" / "stuck_actuals_latest.ndjson.gz").exists()
+    
+    paths = [result['path'] for result in results.values() if result['status'] == 'ok']
+    actual_grants = DiffEngine().actual_grants(
+        record for path in paths for record in DiffEngine().iter_actuals(path)
+    )
+    assert sorted(actual_grants['system'].unique()) == ['alpha', 'beta']
+
+def cloudflare_stub(member_count, throttle_page=None):
+    """Handler serving /accounts/<id>/members like the Cloudflare API; optionally 429 one page once"""
+    def member(i):
+        user = {"id": f"u{i}", "email": f"user{i}@example.com"}
+        if i % 2:
+            zone_scope = {"key": f"com.cloudflare.api.account.zone.zone{i % 3}", "objects": []}
+            policy = {"id": f"p{i}", "access": "allow",
+                      "permission_groups": [{"id": "g1", "name": "DNS"}],
+                      "resource_groups": [{"id": "r1", "scope": zone_scope}]}
+            return {"id": f"m{i}", "status": "accepted", "user": user, "roles": [], "policies": [policy]}
+        return {"id": f"m{i}", "status": "accepted", "user": user,
+                "roles": [{"id": "r", "name": "Administrator"}]}
+    
+    members = [member(i) for i in range(member_count)]
+    throttled = set()
+    
+    class Handler(StubHandler):
+        def do_GET(self):
+            query = parse_qs(urlparse(self.path).query)
+            page, per_page = int(query['page'][0]), int(query['per_page'][0])
+            if page == throttle_page and page not in throttled:
+                throttled.add(page)
+                # The HTTP-date form; a date already reached means retry right away
+                return self.reply(429, headers={'Retry-After': formatdate(time.time(), usegmt=True)})
+            
+            self.reply(body={
+                "success": True, "errors": [], "messages": [],
+                "result": members[(page - 1) * per_page:page * per_page],
+                "result_info": {"page": page, "per_page": per_page, "total_count": len(members),
+                                "total_pages": -(-len(members) // per_page)}
+            })
+    
+    return Handler
+
+def test_scheduler_waits_out_rate_limits_and_gives_up_loudly(stub_api, monkeypatch):
+    """Test the request scheduler: Retry-After, X-RateLimit-Reset, secondary limits, 429 backoff, give-up"""
+    import requests
+    from scripts import rate_limiter
+    monkeypatch.setattr(rate_limiter, 'SECONDARY_RATE_LIMIT_WAIT', 0.05)
+    script = []
+    
+    class Handler(StubHandler):
+        def do_GET(self):
+            status, headers, body = script.pop(0) if script else (200, {}, {"ok": True})
+            self.reply(status, body, headers)
+    
+    server = stub_api(Handler, **GITHUB_STUB_SETTINGS)
+    session = requests.Session()
+    
+    def get(*responses, max_retries=3):
+        script[:] = responses
+        scheduler = rate_limiter.RequestScheduler(rate=0, max_retries=max_retries, backoff_base=0.01)
+        return scheduler.request(session, 'GET', f"{server.url}/x", timeout=5), scheduler
+    
+    secondary = (403, {}, {"message": "You have exceeded a secondary rate limit"})
+    cases = {
+        "Retry-After seconds": (429, {'Retry-After': '0.05'}, None),
+        "Retry-After HTTP-date": (403, {'Retry-After': formatdate(time.time(), usegmt=True)}, None),
+        "X-RateLimit-Reset": (403, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Limit': '5000',
+                                    'X-RateLimit-Reset': str(int(time.time()))}, None),
+        "secondary limit body": secondary,
+        "429 without Retry-After": (429, {}, None)
+    }
+    for case, throttled in cases.items():
+        response, scheduler = get(throttled)
+        assert response.status_code == 200, case
+        assert scheduler.stats()['retries'] == 1, case
+        if case == "X-RateLimit-Reset":
+            # Every worker is held until a second past the reset time
+            assert scheduler.stats()['waited_seconds'] > 0
+    
+    # A plain 403 is final and goes back to the caller untouched
+    response, scheduler = get((403, {}, {"message": "Must have push access"}))
+    assert response.status_code == 403 and scheduler.stats()['retries'] == 0
+    
+    # Still throttled after every retry: raise rather than hand back a 403 that reads as "no access"
+    with pytest.raises(rate_limiter.RateLimitExceeded):
+        get(secondary, secondary, secondary, max_retries=2)
+    script[:] = [secondary] * 3
+    monkeypatch.setattr(settings, 'GITHUB_MAX_RETRIES', 2)
+    with pytest.raises(collectors.CollectionError):
+        GitHubCollector(use_cache=False).get_collaborators("acme", "r1")
+
+def test_cloudflare_collector_against_stub(stub_api):
+    """Test Cloudflare collector: concurrent pages, roles and policies, 429 retry"""
+    server = stub_api(cloudflare_stub(member_count=2000, throttle_page=7), CLOUDFLARE_REQUESTS_PER_SECOND=0)
+    collector = CloudflareCollector(token="test", account_id="acc1", base_url=server.url)
+    start = time.perf_counter()
+    records = list(collector.iter_actuals())
+    print(f"cloudflare: {len(records)} records in {(time.perf_counter() - start) * 1000:.0f} ms")
+    
+    assert len(records) == 2000
+    assert [record['username'] for record in records[:3]] == [f"user{i}@example.com" for i in range(3)]
+    assert records[0]['role'] == 'administrator' and records[0]['scope'] == ['account:acc1']
+    assert records[1]['role'] == 'dns' and records[1]['scope'] == ['zones:zone1']
+    assert set(records[0]) == {"system", "username", "email", "role", "scope", "collected_at", "source"}
+    assert collector.stats()['retries'] == 1
+
+class FakeMongoAdmin:
+    """In-process stand-in for the admin database's usersInfo / rolesInfo commands"""
+    
+    def __init__(self, users, roles):
+        self.users, self.roles, self.calls = users, roles, []
+    
+    def command(self, command):
+        self.calls.append(next(iter(command)))
+        if 'usersInfo' in command:
+            return {"users": self.users, "ok": 1}
+        wanted = {(doc['role'], doc['db']) for doc in command['rolesInfo']}
+        return {"roles": [
+            {"role": role, "db": db, "roles": [{"role": r, "db": d} for r, d in parents]}
+            for (role, db), parents in self.roles.items() if (role, db) in wanted
+        ], "ok": 1}
+
+class FakeMongoClient:
+    def __init__(self, admin):
+        self.admin = admin
+
+def test_mongo_collector_expands_inherited_roles():
+    """Test MongoDB collector: one usersInfo, one rolesInfo per inheritance level, memoized expansion"""
+    roles = {
+        ("appAdmin", "app"): [("appWriter", "app"), ("clusterMonitor", "admin")],
+        ("appWriter", "app"): [("readWrite", "app")],
+        ("readWrite", "app"): [],
+        ("clusterMonitor", "admin"): [],
+        ("read", "reports"): [],
+    }
+    users = [
+        {"user": f"svc{i}", "db": "app", "roles": [{"role": "appWriter", "db": "app"}]} for i in range(500)
+    ] + [
+        {"user": "alice", "db": "admin", "customData": {"email": "alice@example.com"},
+         "roles": [{"role": "appAdmin", "db": "app"}, {"role": "readWrite", "db": "app"},
+                   {"role": "read", "db": "reports"}]},
+    ]
+    admin = FakeMongoAdmin(users, roles)
+    collector = MongoCollector(client=FakeMongoClient(admin))
+    records = list(collector.iter_actuals())
+    
+    # Bulk commands: one usersInfo, then one rolesInfo per level of the role graph
+    assert admin.calls == ['usersInfo', 'rolesInfo', 'rolesInfo']
+    assert len(records) == 500 * 2 + 5
+    
+    alice = {(r['role'], r['scope'][0]): r['source']['raw']['inherited_from'] for r in records if r['username'] == 'alice'}
+    assert alice == {
+        ("appAdmin", "db:app"): None,
+        ("readWrite", "db:app"): None,
+        ("read", "db:reports"): None,
+        ("appWriter", "db:app"): "appAdmin@app",
+        ("clusterMonitor", "db:admin"): "appAdmin@app",
+    }
+    assert records[-1]['email'] == 'alice@example.com'
+
+def test_benchmark_smoke(tmp_path):
+    """Test the offline benchmark suite end to end on a tiny synthetic org"""
+    from benchmarks.run_benchmarks import PRESETS, run
+    
+    document = run(work_dir=tmp_path, **PRESETS['smoke'])
+    results = document['results']
+    grants = results['generate_data']['grants']
+    
+    assert results['collect_actuals_cold']['records'] == grants + 1
+    # The warm run is served from the ETag cache: same records, no bodies transferred
+    assert results['collect_actuals_warm']['records'] == grants + 1
+    assert results['collect_actuals_warm']['bytes'] == 0
+    assert results['generate_diff_warm']['extra_count'] == results['generate_diff_cold']['extra_count']
+    assert settings.ACCOUNT_TOKEN != 'benchmark'
+    json.dumps(document)
+
+def test_nightly_run_records_stage_metrics(tmp_path, monkeypatch, stub_api):
+    """Test run_nightly against the fake GitHub API: stage timings, collector counters, exports"""
+    from benchmarks.fake_github import FakeGitHubServer
+    from benchmarks.synthetic import SyntheticOrg, generate_sot
+    from main import AccessGuard
+    
+    org = SyntheticOrg(repos=30, collaborators=120)
+    monkeypatch.chdir(tmp_path)
+    for directory in ("out", "logs", "sot"):
+        (tmp_path / directory).mkdir()
+    generate_sot(org, rows=200, path=tmp_path / "sot" / "access_matrix.csv")
+    
+    server = stub_api(FakeGitHubServer(org, latency=0), GITHUB_API_URL="{url}", ACCOUNT_TOKEN="test", GITHUB_ORG="",
+                      GITHUB_REQUESTS_PER_SECOND=0, CLOUDFLARE_TOKEN=None, MONGO_URI=None, SLACK_WEBHOOK_URL=None,
+                      METRICS_EXPORT="prometheus,json", METRICS_TRACE_MEMORY=True)
+    AccessGuard().run_nightly()
+    
+    with open(tmp_path / "out" / "diff_report_latest.json") as f:
+        performance = json.load(f)['summary']['performance']
+    assert set(performance['stages']) == {'collect', 'diff', 'notify'}
+    assert performance['stages']['diff']['peak_memory_bytes'] > 0
+    github = performance['collectors']['github']
+    assert github['status'] == 'ok'
+    assert github['requests'] == server.requests and github['bytes_received'] > 0
+    assert github['cache_misses'] > 0 and github['retries'] == 0
+    
+    prometheus = (tmp_path / "out" / "metrics" / "access_guard.prom").read_text()
+    assert 'access_guard_stage_duration_seconds{stage="diff"}' in prometheus
+    assert 'access_guard_collector_up{system="github"} 1' in prometheus
+    assert 'access_guard_last_run_success 1' in prometheus
+    assert json.loads((tmp_path / "out" / "metrics" / "access_guard_metrics.json").read_text())['success'] is True
+
+def webhook_stub(statuses):
+    """Handler recording posted Slack messages; answers with the queued statuses first, then 200"""
+    received = []
+    
+    class Handler(StubHandler):
+        def do_POST(self):
+            body = self.read_json()
+            status = statuses.pop(0) if statuses else 200
+            if status == 200:
+                received.append(body)
+            self.reply(status, headers={'Retry-After': '0.1'} if status == 429 else None)
+    
+    return Handler, received
+
+def test_slack_report_is_chunked_rate_limited_and_spooled(tmp_path, monkeypatch, stub_api):
+    """Test Slack delivery: every finding sent within block limits, 429 retried, failures spooled"""
+    monkeypatch.setattr(settings, 'SLACK_MESSAGES_PER_SECOND', 0)
+    monkeypatch.setattr(settings, 'SLACK_MAX_RETRIES', 1)
+    monkeypatch.setattr(SlackNotifier, 'validate_webhook', lambda self: True)
+    report = {
+        "summary": {"total_sot_records": 10, "total_actuals_records": 3000},
+        "details": {
+            "extra": [{"username": f"user{i}", "system": "github", "role": "write", "scope": [f"repos:r{i}"]}
+                      for i in range(3000)],
+            "wrong_role": [{"username": "bob", "system": "github", "scope": "repos:x",
+                            "expected_role": "read", "actual_role": "admin"}]
+        }
+    }
+    
+    handler, received = webhook_stub([200, 429])
+    notifier = SlackNotifier(spool_dir=tmp_path / "spool")
+    notifier.webhook_url = f"{stub_api(handler).url}/hook"
+    assert notifier.send_report(report)
+    
+    assert notifier.scheduler.stats()['retries'] == 1
+    assert all(len(message['blocks']) <= 50 for message in received)
+    texts = [block['text']['text'] for message in received for block in message['blocks']
+             if block['type'] == 'section' and 'text' in block]
+    assert all(len(text) <= 3000 for text in texts)
+    lines = [line for text in texts for line in text.splitlines() if line.startswith('• ')]
+    assert len(lines) == 3001
+    
+    # A dead webhook spools everything unsent; --report later resends it in order
+    handler, received = webhook_stub([500, 500])
+    notifier.webhook_url = f"{stub_api(handler).url}/hook"
+    assert not notifier.send_report(report)
+    spooled = notifier.spooled()
+    assert len(spooled) == 3
+    assert notifier.resend_spooled()
+    assert notifier.spooled() == []
+    assert len(received) == len(spooled)
+
+def test_findings_are_deduplicated_across_runs(tmp_path):
+    """Test finding fingerprints: new, still open and resolved across runs; Slack lists only new ones"""
+    def report(*findings):
+        details = {"expired": [], "extra": [], "missing": [], "wrong_role": []}
+        for bucket, username, system in findings:
+            details[bucket].append({"system": system, "username": username, "role": "write",
+                                    "scope": [f"repos:{username}"], "expires_on": "2020-01-01"})
+        return {"summary": {"drift_found": True}, "details": details}
+    
+    store = FindingStore(tmp_path / "findings.db")
+    first = report(('extra', 'alice', 'github'), ('expired', 'bob', 'github'), ('extra', 'carol', 'cloudflare'))
+    assert store.reconcile(first)['new_count'] == 3
+    
+    # Same drift with different casing keeps its fingerprint; bob is fixed; dave is new.
+    # Cloudflare failed to collect, so carol's finding must stay open rather than resolve.
+    second = report(('extra', 'ALICE', 'GitHub'), ('extra', 'dave', 'github'))
+    counts = store.reconcile(second, skip_systems=['cloudflare'])
+    assert counts == {"new_count": 1, "resolved_count": 1, "still_open_count": 2, "open_count": 3}
+    assert [item['status'] for item in second['details']['extra']] == ['open', 'new']
+    
+    messages = SlackNotifier().create_slack_messages(second)
+    lines = [block['text']['text'] for message in messages[1:] for block in message['blocks'][1:]]
+    assert len(lines) == 1 and 'dave' in lines[0]
+    
+    # A resolved finding that comes back is new again
+    third = report(('extra', 'alice', 'github'), ('expired', 'bob', 'github'))
+    assert store.reconcile(third)['new_count'] == 1
+    store.close()
+
+@pytest.mark.parametrize("org_mode", [False, True], ids=["account", "org"])
+def test_daemon_applies_webhooks_incrementally(tmp_path, monkeypatch, stub_api, org_mode):
+    """Test daemon mode: signed webhooks refetch only the affected repo and patch the last report"""
+    import hashlib
+    import hmac
+    import urllib.error
+    import urllib.request
+    from benchmarks.fake_github import FakeGitHubServer
+    from benchmarks.synthetic import SyntheticOrg, generate_sot
+    from main import AccessGuard
+    from scripts.daemon import AccessGuardDaemon
+    
+    org = SyntheticOrg(repos=20, collaborators=80)
+    monkeypatch.chdir(tmp_path)
+    for directory in ("out", "logs", "sot"):
+        (tmp_path / directory).mkdir()
+    generate_sot(org, rows=100, path=tmp_path / "sot" / "access_matrix.csv", drift=0)
+    
+    def post(port, event, payload, secret="s3cret"):
+        body = json.dumps(payload).encode()
+        signature = "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+        request = urllib.request.Request(f"http://127.0.0.1:{port}/webhook", data=body, headers={
+            "X-GitHub-Event": event, "X-Hub-Signature-256": signature, "Content-Type": "application/json"})
+        try:
+            return urllib.request.urlopen(request).status
+        except urllib.error.HTTPError as e:
+            return e.code
+    
+    server = stub_api(FakeGitHubServer(org, latency=0), GITHUB_API_URL="{url}", ACCOUNT_TOKEN="test",
+                      GITHUB_ORG=org.owner if org_mode else "", GITHUB_REQUESTS_PER_SECOND=0,
+                      CLOUDFLARE_TOKEN=None, MONGO_URI=None, SLACK_WEBHOOK_URL=None)
+    daemon = AccessGuardDaemon(AccessGuard(), port=0, secret="s3cret", sweep_interval_minutes=60)
+    thread = threading.Thread(target=daemon.run, daemon=True)
+    thread.start()
+    for _ in range(200):
+        if daemon.report is not None:
+            break
+        time.sleep(0.05)
+    assert daemon.report is not None
+    port = daemon.server.server_port
+    swept_extra = len(daemon.report['details']['extra'])
+    
+    # A new collaborator on one repo: only that repo is refetched
+    org.collaborators['repo00003'].append({"login": "intruder", "role_name": "admin"})
+    requests_before = server.requests
+    assert post(port, "member", {"action": "added", "repository": {"name": "repo00003"},
+                                 "member": {"login": "intruder"}}) == 202
+    assert post(port, "member", {"repository": {"name": "repo00003"}}, secret="wrong") == 401
+    daemon.queue.join()
+    assert server.requests - requests_before == 1
+    extra = daemon.report['details']['extra']
+    assert len(extra) == swept_extra + 1
+    assert {"username": "intruder", "reason": "User not found in SoT", "status": "new"}.items() <= extra[-1].items()
+    
+    # Deleting a repo leaves every SoT grant on it missing, the owner's included (org mode sees a null repository)
+    expected = {item['login'] for item in org.collaborators['repo00004']} | {org.owner}
+    del org.collaborators['repo00004']
+    assert post(port, "repository", {"action": "deleted", "repository": {"name": "repo00004"}}) == 202
+    daemon.queue.join()
+    missing = {item['username'] for item in daemon.report['details']['missing'] if item['scope'] == 'repos:repo00004'}
+    assert missing == expected
+    
+    daemon.stop()
+    thread.join(timeout=10)
+    
+    with open(tmp_path / "out" / "diff_report_latest.json") as f:
+        saved = json.load(f)
+    assert saved['summary']['extra_count'] == swept_extra + 1
+    assert saved['summary']['new_count'] == len(expected)
+
+def test_github_collector_fails_without_user_info(tmp_path, stub_api):
+    """Test that a rejected token fails the collection and keeps the last good actuals file"""
+    class Handler(StubHandler):
+        def do_GET(self):
+            self.reply(401, {"message": "Bad credentials"})
+    
+    stub_api(Handler, **GITHUB_STUB_SETTINGS)
+    path = str(tmp_path / "github.ndjson.gz")
+    collector = GitHubCollector(use_cache=False)
+    collector.save_actuals(iter([{"system": "github", "username": "alice", "role": "admin", "scope": ["repos:r1"]}]),
+                           path)
+    with pytest.raises(collectors.CollectionError):
+        collector.save_actuals(collector.iter_actuals(), path)
+    assert [record['username'] for record in DiffEngine().iter_actuals(path)] == ['alice']
+
+def test_org_collector_fails_when_org_is_not_found(stub_api):
+    """Test that a null organization (wrong name or token scope) fails the collection instead of looking empty"""
+    from scripts.github_org_collector import GitHubOrgCollector
+    
+    class Handler(StubHandler):
+        def do_POST(self):
+            self.read_json()
+            self.reply(body={"data": {"organization": None}, "errors": [
+                {"type": "NOT_FOUND", "path": ["organization"], "message": "Could not resolve to an Organization"}
+            ]})
+    
+    stub_api(Handler, **GITHUB_STUB_SETTINGS)
+    collector = GitHubOrgCollector(org="no-such-org")
+    with pytest.raises(collectors.CollectionError):
+        list(collector.iter_actuals())
+    with pytest.raises(collectors.CollectionError):
+        collector.member_count()
+
+def test_org_collector_pages_graphql_connections_and_maps_permissions(stub_api):
+    """Test the org GraphQL path: multi-page members and repos, overflowing collaborators, permission -> role"""
+    from benchmarks.synthetic import SyntheticOrg
+    from scripts.github_org_collector import GitHubOrgCollector
+    # The first repo gets well over 100 collaborators, so it needs a follow-up repository query
+    org = SyntheticOrg(repos=7, collaborators=300, users=200)
+    assert len(org.collaborators["repo00000"]) > 100
+    server = stub_api(FakeGitHubServer(org, latency=0), **GITHUB_STUB_SETTINGS,
+                      GITHUB_ORG=org.owner, GITHUB_GRAPHQL_PAGE_SIZE=3)
+    
+    collector = GitHubOrgCollector()
+    records = list(collector.iter_actuals())
+    actual = sorted((record['username'], record['role'], record['scope'][0]) for record in records)
+    members = {item['login'] for items in org.collaborators.values() for item in items}
+    expected = [(org.owner, 'admin', f"org:{org.owner}")] + [(login, 'member', f"org:{org.owner}") for login in members]
+    for repo in org.repos:
+        expected.append((org.owner, 'admin', f"repos:{repo['name']}"))
+        expected += [(item['login'], item['role_name'], f"repos:{repo['name']}")
+                     for item in org.collaborators[repo['name']]]
+    assert actual == sorted(expected)
+    assert len(members) + 1 > 100
+    # Two member pages, one team page, three repo pages, one collaborator overflow, one outside collaborator page
+    assert server.requests == 2 + 1 + 3 + 1 + 1
+    
+    # RATE_LIMITED comes back as HTTP 200 with null data: wait and retry rather than fail the run
+    server.graphql_rate_limited = 2
+    collector = GitHubOrgCollector()
+    collector.scheduler.backoff_base = 0.01
+    assert collector.member_count() == len(members) + 1
+    assert collector.scheduler.stats()['retries'] == 2
+    
+    server.graphql_rate_limited = 3
+    collector.scheduler.max_retries = 2
+    with pytest.raises(collectors.CollectionError):
+        list(collector.collect_members())
+
+def test_mfa_sweep_uses_org_filters_cache_and_batched_nudges(tmp_path, monkeypatch, stub_api):
+    """Test the MFA sweep: two filtered list sweeps, SoT join, cached rerun, few Slack messages"""
+    from scripts.github_org_collector import GitHubOrgCollector
+    from scripts.mfa_sweep import MFASweep
+    calls = []
+    owner_token = [True]
+    
+    class Handler(StubHandler):
+        def do_POST(self):
+            self.read_json()
+            calls.append('graphql')
+            self.reply(body={"data": {"organization": {"membersWithRole": {"totalCount": 1000}}}})
+        
+        def do_GET(self):
+            parsed = urlparse(self.path)
+            query = parse_qs(parsed.query)
+            calls.append(parsed.path)
+            if not owner_token[0]:
+                return self.reply(403, {"message": "Must be an owner to use this filter"})
+            assert query['filter'] == ['2fa_disabled']
+            page = int(query.get('page', ['1'])[0])
+            if parsed.path.endswith('/outside_collaborators'):
+                return self.reply(body=[{"login": f"vendor{i}"} for i in range(3)])
+            logins = [f"user{i}" for i in range((page - 1) * 100, min(page * 100, 250))]
+            next_page = f"{self.server.url}{parsed.path}?filter=2fa_disabled&per_page=100&page={page + 1}"
+            self.reply(body=[{"login": login} for login in logins],
+                       headers={'Link': f'<{next_page}>; rel="next"'} if page < 3 else None)
+    
+    stub_api(Handler, **GITHUB_STUB_SETTINGS, GITHUB_ORG="acme", SOT_CACHE_DIR=str(tmp_path / "cache"))
+    slack_handler, received = webhook_stub([])
+    stub_api(slack_handler, SLACK_WEBHOOK_URL="{url}/hook", SLACK_MESSAGES_PER_SECOND=0)
+    monkeypatch.setattr(SlackNotifier, 'validate_webhook', lambda self: True)
+    
+    sot_path = tmp_path / "access_matrix.csv"
+    sot_path.write_text(
+        "system,username,email,role,scope,expires_on,manager,notes\n"
+        "github,User1,u1@example.com,member,org:acme,,carol,\n"
+        "cloudflare,vendor0,v0@example.com,admin,account:1,,dave,\n"
+    )
+    sweep = MFASweep(collector=GitHubOrgCollector(), sot_path=str(sot_path),
+                     cache_file=tmp_path / "mfa_cache.json", report_file=tmp_path / "mfa_report.json")
+    report = sweep.run()
+    
+    assert calls == ['graphql'] + ['/orgs/acme/members'] * 3 + ['/orgs/acme/outside_collaborators']
+    assert report['summary'] == {"member_count": 1000, "members_without_mfa": 250,
+                                 "outside_collaborators_without_mfa": 3, "not_in_sot_count": 252,
+                                 "coverage_percent": 75.0}
+    user1 = next(user for user in report['users'] if user['username'] == 'user1')
+    assert user1['in_sot'] and user1['manager'] == 'carol'
+    
+    # 253 nudges go out as a summary plus one batched message, not one per user
+    assert len(received) == 2
+    assert sum(block['text']['text'].count('• ') for block in received[1]['blocks']) == 253
+    
+    # A recent sweep is reused without touching the API
+    calls.clear()
+    assert sweep.run(notify=False)['summary'] == report['summary']
+    assert calls == []
+    
+    # Without owner scope the filtered lists are refused; that must fail loudly, not read as full coverage
+    owner_token[0] = False
+    with pytest.raises(collectors.CollectionError, match="org owner token"):
+        sweep.sweep(use_cache=False)
+
+def test_offboarding_runs_journaled_plan_and_resumes(tmp_path, stub_api, caplog):
+    """Test offboarding: plan from actuals, DRY_RUN makes no calls, an interrupted run resumes"""
+    from scripts.offboarding import OffboardingExecutor, OffboardingPlanner
+    deleted = []
+    failing = {"/repos/acme/r2/collaborators/bob"}
+    
+    class Handler(StubHandler):
+        def do_DELETE(self):
+            status = 422 if self.path in failing else 204
+            if status == 204:
+                deleted.append(self.path)
+            self.reply(status)
+    
+    stub_api(Handler, **GITHUB_STUB_SETTINGS, GITHUB_ORG="acme")
+    
+    actuals = [
+        {"system": "github", "username": "Bob", "role": "member", "scope": ["org:acme"]},
+        {"system": "github", "username": "bob", "role": "maintainer", "scope": ["teams:core"]},
+        {"system": "github", "username": "alice", "role": "admin", "scope": ["repos:r1"]}
+    ] + [{"system": "github", "username": "bob", "role": "write", "scope": [f"repos:r{i}"]} for i in range(30)]
+    path = GitHubCollector().save_actuals(iter(actuals), str(tmp_path / "github.ndjson.gz"))
+    plan = OffboardingPlanner().plan_for_user("bob", [path])
+    assert len(plan['actions']) == 32
+    assert plan['actions'][-1]['path'] == "/orgs/acme/memberships/Bob"
+    
+    executor = OffboardingExecutor(journal_dir=tmp_path / "offboarding", max_workers=4)
+    assert executor.execute(plan, dry_run=True) == {"dry_run": True, "planned": 32}
+    assert deleted == []
+    
+    caplog.clear()
+    with caplog.at_level(logging.INFO, logger="scripts.offboarding"):
+        assert executor.execute(plan, dry_run=False) == {"done": 31, "failed": 1, "resumed": 0}
+    # The plan id and file are logged before the first call, so an interrupted run can be found and resumed
+    assert caplog.messages[0] == f"Offboarding plan {plan['plan_id']} saved to {executor.plan_path(plan['plan_id'])}"
+    assert deleted[-1] == "/orgs/acme/memberships/Bob" and len(set(deleted)) == 31
+    
+    # Resuming the saved plan repeats only the call that failed
+    failing.clear()
+    deleted.clear()
+    resumed = executor.load_plan(plan['plan_id'])
+    assert executor.execute(resumed, dry_run=False) == {"done": 1, "failed": 0, "resumed": 31}
+    assert deleted == ["/repos/acme/r2/collaborators/bob"]
+    
+    # A new plan for the same grants (e.g. bob was re-granted) gets its own journal and runs in full
+    deleted.clear()
+    again = OffboardingPlanner().plan_for_user("bob", [path])
+    assert again['plan_id'] != plan['plan_id']
+    assert executor.execute(again, dry_run=False) == {"done": 32, "failed": 0, "resumed": 0}
+    assert len(deleted) == 32
+
+def test_finding_store_backfills_spans_for_open_findings(tmp_path):
+    """Test that findings open before spans were kept still get a resolution time"""
+    from datetime import datetime
+    import sqlite3
+    from scripts.history_store import HistoryStore
+    db = tmp_path / "findings.db"
+    store = FindingStore(db)
+    extra = {"system": "github", "username": "carol", "role": "admin", "scope": ["repos:r7"]}
+    store.reconcile({"details": {"extra": [dict(extra)]}}, at=datetime(2025, 1, 1))
+    store.close()
+    # A database from before spans were kept
+    with sqlite3.connect(db) as conn:
+        conn.execute("DELETE FROM finding_spans")
+    conn.close()
+    
+    store = FindingStore(db)
+    store.reconcile({"details": {"extra": []}}, at=datetime(2025, 1, 3))
+    store.close()
+    history = HistoryStore(db)
+    assert history.remediation_stats()['extra'] == {"resolved": 1, "open": 0, "mean_hours": 48.0, "median_hours": 48.0}
+    assert [event['event'] for event in history.user_timeline("carol")] == ['finding', 'resolved']
+    history.close()
+
+def test_history_store_answers_timeline_and_mttr_queries(tmp_path):
+    """Test grant/finding history over a year of nightly runs: spans, timelines, remediation times"""
+    from datetime import datetime, timedelta
+    from scripts.history_store import HistoryStore
+    store = HistoryStore(tmp_path / "findings.db")
+    findings = FindingStore(tmp_path / "findings.db")
+    base = {(f"user{u}", f"repos:r{r}", "write") for u in range(100) for r in range(20)}
+    start = datetime(2025, 1, 1, 2, 0)
+    
+    for day in range(365):
+        at = start + timedelta(days=day)
+        grants = set(base)
+        # carol holds admin on r7 from day 100 until it is cleaned up on day 103
+        extra = []
+        if 100 <= day < 103:
+            grants.add(("carol", "repos:r7", "admin"))
+            extra.append({"system": "github", "username": "carol", "role": "admin", "scope": ["repos:r7"]})
+        if day >= 200:
+            grants.discard(("user1", "repos:r1", "write"))
+        store.record_grants("github", grants, taken_at=at)
+        findings.reconcile({"details": {"extra": extra}}, at=at)
+    
+    started = time.perf_counter()
+    timeline = store.user_timeline("Carol")
+    history = store.repo_history("r7")
+    first = store.first_access("user1", "r1")
+    stats = store.remediation_stats()
+    assert time.perf_counter() - started < 0.5
+    
+    assert [(event['event'], event['at'][:10]) for event in timeline] == [
+        ('granted', '2025-04-11'), ('finding', '2025-04-11'), ('removed', '2025-04-14'), ('resolved', '2025-04-14')
+    ]
+    assert [(span['username'], span['ended_at']) for span in history if span['role'] == 'admin'] == [
+        ('carol', (start + timedelta(days=103)).isoformat())
+    ]
+    assert first == start.isoformat()
+    assert stats == {"extra": {"resolved": 1, "open": 0, "mean_hours": 72.0, "median_hours": 72.0}}
+    # One row per change, not per grant per night
+    assert store.conn.execute("SELECT COUNT(*) FROM grant_spans").fetchone()[0] == len(base) + 1
+    store.close()
+    findings.close()
+
+def test_snapshot_delta_and_retention(tmp_path):
+    """Test npz snapshots: added/removed/changed grants between two snapshots, and pruning past retention"""
+    from datetime import datetime, timedelta
+    import pandas as pd
+    from scripts.snapshot_store import SnapshotStore
+    store = SnapshotStore(tmp_path / "snapshots")
+    now = datetime.now().replace(microsecond=0)
+    
+    def grants(*rows):
+        return pd.DataFrame([{"system_key": "github", "username_key": username, "scope_key": scope,
+                              "role_key": role, "email": f"{username}@example.com"}
+                             for username, role, scope in rows])
+    
+    old = store.save(grants(("alice", "write", "repos:r1"), ("bob", "read", "repos:r1"), ("carol", "admin", "repos:r2")),
+                     taken_at=now - timedelta(days=40))
+    # dave and repos:r3 only exist in the new snapshot's dictionaries
+    new = store.save(grants(("carol", "admin", "repos:r2"), ("alice", "admin", "repos:r1"), ("dave", "read", "repos:r3")),
+                     taken_at=now - timedelta(days=1))
+    
+    delta = store.delta(old, new)
+    assert delta['summary'] == {"added_count": 1, "removed_count": 1, "changed_count": 1}
+    assert delta['added'] == [{"system": "github", "username": "dave", "scope": "repos:r3", "role": "read"}]
+    assert delta['removed'] == [{"system": "github", "username": "bob", "scope": "repos:r1", "role": "read"}]
+    assert delta['changed'] == [{"system": "github", "username": "alice", "scope": "repos:r1",
+                                 "old_role": "write", "new_role": "admin"}]
+    assert store.load(new).attrs['grant_count'] == 3
+    
+    # Retention is per system, and the newest keep_min snapshots survive however old they are
+    middle = store.save(grants(("alice", "write", "repos:r1")), taken_at=now - timedelta(days=35))
+    lone = store.save(grants(("alice@example.com", "administrator", "account:a")), system="cloudflare",
+                      taken_at=now - timedelta(days=50))
+    assert sorted(store.prune(retention_days=30, keep_min=1)) == sorted([old, middle])
+    assert sorted(store.list_snapshots()) == sorted([lone, new])
+    assert store.prune(retention_days=30, keep_min=0) == [lone]
+    assert store.list_snapshots() == [new]
+
+def test_what_if_diff_runs_offline_against_snapshots(tmp_path, monkeypatch):
+    """Test the what-if diff: a candidate SoT against stored snapshots, offline, with a CI exit code"""
+    from scripts.snapshot_store import SnapshotStore
+    from scripts.what_if import WhatIfDiff
+    monkeypatch.setattr(settings, 'SOT_CACHE_DIR', str(tmp_path / "cache"))
+    actuals = [{"system": "github", "username": f"user{i}", "role": "write", "scope": [f"repos:r{i % 40}"]}
+               for i in range(2000)]
+    path = GitHubCollector().save_actuals(iter(actuals), str(tmp_path / "github.ndjson.gz"))
+    store = SnapshotStore(tmp_path / "snapshots")
+    store.save_from_actuals(path, system="github")
+    
+    header = "system,username,email,role,scope,expires_on,manager,notes\n"
+    rows = [f"github,user{i},,write,repos:r{i % 40},,,\n" for i in range(2000)]
+    base = tmp_path / "base.csv"
+    base.write_text(header + ''.join(rows[:1999]))
+    # The candidate grants user1999 what they already have, drops user5 and gives user7 admin
+    candidate = tmp_path / "candidate.csv"
+    rows[5] = ''
+    rows[7] = "github,user7,,admin,repos:r7,,,\n"
+    candidate.write_text(header + ''.join(rows))
+    
+    monkeypatch.setattr(settings, 'GITHUB_API_URL', 'http://127.0.0.1:9')
+    what_if = WhatIfDiff(store)
+    what_if.run(candidate, base)
+    result = what_if.run(candidate, base)
+    assert result['summary']['seconds'] < 1
+    assert sorted((item['bucket'], item['username']) for item in result['added']) == [
+        ('extra', 'user5'), ('wrong_role', 'user7')
+    ]
+    assert [(item['bucket'], item['username']) for item in result['resolved']] == [('extra', 'user1999')]
+    
+    # CI gate: a change that adds findings fails the check, a no-op passes
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, SNAPSHOT_DIR=str(tmp_path / "snapshots"), SOT_CACHE_DIR=str(tmp_path / "cache"))
+    def check(path):
+        return subprocess.run([sys.executable, os.path.join(repo_dir, "main.py"), "--what-if", str(path),
+                               "--base", str(base)], cwd=tmp_path, env=env, capture_output=True, text=True)
+    failed = check(candidate)
+    assert failed.returncode == 1 and "+ extra" in failed.stdout
+    assert check(base).returncode == 0
+
 if __name__ == "__main__":
     print("🧪 Access Guard System Test")
     print("=" * 50)